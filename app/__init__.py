@@ -4,16 +4,29 @@ from flask.ext.mail import Mail
 from flask.ext.moment import Moment
 from flask.ext.login import LoginManager
 from flask.ext.bootstrap import Bootstrap
-from flask.ext.sqlalchemy import SQLAlchemy
 
 from config import config
+from .activity import LastSeenBuffer
+from .outbox import EmailOutbox
+from .instrumentation import QueryStats
+from .profiling import Profiler
+from .metrics import Metrics
+from .replica import RoutingSQLAlchemy, ReadReplica
+from .events import TaskEventStream
 
 
 mail = Mail()
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 moment = Moment()
 bootstrap = Bootstrap()
 login_manager = LoginManager()
+last_seen_buffer = LastSeenBuffer()
+outbox = EmailOutbox()
+query_stats = QueryStats()
+profiler = Profiler()
+metrics = Metrics()
+read_replica = ReadReplica()
+task_events = TaskEventStream()
 
 # inform your login manager where the login view is located else @login_required
 # will not be able to locate it.
@@ -29,15 +42,39 @@ def create_app(config_name):
 
     config[config_name].init_app(app)
 
+    read_replica.init_app(app)
     db.init_app(app)
     mail.init_app(app)
     moment.init_app(app)
     bootstrap.init_app(app)
     login_manager.init_app(app)
+    last_seen_buffer.init_app(app)
+    outbox.init_app(app)
+    query_stats.init_app(app)
+    profiler.init_app(app)
+    metrics.init_app(app)
+    task_events.init_app(app)
+
+    from .models import user_cache
+    user_cache.configure(
+        maxsize=app.config['MAINTRAQ_USER_CACHE_SIZE'], ttl=app.config['MAINTRAQ_USER_CACHE_TTL'],
+        check_interval=app.config['MAINTRAQ_USER_CACHE_CHECK_INTERVAL']
+    )
+
+    if not app.config['MAINTRAQ_RELEASE']:
+        from .utils import template_version
+        app.config['MAINTRAQ_RELEASE'] = template_version(app)
+
+    from .fragments import task_rows, task_row
+    task_rows.configure(maxsize=app.config['MAINTRAQ_ROW_CACHE_SIZE'])
+    app.add_template_global(task_row)
 
     from .main import main as main_blueprint
     from .auth import auth as auth_blueprint
     app.register_blueprint(main_blueprint)
     app.register_blueprint(auth_blueprint)
 
+    from .api_1_0 import api as api_1_0_blueprint
+    app.register_blueprint(api_1_0_blueprint, url_prefix='/api/v1.0')
+
     return app
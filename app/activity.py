@@ -0,0 +1,76 @@
+import atexit
+from datetime import datetime, timedelta
+from threading import Lock
+
+
+class LastSeenBuffer:
+    """Collects `User.last_seen` timestamps in memory and writes them out in
+    one bulk UPDATE every so often, instead of an UPDATE per request.
+
+    Flushes only happen from `record` and at exit, so a process that stops
+    getting requests holds its pending timestamps until the next request or
+    until it shuts down. A failed flush keeps them for the next attempt.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = Lock()
+        self.pending = {}
+        self.seen = {}
+        self.flushed_at = datetime.now()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.flush)
+
+    def recorded(self, user_id):
+        return self.seen.get(user_id)
+
+    def record(self, user_id, when):
+        interval = timedelta(seconds=self.app.config['MAINTRAQ_LAST_SEEN_FLUSH_INTERVAL'])
+        with self.lock:
+            self.pending[user_id] = when
+            self.seen[user_id] = when
+            due = when - self.flushed_at >= interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        if self.app is None:
+            return 0
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = now = datetime.now()
+            # Only remember users recently enough to still throttle them.
+            horizon = now - timedelta(seconds=self.app.config['MAINTRAQ_LAST_SEEN_INTERVAL'])
+            self.seen = dict((k, v) for k, v in self.seen.items() if v > horizon)
+        if not pending:
+            return 0
+
+        from . import db
+        from .models import User
+
+        users = User.__table__
+        statement = users.update().where(
+            users.c.id == db.bindparam('user_id')
+        ).values(last_seen=db.bindparam('seen'))
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(statement, [
+                        {'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()
+                    ])
+        except Exception:
+            self.restore(pending)
+            raise
+        return len(pending)
+
+    def restore(self, pending):
+        # Puts back updates from a failed flush, unless a newer one was
+        # recorded for the same user meanwhile.
+        with self.lock:
+            for user_id, seen in pending.items():
+                if self.pending.get(user_id, seen) <= seen:
+                    self.pending[user_id] = seen
@@ -0,0 +1,42 @@
+from flask import g, jsonify, request
+
+from app.models import User
+from . import api
+from .errors import unauthorized, forbidden
+
+
+def authenticate():
+    # Accepts `Authorization: Bearer <token>`, or HTTP basic auth with either
+    # a token as the username or a username and password.
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return User.verify_auth_token(header[len('Bearer '):].strip()), True
+    auth = request.authorization
+    if auth is None or not auth.username:
+        return None, False
+    if not auth.password:
+        return User.verify_auth_token(auth.username), True
+    user = User.query.filter_by(username=auth.username).first()
+    if user is None or not user.verify_password(auth.password):
+        return None, False
+    return user, False
+
+
+@api.before_request
+def before_request():
+    g.current_user, g.token_used = authenticate()
+    if g.current_user is None:
+        return unauthorized('Invalid or missing credentials')
+    if not g.current_user.confirmed:
+        return forbidden('Unconfirmed account')
+
+
+@api.route('/tokens', methods=['POST'])
+def get_token():
+    if g.token_used:
+        return unauthorized('Use your username and password to request a token')
+    expiration = 3600
+    return jsonify({
+        'token': g.current_user.generate_auth_token(expiration=expiration),
+        'expiration': expiration
+    })
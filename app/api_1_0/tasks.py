@@ -0,0 +1,207 @@
+from flask import current_app, g, jsonify, request, url_for
+
+from app import db
+from app.exceptions import ValidationError
+from app.models import Task, TaskStatus, Facility, User
+from app.notifications import notify_tasks_created, notify_tasks_changed
+from app.utils import not_modified, with_validators
+from . import api
+from .errors import forbidden, not_found, conflict
+
+BOOLEAN_FIELDS = ('confirmed', 'acknowledged', 'resolved')
+FIELDS = ('description', 'detailed_info', 'facility_id', 'assigned_to_id', 'progress') + \
+    BOOLEAN_FIELDS
+
+
+def is_int(value):
+    # JSON true and false decode to bools, which are ints in Python.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def task_data(json, create=False):
+    # Validates a task's JSON the way the task forms validate their fields.
+    if not isinstance(json, dict):
+        raise ValidationError('Expected a task object')
+    data = dict((field, json[field]) for field in FIELDS if field in json)
+
+    if create or 'description' in data:
+        description = data.get('description')
+        if not isinstance(description, str) or not 10 <= len(description) <= 255:
+            raise ValidationError('description must be between 10 and 255 characters')
+    if 'detailed_info' in data and not isinstance(data['detailed_info'], (str, type(None))):
+        raise ValidationError('detailed_info must be a string')
+    if create and 'facility_id' not in data:
+        raise ValidationError('facility_id is required')
+    if 'facility_id' in data and (
+            not is_int(data['facility_id']) or
+            data['facility_id'] not in set(id for id, name in Facility.choices())):
+        raise ValidationError('Unknown facility {!r}'.format(data['facility_id']))
+    if 'progress' in data and (not is_int(data['progress']) or data['progress'] not in (
+            TaskStatus.NOT_STARTED, TaskStatus.STARTED, TaskStatus.PENDING, TaskStatus.DONE)):
+        raise ValidationError('Unknown progress {!r}'.format(data['progress']))
+    if data.get('assigned_to_id') is not None and (
+            not is_int(data['assigned_to_id']) or
+            data['assigned_to_id'] not in set(id for id, name, count in User.maintainers())):
+        raise ValidationError('User {!r} is not a maintainer'.format(data['assigned_to_id']))
+    for field in BOOLEAN_FIELDS:
+        if field in data and not isinstance(data[field], bool):
+            raise ValidationError('{} must be true or false'.format(field))
+    return data
+
+
+def bulk_items(json):
+    items = json.get('tasks') if isinstance(json, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValidationError('Expected a non-empty "tasks" list')
+    limit = current_app.config['MAINTRAQ_API_BULK_LIMIT']
+    if len(items) > limit:
+        raise ValidationError('At most {} tasks per request'.format(limit))
+    return items
+
+
+def request_json():
+    # Flask's own error for a malformed body is an HTML page.
+    json = request.get_json(silent=True)
+    if json is None:
+        raise ValidationError('Expected a JSON request body')
+    return json
+
+
+def create_tasks(items):
+    # Adds the tasks and queues their notifications in one transaction, which
+    # the caller commits once it has built its response; committing first
+    # would expire the tasks and reload each of them.
+    tasks = [
+        Task(
+            requested_by_id=g.current_user.id,
+            facility_id=data['facility_id'],
+            description=data['description'],
+            detailed_info=data.get('detailed_info')
+        ) for data in items
+    ]
+    db.session.add_all(tasks)
+    db.session.flush()
+    notify_tasks_created(tasks)
+    return tasks
+
+
+@api.route('/tasks/')
+def get_tasks():
+    page = Task.keyset_page(
+        Task.dashboard_query(g.current_user),
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return jsonify({
+        'tasks': [task.to_json() for task in page.items],
+        'older': url_for('api.get_tasks', after=page.older_cursor, _external=True)
+        if page.older_cursor else None,
+        'newer': url_for('api.get_tasks', before=page.newer_cursor, _external=True)
+        if page.newer_cursor else None,
+    })
+
+
+@api.route('/tasks/changes')
+def get_task_changes():
+    # Everything that changed since `cursor`, oldest first. Keep polling with
+    # the returned cursor; `more` says whether to ask again straight away.
+    tasks, tombstones, cursor, more = Task.changes(
+        g.current_user, request.args.get('cursor'),
+        limit=current_app.config['MAINTRAQ_CHANGE_FEED_PAGE_SIZE']
+    )
+    return jsonify({
+        'tasks': [task.to_json() for task in tasks],
+        'deleted': [tombstone.to_json() for tombstone in tombstones],
+        'cursor': cursor,
+        'more': more,
+        'next': url_for('api.get_task_changes', cursor=cursor, _external=True)
+        if cursor else None,
+    })
+
+
+@api.route('/tasks/<int:task_id>')
+def get_task(task_id):
+    version = Task.version(task_id)
+    if version is None:
+        return not_found('No task {}'.format(task_id))
+    updated, requested_by_id = version
+    if not Task.viewable_by(g.current_user, requested_by_id):
+        return forbidden('Insufficient permissions')
+    etag = Task.etag(task_id, updated, g.current_user)
+    if not_modified(etag, updated):
+        return with_validators(current_app.response_class(status=304), etag, updated)
+
+    task = Task.list_query().get(task_id)
+    return with_validators(jsonify(task.to_json()), etag, updated)
+
+
+@api.route('/tasks/', methods=['POST'])
+def new_task_request():
+    task = create_tasks([task_data(request_json(), create=True)])[0]
+    response = jsonify(task.to_json())
+    db.session.commit()
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_task', task_id=task.id, _external=True)
+    return response
+
+
+@api.route('/tasks/bulk', methods=['POST'])
+def new_tasks():
+    # Every task is validated before any is written, and all of them are
+    # created in one transaction.
+    tasks = create_tasks([task_data(item, create=True) for item in bulk_items(request_json())])
+    response = jsonify({'tasks': [task.to_json() for task in tasks]})
+    db.session.commit()
+    response.status_code = 201
+    return response
+
+
+def apply_updates(updates):
+    # `updates` is a list of (task id, data). Checks every task first so a
+    # batch is applied entirely or not at all, like a single update_task POST.
+    ids = [task_id for task_id, data in updates]
+    tasks = dict((task.id, task) for task in Task.list_query().filter(Task.id.in_(ids)))
+    for task_id in ids:
+        task = tasks.get(task_id)
+        if task is None:
+            return not_found('No task {}'.format(task_id)), None
+        if not task.can_update(g.current_user):
+            return forbidden('Insufficient permissions for task {}'.format(task_id)), None
+        if task.resolved:
+            return conflict('Refusing to update resolved task {}. Please open a new one.'
+                            .format(task_id)), None
+
+    # The caller commits after building its response, as in create_tasks.
+    changes = []
+    for task_id, data in updates:
+        task = tasks[task_id]
+        changes.append((task, task.snapshot()))
+        task.apply_update(g.current_user, data)
+    notify_tasks_changed(changes, g.current_user)
+    return None, [task for task, before in changes]
+
+
+@api.route('/tasks/<int:task_id>', methods=['PUT'])
+def edit_task(task_id):
+    error, tasks = apply_updates([(task_id, task_data(request_json()))])
+    if error is not None:
+        return error
+    response = jsonify(tasks[0].to_json())
+    db.session.commit()
+    return response
+
+
+@api.route('/tasks/bulk', methods=['PUT'])
+def edit_tasks():
+    updates = []
+    for item in bulk_items(request_json()):
+        task_id = item.get('id') if isinstance(item, dict) else None
+        if not is_int(task_id):
+            raise ValidationError('Every task needs an integer "id"')
+        updates.append((task_id, task_data(item)))
+    error, tasks = apply_updates(updates)
+    if error is not None:
+        return error
+    response = jsonify({'tasks': [task.to_json() for task in tasks]})
+    db.session.commit()
+    return response
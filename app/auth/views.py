@@ -5,7 +5,7 @@ from flask.ext.login import current_user, login_user, login_required, logout_use
 from .. import db
 from . import auth
 from app.models import User
-from app.utils import send_email
+from app.utils import queue_email
 from .forms import (
     LoginForm, RegistrationForm, PasswordResetRequestForm, ChangePasswordForm,
     PasswordResetForm, ChangeEmailForm
@@ -43,12 +43,13 @@ def register():
                     username=form.username.data,
                     password=form.password.data)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         token = user.generate_confirmation_token()
-        send_email(
+        queue_email(
             user.email, 'Confirm Your Account', 'auth/email/confirm',
             user=user, token=token
         )
+        db.session.commit()
         flash("A confirmation email has been sent to you.")
         login_user(user, form.password.data)
         return redirect(url_for('main.index'))
@@ -61,6 +62,8 @@ def confirm(token):
     if current_user.confirmed:
         return redirect(url_for('main.index'))
     if current_user.confirm(token):
+        current_user.uncache()
+        db.session.commit()
         flash('Welcome, {}! Your account has been confirmed, thanks!'.format(current_user.username))
     else:
         flash('The confirmation link is invalid or has expired.')
@@ -87,8 +90,9 @@ def unconfirmed():
 @login_required
 def resend_confirmation():
     token = current_user.generate_confirmation_token()
-    send_email(current_user.email, 'Confirm Your Account', 'auth/email/confirm',
-               user=current_user, token=token)
+    queue_email(current_user.email, 'Confirm Your Account', 'auth/email/confirm',
+                user=current_user, token=token)
+    db.session.commit()
     flash("A new confirmation has been sent to you via email")
     return redirect(url_for('main.index'))
 
@@ -101,6 +105,8 @@ def change_password():
         if current_user.verify_password(form.old_password.data):
             current_user.password = form.password.data
             db.session.add(current_user)
+            current_user.uncache()
+            db.session.commit()
             flash('Your password has been updated.')
             return redirect(url_for('main.index'))
         else:
@@ -117,10 +123,11 @@ def password_reset_request():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
             token = user.generate_confirmation_token()
-            send_email(
+            queue_email(
                 user.email, 'Reset Your Password', 'auth/email/reset_password',
                 user=user, token=token, next=request.args.get('next')
             )
+            db.session.commit()
             flash("An email with instructions to reset your password has been sent to you.")
             return redirect(url_for('auth.login'))
         else:
@@ -142,6 +149,8 @@ def password_reset(token):
             return redirect(url_for('main.index'))
 
         if user.reset_password(token, form.password.data):
+            user.uncache()
+            db.session.commit()
             flash("Your password has been updated.")
             return redirect(url_for('auth.login'))
         else:
@@ -157,11 +166,12 @@ def change_email_request():
         if current_user.verify_password(form.password.data):
             new_email = form.email.data
             token = current_user.generate_email_change_token(new_email)
-            send_email(
+            queue_email(
                 new_email,
                 'Confirm your email address', 'auth/email/change_email',
                 user=current_user, token=token
             )
+            db.session.commit()
             flash("An email with instructions to confirm your new email address " +
                   "has been sent to you.")
             return redirect(url_for('main.index'))
@@ -174,6 +184,8 @@ def change_email_request():
 @login_required
 def change_email(token):
     if current_user.change_email(token):
+        current_user.uncache()
+        db.session.commit()
         flash("Your email address has been updated.")
     else:
         flash("Invalid request")
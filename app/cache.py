@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+# Every cache created in the process, by name, so their stats can be reported.
+caches = {}
+
+
+class TTLCache:
+    """A bounded, thread safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    def configure(self, maxsize=None, ttl=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if ttl is not None:
+            self.ttl = ttl
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if self.ttl is None or expires > time():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time() + (self.ttl or 0))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+
+class SharedTTLCache(TTLCache):
+    """A `TTLCache` that every process empties when its stamp in the
+    `cache_versions` table is bumped (see `invalidate`).
+
+    Each process checks the stamp at most once per `check_interval` seconds,
+    so a change made by one process reaches the others within that time
+    rather than after the full `ttl`.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60, check_interval=5):
+        super(SharedTTLCache, self).__init__(name, maxsize, ttl)
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0
+
+    def configure(self, maxsize=None, ttl=None, check_interval=None):
+        super(SharedTTLCache, self).configure(maxsize, ttl)
+        if check_interval is not None:
+            self.check_interval = check_interval
+
+    def get(self, key):
+        from .models import CacheVersion
+
+        now = time()
+        if now - self.checked_at >= self.check_interval:
+            version = CacheVersion.get(self.name)
+            with self.lock:
+                if version != self.version:
+                    self.entries.clear()
+                    self.version = version
+                self.checked_at = now
+        return super(SharedTTLCache, self).get(key)
+
+    def invalidate(self, key):
+        # Bumps the stamp in the current transaction; other processes drop
+        # their entries once that commits.
+        from .models import CacheVersion
+
+        CacheVersion.bump(self.name)
+        self.delete(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+            self.checked_at = 0
+
+
+class VersionedCache:
+    """Holds a single value that every process shares a version stamp for.
+
+    The stamp lives in the `cache_versions` table. Bumping it (see
+    `invalidate`) makes every process reload the value the next time it
+    checks, which each process does at most once per `check_interval` seconds.
+    """
+
+    def __init__(self, name, check_interval=5):
+        self.name = name
+        self.check_interval = check_interval
+        self.lock = Lock()
+        self.value = None
+        self.version = None
+        self.checked_at = 0
+        self.hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    def get(self, loader):
+        from .models import CacheVersion
+
+        now = time()
+        with self.lock:
+            if self.value is not None and now - self.checked_at < self.check_interval:
+                self.hits += 1
+                return self.value
+
+        version = CacheVersion.get(self.name)
+        with self.lock:
+            if self.value is not None and version == self.version:
+                self.checked_at = now
+                self.hits += 1
+                return self.value
+            self.misses += 1
+
+        value = loader()
+        with self.lock:
+            self.value, self.version, self.checked_at = value, version, now
+        return value
+
+    def invalidate(self):
+        # Bumps the stamp in the current transaction; other processes pick
+        # it up once that commits.
+        from .models import CacheVersion
+
+        CacheVersion.bump(self.name)
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.value = None
+            self.version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
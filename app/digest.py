@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from . import db
+from .models import User, Task
+from .utils import queue_email
+
+
+def send_digests(now=None):
+    """Email each opted-in admin a summary of tasks requested and completed
+    since their last digest. Admins whose interval hasn't elapsed are skipped,
+    so this can run from cron more often than the interval.
+    """
+    now = now or datetime.now()
+    interval = timedelta(hours=current_app.config['MAINTRAQ_DIGEST_INTERVAL_HOURS'])
+    sent = 0
+    # The digest lists every task, so it's only ever sent to admins.
+    for user in User.query.filter_by(digest_opt_in=True, is_admin=True):
+        since = user.digest_sent_at or now - interval
+        if now - since < interval:
+            continue
+        groups = Task.digest(since, now)
+        if groups:
+            queue_email(
+                user.email, "Maintenance Digest", "main/email/digest",
+                user=user, groups=groups, since=since, until=now
+            )
+            sent += 1
+        user.digest_sent_at = now
+        db.session.add(user)
+    db.session.commit()
+    return sent
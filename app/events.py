@@ -0,0 +1,215 @@
+from threading import Lock, Thread
+from time import sleep
+
+from queue import Queue, Empty, Full
+
+
+class Subscriber:
+    # One connected event stream, and what its user may see.
+    def __init__(self, user, maxsize):
+        self.user_id = user.id
+        self.is_admin = user.is_admin
+        self.is_maintenance = user.is_maintenance
+        self.queue = Queue(maxsize)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            # Wakes the stream up rather than waiting for the heartbeat.
+            self.queue.put_nowait(None)
+        except Full:
+            pass
+
+    def same_role(self, is_admin, is_maintenance):
+        return (bool(is_admin), bool(is_maintenance)) == (
+            bool(self.is_admin), bool(self.is_maintenance))
+
+    def wants(self, event):
+        if self.is_admin:
+            return True
+        if self.is_maintenance:
+            return event['assigned_to_id'] == self.user_id
+        return event['requested_by_id'] == self.user_id
+
+
+class TaskEventStream:
+    """Fans `TaskEvent` rows out to connected server-sent event streams.
+
+    A single poller thread per process reads new events from the database and
+    hands each to the queues of the subscribers allowed to see it, so idle
+    streams cost nothing but a queue. Run gunicorn with the gevent worker
+    (see gunicorn_conf.py) so an open stream doesn't tie up a worker.
+
+    Event ids are handed out before their transactions commit, so a lower id
+    can show up after a higher one. Events are read in `(revision, id)` order
+    instead, where revisions are given out in commit order (see
+    `TaskEvent.stamp`), so the poller and reconnecting clients only need to
+    remember the last position they saw.
+
+    A subscriber's stream is closed when its user's role changes, and the
+    client reconnects with the new role.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = Lock()
+        self.subscribers = set()
+        self.poller = None
+        # `(revision, id)` of the last event handled.
+        self.position = None
+        self.users_version = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def subscribe(self, user):
+        self.start()
+        subscriber = Subscriber(user, self.app.config['MAINTRAQ_EVENTS_QUEUE_SIZE'])
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def start(self):
+        with self.lock:
+            if self.poller is not None and self.poller.is_alive():
+                return
+            self.position = self.latest()
+            self.poller = Thread(target=self.run, name='maintraq-events')
+            self.poller.daemon = True
+            self.poller.start()
+
+    def run(self):
+        from . import db
+
+        while True:
+            sleep(self.app.config['MAINTRAQ_EVENTS_POLL_INTERVAL'])
+            with self.app.app_context():
+                try:
+                    self.poll()
+                except Exception:
+                    self.app.logger.exception("Task event poller failed")
+                finally:
+                    db.session.remove()
+
+    def poll(self):
+        self.check_roles()
+        new = self.fetch(self.position, self.app.config['MAINTRAQ_EVENTS_REPLAY_LIMIT'])
+        if not new:
+            return
+        self.position = new[-1]['position']
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            for event in new:
+                if not subscriber.wants(event):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except Full:
+                    # Too slow to keep up. Its client reconnects and catches
+                    # up from Last-Event-ID.
+                    self.unsubscribe(subscriber)
+                    break
+
+    def check_roles(self):
+        # Only look at the users when the user cache says one has changed.
+        from . import db
+        from .models import CacheVersion, User, user_cache
+
+        version = CacheVersion.get(user_cache.name)
+        if version == self.users_version:
+            return
+        self.users_version = version
+        with self.lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+        roles = dict((id, (is_admin, is_maintenance)) for id, is_admin, is_maintenance in
+                     db.session.query(User.id, User.is_admin, User.is_maintenance).filter(
+                         User.id.in_(set(subscriber.user_id for subscriber in subscribers))))
+        for subscriber in subscribers:
+            role = roles.get(subscriber.user_id)
+            if role is None or not subscriber.same_role(*role):
+                self.unsubscribe(subscriber)
+
+    @staticmethod
+    def latest():
+        from . import db
+        from .models import TaskEvent
+
+        last = db.session.query(TaskEvent.revision, TaskEvent.id).filter(
+            TaskEvent.revision.isnot(None)
+        ).order_by(TaskEvent.revision.desc(), TaskEvent.id.desc()).first()
+        return tuple(last) if last else (0, 0)
+
+    @staticmethod
+    def fetch(after, limit):
+        from .models import TaskEvent
+        from .pagination import after_key
+
+        return [
+            dict(id=event.id, position=(event.revision, event.id), kind=event.kind,
+                 data=event.data, requested_by_id=event.requested_by_id,
+                 assigned_to_id=event.assigned_to_id)
+            for event in TaskEvent.query.filter(after_key(TaskEvent.revision, TaskEvent.id, after))
+            .order_by(TaskEvent.revision, TaskEvent.id).limit(limit)
+        ]
+
+    @staticmethod
+    def parse_position(last_event_id):
+        # Event ids are sent as `<revision>-<id>`. A bare id is from before
+        # revisions, and is looked up.
+        from .models import TaskEvent
+        from .pagination import decode_position
+
+        if last_event_id and last_event_id.isdigit():
+            event = TaskEvent.query.get(int(last_event_id))
+            if event is None or event.revision is None:
+                return None
+            return event.revision, event.id
+        return decode_position(last_event_id)
+
+    def replay(self, subscriber, last_event_id):
+        # Events a reconnecting client missed, oldest first.
+        after = self.parse_position(last_event_id)
+        if after is None:
+            return []
+        events = self.fetch(after, self.app.config['MAINTRAQ_EVENTS_REPLAY_LIMIT'])
+        return [event for event in events if subscriber.wants(event)]
+
+    def stream(self, subscriber, backlog):
+        heartbeat = self.app.config['MAINTRAQ_EVENTS_HEARTBEAT']
+        replayed = set()
+        try:
+            yield 'retry: 5000\n\n'
+            for event in backlog:
+                replayed.add(event['id'])
+                yield self.frame(event)
+            while not subscriber.closed:
+                try:
+                    event = subscriber.queue.get(timeout=heartbeat)
+                except Empty:
+                    # Keeps proxies from closing an idle connection.
+                    yield ': keepalive\n\n'
+                    continue
+                # None just wakes a closed subscriber up.
+                if event is not None and event['id'] not in replayed:
+                    yield self.frame(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    @staticmethod
+    def frame(event):
+        from .pagination import encode_position
+
+        return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+            encode_position(*event['position']), event['kind'], event['data'])
@@ -0,0 +1,24 @@
+from flask import render_template
+from jinja2 import Markup
+
+from .cache import TTLCache
+
+# Rendered task table rows. Entries never expire: a changed task gets a new
+# `updated` and so a new key, and the old row falls out of the LRU.
+task_rows = TTLCache('task_rows', ttl=None)
+
+
+def task_row(task, bulk=False):
+    """Renders `partials/_task_row.html` for a task, reusing the last
+    rendering of the same version of it."""
+    # The row looks the same to every viewer, so the key leaves them out.
+    bulk = bool(bulk)
+    key = (
+        task.id, task.updated, bulk, task.requested_by.username,
+        task.assigned_to.username if task.assigned_to else None
+    )
+    html = task_rows.get(key)
+    if html is None:
+        html = Markup(render_template('partials/_task_row.html', task=task, bulk=bulk))
+        task_rows.set(key, html)
+    return html
@@ -0,0 +1,157 @@
+import re
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Open `count_queries` counters for the current thread.
+local = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(default_timer())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = default_timer() - conn.info['query_started'].pop()
+    for counter in getattr(local, 'counters', ()):
+        counter['count'] += 1
+        counter['time'] += elapsed
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats['count'] += 1
+        g.query_stats['time'] += elapsed
+
+
+@contextmanager
+def count_queries():
+    """Counts the queries run by this thread inside the block.
+
+    Yields a dict with the running `count` and total `time` in seconds.
+    """
+    counter = {'count': 0, 'time': 0.0}
+    if not hasattr(local, 'counters'):
+        local.counters = []
+    local.counters.append(counter)
+    try:
+        yield counter
+    finally:
+        local.counters.remove(counter)
+
+
+@contextmanager
+def assert_max_queries(n):
+    """Fails with an AssertionError if the block runs more than `n` queries::
+
+        with assert_max_queries(4):
+            client.get('/')
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter['count'] > n:
+        raise AssertionError("Expected at most {} queries, {} were run".format(
+            n, counter['count']))
+
+
+def explain(query):
+    """Returns the database's plan for an ORM `query`, one line per step."""
+    from . import db
+
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.execute(
+            'EXPLAIN QUERY PLAN ' + str(compiled), params)]
+    return [row[0] for row in connection.execute('EXPLAIN ' + str(compiled), params)]
+
+
+def full_scans(plan, table):
+    """The steps of an `explain` plan that read every row of `table`."""
+    pattern = re.compile(
+        r'\bSCAN (TABLE )?{0}\b(?!.*\bUSING\b)|\bSeq Scan on {0}\b'.format(re.escape(table)))
+    return [step for step in plan if pattern.search(step)]
+
+
+def task_list_plans():
+    """`(name, plan, full scans)` for each task list and counter query, with
+    placeholder users. Call it inside a transaction that's rolled back
+    afterwards; on Postgres it turns off sequential scans for that
+    transaction, as tiny tables are cheaper to scan and we want to know
+    whether an index is usable at all.
+    """
+    from flask import current_app
+    from . import db
+    from .models import Task, User
+
+    if db.session.connection().dialect.name == 'postgresql':
+        db.session.execute('SET LOCAL enable_seqscan = off')
+
+    def page(query):
+        return query.order_by(Task.date_requested.desc(), Task.id.desc()).limit(
+            current_app.config['MAINTRAQ_TASKS_PER_PAGE'] + 1)
+
+    open_tasks = Task.query.filter(Task.resolved.isnot(True))
+    queries = [
+        ('requester dashboard', page(Task.dashboard_query(User(id=0)))),
+        ('maintainer dashboard', page(Task.dashboard_query(User(id=0, is_maintenance=True)))),
+        ('admin dashboard', page(Task.dashboard_query(User(id=0, is_admin=True)))),
+        ('open tasks', open_tasks.with_entities(db.func.count(Task.id))),
+        ('open tasks by facility', open_tasks.with_entities(
+            Task.facility_id, db.func.count(Task.id)).group_by(Task.facility_id)),
+    ]
+    plans = []
+    for name, query in queries:
+        plan = explain(query)
+        plans.append((name, plan, full_scans(plan, Task.__tablename__)))
+    return plans
+
+
+class QueryStats:
+    """Records the number of queries and time spent in the database for each
+    request. Logs it, optionally sends it as a `Server-Timing` header, and
+    warns about endpoints that run more queries than their budget.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    def start(self):
+        g.query_stats = {'count': 0, 'time': 0.0, 'started': default_timer()}
+
+    def finish(self, response):
+        from flask import current_app as app
+
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        total = default_timer() - stats['started']
+        endpoint = request.endpoint or '-'
+
+        budget = app.config['MAINTRAQ_QUERY_BUDGETS'].get(
+            endpoint, app.config['MAINTRAQ_DEFAULT_QUERY_BUDGET'])
+        message = "%s %s %s %d queries %.1fms db %.1fms total"
+        args = [request.method, request.path, response.status_code,
+                stats['count'], stats['time'] * 1000, total * 1000]
+        if budget is not None and stats['count'] > budget:
+            # Logged whether or not MAINTRAQ_QUERY_LOGGING is on, and at a
+            # level production logs keep.
+            app.logger.warning(message + ", over the %s budget of %d", *(args + [endpoint, budget]))
+        elif app.config['MAINTRAQ_QUERY_LOGGING']:
+            app.logger.info(message, *args)
+        if app.config['MAINTRAQ_SERVER_TIMING']:
+            response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(
+                stats['time'] * 1000, stats['count']))
+            response.headers.add('Server-Timing', 'app;dur={:.1f}'.format(total * 1000))
+        return response
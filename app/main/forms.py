@@ -1,4 +1,4 @@
-from flask import flash
+from flask import flash, current_app, url_for
 from flask.ext.wtf import Form
 
 from wtforms import SubmitField, SelectField, StringField, TextAreaField, BooleanField, HiddenField
@@ -8,7 +8,7 @@ import phonenumbers
 from phonenumbers import phonenumberutil
 from phonenumbers import carrier
 
-from app.models import Facility, User, TaskStatus
+from app.models import Facility, User, Task, TaskStatus
 
 
 class CommonTaskDetailsForm(Form):
@@ -18,9 +18,22 @@ class CommonTaskDetailsForm(Form):
 
     def __init__(self, *args, **kwargs):
         super(CommonTaskDetailsForm, self).__init__(*args, **kwargs)
-        self.facility.choices = [
-            (fac.id, fac.name) for fac in Facility.query.order_by(Facility.name).all()
-        ]
+        choices = Facility.choices()
+        if len(choices) > current_app.config['MAINTRAQ_FACILITY_SELECT_LIMIT']:
+            # Too many to embed in the page, let the browser look them up as
+            # the user types. Only the submitted facility needs to be valid.
+            self.facility.render_kw = {'data-typeahead': url_for('main.search_facilities')}
+            choices = []
+            if self.facility.data:
+                facility = Facility.query.get(self.facility.data)
+                if facility:
+                    choices = [(facility.id, facility.name)]
+        self.facility.choices = list(choices)
+
+    def select_facility(self, facility):
+        self.facility.data = facility.id
+        if (facility.id, facility.name) not in self.facility.choices:
+            self.facility.choices.insert(0, (facility.id, facility.name))
 
 
 class TaskRequestForm(CommonTaskDetailsForm):
@@ -58,9 +71,11 @@ class AdminTaskUpdateForm(CommonTaskDetailsForm):
 
     def __init__(self, *args, **kwargs):
         super(AdminTaskUpdateForm, self).__init__(*args, **kwargs)
+        roster = User.maintainers()
+        self.maintainer_ids = set(id for id, username, open_tasks in roster)
         self.assigned_to_id.choices = [
-            (u.id, u.username) for u in User.query.filter_by(
-                is_maintenance=True).order_by(User.username).all()
+            (id, "{} ({} open)".format(username, open_tasks))
+            for id, username, open_tasks in roster
         ]
         self.progress.choices = [
             (TaskStatus.NOT_STARTED, "Not Started"),
@@ -70,11 +85,41 @@ class AdminTaskUpdateForm(CommonTaskDetailsForm):
         ]
 
     def validate_assigned_to_id(self, field):
-        id = field.data
-        if not User.query.filter_by(id=id, is_maintenance=True).first():
+        if field.data not in self.maintainer_ids:
             flash("No user has been assigned to this task.")
 
 
+class BulkTaskActionForm(Form):
+    action = SelectField("With Selected", choices=[
+        (Task.CONFIRM, "Confirm"),
+        (Task.ASSIGN, "Assign To"),
+        (Task.PROGRESS, "Set Status"),
+        (Task.RESOLVE, "Resolve")
+    ])
+    assigned_to_id = SelectField("Maintainer", coerce=int)
+    progress = SelectField("Status", coerce=int)
+    submit = SubmitField("Apply")
+
+    def __init__(self, *args, **kwargs):
+        super(BulkTaskActionForm, self).__init__(*args, **kwargs)
+        roster = User.maintainers()
+        self.maintainer_ids = set(id for id, username, open_tasks in roster)
+        self.assigned_to_id.choices = [(0, "---")] + [
+            (id, "{} ({} open)".format(username, open_tasks))
+            for id, username, open_tasks in roster
+        ]
+        self.progress.choices = [
+            (TaskStatus.NOT_STARTED, "Not Started"),
+            (TaskStatus.STARTED, "Started"),
+            (TaskStatus.PENDING, "In Progress"),
+            (TaskStatus.DONE, "Done")
+        ]
+
+    def validate_assigned_to_id(self, field):
+        if self.action.data == Task.ASSIGN and field.data not in self.maintainer_ids:
+            raise ValidationError("Pick a maintainer to assign the tasks to.")
+
+
 class RejectTaskForm(Form):
     rejection_reasons = TextAreaField("Comments about this rejection.")
 
@@ -104,11 +149,15 @@ class EditProfileAdminForm(Form):
     phonenumber_locale = HiddenField()
     is_admin = BooleanField("Is Admin")
     is_maintenance = BooleanField("Is Maintenance")
+    digest_opt_in = BooleanField("Send New and Completed Task Notifications as a Digest")
     submit = SubmitField('Update')
 
     def __init__(self, user, *args, **kwargs):
         super(EditProfileAdminForm, self).__init__(*args, **kwargs)
         self.user = user
+        if not user.is_admin:
+            # Digests are only sent to admins.
+            del self.digest_opt_in
 
     def validate_email(self, field):
         if field.data != self.user.email and User.query.filter_by(email=field.data).first():
@@ -1,36 +1,88 @@
-from flask import render_template, url_for, redirect, abort, flash, request, current_app
+from datetime import datetime, timedelta
+
+from flask import (
+    render_template, url_for, redirect, abort, flash, request, current_app, jsonify, make_response,
+    Response
+)
 
 from flask.ext.login import login_required, current_user
 
-from app import db
+from app import db, profiler, task_events
+from app.cache import caches
 from app.main import main
-from app.models import Task, User, TaskStatus, Facility
-from app.utils import send_email
+from app.models import (
+    Task, TaskEvent, TaskTombstone, User, Facility, TaskCounter, TaskRollup, TaskBacklog, RollupRun
+)
+from app.replica import read_only
+from app.utils import not_modified, with_validators
+from app.notifications import (
+    send_mail, notify_task_created, notify_task_changes, notify_bulk_update
+)
 
 from app.main.forms import (
     TaskRequestForm, MaintainerTaskUpdateForm, AdminTaskUpdateForm, RejectTaskForm, FacilityForm,
-    EditProfileAdminForm
+    EditProfileAdminForm, BulkTaskActionForm
 )
 
 
 @main.route('/', methods=['GET', 'POST'])
+@read_only
 @login_required
 def index():
-    tasks = []
+    page = Task.keyset_page(
+        Task.dashboard_query(current_user),
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    tasks_info = {}
+    bulk_form = None
     if current_user.is_admin:
-        tasks = Task.query.order_by(Task.date_requested.desc()).all()
-        pending = len([task for task in tasks if not task.resolved])
-        return render_template('main/index.html', tasks=tasks, tasks_info={'pending': pending})
-    elif current_user.is_maintenance:
-        assigned = current_user.assigned.all()
-        return render_template('main/index.html', tasks=assigned)
+        tasks_info['pending'] = Task.pending_count()
+        tasks_info['by_status'] = TaskCounter.counts(TaskCounter.STATUS)
+        bulk_form = BulkTaskActionForm()
+    return render_template(
+        'main/index.html', tasks=page.items, page=page, tasks_info=tasks_info, bulk_form=bulk_form
+    )
+
+
+@main.route('/tasks/bulk', methods=['POST'])
+@login_required
+def bulk_update_tasks():
+    if not current_user.is_admin:
+        abort(403)
+    form = BulkTaskActionForm()
+    task_ids = request.form.getlist('task_ids', type=int)
+    if not task_ids:
+        flash("Select at least one task first.")
+    elif form.validate_on_submit():
+        action = form.action.data
+        value = {Task.ASSIGN: form.assigned_to_id.data, Task.PROGRESS: form.progress.data}
+        changed = Task.bulk_update(task_ids, action, value.get(action))
+        notify_bulk_update(action, changed)
+        db.session.commit()
+        flash("Updated {} of {} selected tasks.".format(len(changed), len(task_ids)))
     else:
-        tasks = current_user.tasks.filter_by(
-            confirmed=False).order_by(Task.date_requested.desc()).all()
-        return render_template('main/index.html', tasks=tasks)
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error)
+    return redirect(url_for('main.index'))
+
+
+@main.route('/search')
+@read_only
+@login_required
+def search():
+    terms = request.args.get('q', '').strip()
+    # Ranked results are paged by offset, which gets slow deep in the list.
+    max_pages = current_app.config['MAINTRAQ_SEARCH_MAX_PAGES']
+    page = max(1, min(request.args.get('page', 1, type=int), max_pages))
+    tasks, more = Task.search(current_user, terms, page) if terms else ([], False)
+    more = more and page < max_pages
+    return render_template('main/search.html', tasks=tasks, terms=terms, page=page, more=more)
 
 
 @main.route('/task-requests', methods=['GET', 'POST'])
+@read_only
 @login_required
 def task_request():
     form = TaskRequestForm()
@@ -42,34 +94,39 @@ def task_request():
             detailed_info=form.detailed_info.data
         )
         db.session.add(task)
-        db.session.commit()     # Commit here to get access to task id
+        db.session.flush()     # Flush here to get access to task id
         # Notify admin
-        admin = User.query.filter_by(email=current_app.config['MAINTRAQ_ADMIN']).first()
-        send_mail(task, created=True, user=admin)
+        notify_task_created(task)
+        db.session.commit()
         return redirect(url_for('main.view_task', task_id=task.id))
     return render_template('main/task-request.html', form=form)
 
 
 @main.route('/view-task/<int:task_id>')
+@read_only
 @login_required
 def view_task(task_id):
-    task = Task.query.get_or_404(task_id)
-    if not (current_user.is_admin or current_user.is_maintenance):
-        if task.requested_by_id != current_user.id:
-            abort(403)
-    return render_template('main/task-detail.html', task=task)
+    version = Task.version(task_id)
+    if version is None:
+        abort(404)
+    updated, requested_by_id = version
+    if not Task.viewable_by(current_user, requested_by_id):
+        abort(403)
+    etag = Task.etag(task_id, updated, current_user)
+    if not_modified(etag, updated):
+        return with_validators(current_app.response_class(status=304), etag, updated)
+
+    task = Task.list_query().get_or_404(task_id)
+    response = make_response(render_template('main/task-detail.html', task=task))
+    return with_validators(response, etag, updated)
 
 
 @main.route('/update-task/<int:task_id>', methods=['GET', 'POST'])
 @login_required
 def update_task(task_id):
-    task = Task.query.get_or_404(task_id)
-    # Should we do this? Let's find out.
-    if not (current_user.is_admin or current_user.is_maintenance):
-        if task.requested_by_id != current_user.id:
-            abort(403)
-        if current_user.is_maintenance and task.assigned_to_id != current_user.id:
-            abort(403)
+    task = Task.list_query().get_or_404(task_id)
+    if not task.can_update(current_user):
+        abort(403)
 
     # Get the appropriate form for this user.
     if current_user.is_admin:
@@ -94,7 +151,7 @@ def update_task(task_id):
         # Define form fields common to all forms.
         form.description.data = task.description
         form.detailed_info.data = task.detailed_info
-        form.facility.data = task.facility.id
+        form.select_facility(task.facility)
 
     elif request.method == "POST":
         if task.resolved:
@@ -103,49 +160,17 @@ def update_task(task_id):
 
         if form.validate_on_submit():
             # Cache state before, will need it to send emails.
-            assigned_to = task.assigned_to_id
-            resolved = task.resolved
-            done = task.progress
-            confirmed = task.confirmed
+            before = task.snapshot()
+            data = dict((field.name, field.data) for field in form)
+            data['facility_id'] = data.pop('facility')
             # Update data contained within specific fields according to user rights.
-            if current_user.is_admin:
-                task.acknowledged = form.acknowledged.data
-                task.confirmed = form.confirmed.data
-                task.assigned_to_id = form.assigned_to_id.data
-                task.progress = form.progress.data
-                task.facility_id = form.facility.data
-                task.resolved = form.resolved.data
-                task.progress = form.progress.data
-            elif current_user.is_maintenance:
-                if not form.acknowledged.data and form.progress.data != task.progress:
-                    # This guy updated progess but did not acknowledge receipt.
-                    # Let's kindly do that for them.
-                    form.acknowledged.data = True
-                task.acknowledged = form.acknowledged.data
-                task.progress = form.progress.data
-            # Common fields
-            task.description = form.description.data
-            task.detailed_info = form.detailed_info.data
+            task.apply_update(current_user, data)
             db.session.add(task)
-            db.session.commit()
-            flash("Task update successful.")
 
             # Resolve what emails to send, if any.
-            if assigned_to != task.assigned_to_id:
-                # Notify the new assigned staff of the assignment.
-                send_mail(task, assigned=True)
-            if not resolved and task.resolved:
-                # If this was just marked as resolved by admin, inform the user.
-                send_mail(task, resolved=True)
-            if done != task.progress and task.progress == TaskStatus.DONE:
-                # If a maintainer just completed a task, notify the admin.
-                # Don't notify though, if the admin's responsible for the update.
-                if not current_user.is_admin:
-                    admin = User.query.filter_by(email=current_app.config['MAINTRAQ_ADMIN']).first()
-                    send_mail(task, done=True, user=admin, updated_by=current_user)
-
-            if not confirmed and task.confirmed:
-                send_mail(task, confirmed=True)
+            notify_task_changes(task, before, current_user)
+            db.session.commit()
+            flash("Task update successful.")
             return redirect(url_for('main.view_task', task_id=task.id))
         else:
             flash("Your form has some errors. Please correct them and try again.")
@@ -158,7 +183,7 @@ def update_task(task_id):
 def reject_task(task_id):
     if not current_user.is_admin:
         abort(403)
-    task = Task.query.get_or_404(task_id)
+    task = Task.list_query().get_or_404(task_id)
     form = RejectTaskForm()
 
     if request.method == 'POST':
@@ -170,60 +195,26 @@ def reject_task(task_id):
             'requested_by_name': task.requested_by.username,
             'reasons': form.rejection_reasons.data
         }
+        TaskEvent.record(task, TaskEvent.REJECTED)
+        TaskTombstone.record(task)
         db.session.delete(task)
-        db.session.commit()
         send_mail(task=temp, rejected=True)
+        db.session.commit()
         return redirect(url_for('main.index'))
     return render_template('main/task-reject.html', task=task, form=form)
 
 
-def send_mail(
-        task, assigned=False, created=False, user=None,
-        resolved=False, done=False, rejected=False, confirmed=False, **kwargs):
-    if assigned:
-        # Notify whoever was assigned via email
-        send_email(
-            task.assigned_to.email,
-            "New Maintenance Task Assignment",
-            'main/email/new-assignment',
-            task=task
-        )
-    elif created:
-        # Notify the admin of the new task.
-        send_email(
-            current_app.config['MAINTRAQ_ADMIN'],
-            "New Maintenance Request",
-            "main/email/new-task-request",
-            task=task, user=user
-        )
-    elif resolved:
-        send_email(
-            task.requested_by.email,
-            "Maintenance Request Resolved",
-            "main/email/resolved",
-            task=task
-        )
-    elif done:
-        send_email(
-            current_app.config['MAINTRAQ_ADMIN'],
-            "Newly Completed Maintenance Task",
-            "main/email/task-complete",
-            task=task, user=user, **kwargs
-        )
-    elif rejected:
-        send_email(
-            task['requested_by'],
-            "Maintenance Request Rejected",
-            "main/email/task-rejected",
-            task=task
-        )
-    elif confirmed:
-        send_email(
-            task.requested_by.email,
-            "Maintenance Request Confirmed",
-            "main/email/task-confirmed",
-            task=task
-        )
+@main.route('/events')
+@login_required
+def events():
+    # Server-sent events for the tasks this user can see. Clients reconnect
+    # with Last-Event-ID and get what they missed first.
+    subscriber = task_events.subscribe(current_user)
+    backlog = task_events.replay(subscriber, request.headers.get('Last-Event-ID'))
+    response = Response(task_events.stream(subscriber, backlog), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @main.route('/facility/create', methods=['GET', 'POST'])
@@ -233,10 +224,21 @@ def create_facility():
     if form.validate_on_submit():
         facility = Facility(name=form.name.data)
         db.session.add(facility)
+        Facility.invalidate_choices()
+        db.session.commit()
         return redirect(url_for('main.index'))
     return render_template('main/create-facility.html', form=form)
 
 
+@main.route('/facilities/search')
+@read_only
+@login_required
+def search_facilities():
+    query = request.args.get('q', '').strip()
+    facilities = Facility.search(query) if query else []
+    return jsonify({'facilities': [{'id': id, 'name': name} for id, name in facilities]})
+
+
 @main.route('/edit-profile/<username>', methods=['GET', 'POST'])
 @login_required
 def edit_profile_admin(username):
@@ -248,6 +250,9 @@ def edit_profile_admin(username):
     form = EditProfileAdminForm(user=user)
     if form.validate_on_submit():
         try:
+            roster_changed = form.is_maintenance.data != bool(user.is_maintenance) or (
+                user.is_maintenance and form.username.data != user.username
+            )
             user.email = form.email.data
             user.username = form.username.data
             user.name = form.name.data
@@ -255,7 +260,12 @@ def edit_profile_admin(username):
             user.phonenumber_locale = form.phonenumber_locale if form.phonenumber.data else None
             user.is_admin = form.is_admin.data
             user.is_maintenance = form.is_maintenance.data
+            user.digest_opt_in = bool(
+                user.is_admin and form.digest_opt_in is not None and form.digest_opt_in.data)
             db.session.add(user)
+            if roster_changed:
+                User.invalidate_maintainers()
+            user.uncache()
             db.session.commit()
             flash("The profile has been updated.")
             return redirect(url_for('main.users_list'))
@@ -268,15 +278,86 @@ def edit_profile_admin(username):
     form.name.data = user.name
     form.is_admin.data = user.is_admin
     form.is_maintenance.data = user.is_maintenance
+    if form.digest_opt_in is not None:
+        form.digest_opt_in.data = user.digest_opt_in
     form.phonenumber.data = user.phonenumber
 
     return render_template('main/edit_profile.html', form=form, user=user)
 
 
 @main.route('/users')
+@read_only
 def users_list():
     if not current_user.is_admin:
         abort(403)
     users = User.query.order_by(User.username.asc()).all()
 
     return render_template('main/users-list.html', users=users)
+
+
+@main.route('/cache-stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(dict((name, cache.stats()) for name, cache in caches.items()))
+
+
+@main.route('/reports')
+@read_only
+@login_required
+def reports():
+    # Reads only the rollup tables; `manage.py refresh_rollups` fills them.
+    if not current_user.is_admin:
+        abort(403)
+    period = request.args.get('period')
+    if period not in (TaskRollup.DAY, TaskRollup.WEEK):
+        period = TaskRollup.WEEK
+    dimension = request.args.get('by')
+    if dimension not in (TaskRollup.FACILITY, TaskRollup.MAINTAINER):
+        dimension = TaskRollup.FACILITY
+
+    today = datetime.now().date()
+    if period == TaskRollup.DAY:
+        since = today - timedelta(days=current_app.config['MAINTRAQ_REPORT_DAYS'])
+    else:
+        since = today - timedelta(weeks=current_app.config['MAINTRAQ_REPORT_WEEKS'])
+    rollups = TaskRollup.query.filter(
+        TaskRollup.period == period, TaskRollup.dimension == dimension,
+        TaskRollup.period_start >= since
+    ).order_by(TaskRollup.period_start.desc(), TaskRollup.completed.desc()).all()
+
+    facilities = dict(Facility.choices())
+    if dimension == TaskRollup.FACILITY:
+        names = facilities
+    else:
+        names = dict((id, username) for id, username, count in User.maintainers())
+    return render_template(
+        'main/reports.html', rollups=rollups, names=names, facilities=facilities,
+        backlog=TaskBacklog.latest(), last_run=RollupRun.last(), period=period,
+        dimension=dimension
+    )
+
+
+@main.route('/profiles')
+@login_required
+def profiles():
+    if not current_user.is_admin:
+        abort(403)
+    return render_template('main/profiles.html', profiles=profiler.slowest(),
+                           enabled=current_app.config['MAINTRAQ_PROFILING'])
+
+
+@main.route('/profiles/<name>')
+@login_required
+def view_profile(name):
+    if not current_user.is_admin:
+        abort(403)
+    profile = profiler.get(name)
+    if profile is None:
+        abort(404)
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        sort = 'cumulative'
+    return render_template('main/profile-detail.html', profile=profile,
+                           report=profile.report(sort=sort), sort=sort)
@@ -0,0 +1,118 @@
+import ipaddress
+import os
+from timeit import default_timer
+
+from flask import Response, abort, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+
+# With gunicorn, set `prometheus_multiproc_dir` (see gunicorn_conf.py) so each
+# worker writes its samples there and a scrape of any worker reports them all.
+REQUEST_LATENCY = Histogram(
+    'maintraq_request_latency_seconds', 'Request latency by endpoint.', ['endpoint'])
+RESPONSES = Counter('maintraq_responses_total', 'Responses sent, by status code.', ['status'])
+DB_POOL_CHECKED_OUT = Gauge(
+    'maintraq_db_pool_checked_out', 'Database connections checked out of the pool.',
+    multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge(
+    'maintraq_db_pool_overflow', 'Database connections open beyond the pool size.',
+    multiprocess_mode='livesum')
+EMAILS_QUEUED = Counter('maintraq_emails_queued_total', 'Emails added to the outbox.')
+EMAILS_SENT = Counter('maintraq_emails_sent_total', 'Emails delivered to the SMTP server.')
+EMAILS_FAILED = Counter('maintraq_emails_failed_total', 'Email delivery attempts that failed.')
+EMAIL_WORKERS = Gauge(
+    'maintraq_email_workers', 'Live email outbox worker threads.', multiprocess_mode='livesum')
+
+# Only these blueprints get latency histograms; the rest would just add noise.
+TIMED_BLUEPRINTS = ('main', 'auth')
+
+
+class OutboxCollector:
+    # Read at scrape time, since the backlog is shared by every process.
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        from . import db
+        from .models import OutboundEmail
+
+        gauge = GaugeMetricFamily(
+            'maintraq_email_backlog', 'Emails waiting in the outbox, by status.',
+            labels=['status'])
+        with self.app.app_context():
+            try:
+                counts = dict(
+                    db.session.query(OutboundEmail.status, db.func.count(OutboundEmail.id))
+                    .filter(OutboundEmail.status.in_([OutboundEmail.PENDING,
+                                                      OutboundEmail.SENDING]))
+                    .group_by(OutboundEmail.status)
+                )
+            finally:
+                db.session.remove()
+        for status in (OutboundEmail.PENDING, OutboundEmail.SENDING):
+            gauge.add_metric([status], counts.get(status, 0))
+        yield gauge
+
+
+class Metrics:
+    """Prometheus metrics for the app, served at `/metrics` to the addresses
+    in `MAINTRAQ_METRICS_ALLOW`."""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def start(self):
+        g.metrics_started = default_timer()
+
+    def finish(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None and request.blueprint in TIMED_BLUEPRINTS:
+            REQUEST_LATENCY.labels(request.endpoint).observe(default_timer() - started)
+        RESPONSES.labels(str(response.status_code)).inc()
+        self.observe_pool()
+        return response
+
+    def observe_pool(self):
+        from . import db
+
+        pool = db.engine.pool
+        # Only QueuePool tracks these; SQLite's pools don't.
+        if hasattr(pool, 'checkedout'):
+            DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        if hasattr(pool, 'overflow'):
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    def allowed(self, address):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(address in ipaddress.ip_network(network)
+                   for network in self.app.config['MAINTRAQ_METRICS_ALLOW'])
+
+    def view(self):
+        from . import outbox
+
+        if not self.allowed(request.remote_addr):
+            abort(403)
+        outbox.observe()
+        if 'prometheus_multiproc_dir' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        backlog = CollectorRegistry()
+        backlog.register(OutboxCollector(self.app))
+        return Response(generate_latest(registry) + generate_latest(backlog),
+                        mimetype=CONTENT_TYPE_LATEST)
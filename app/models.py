@@ -1,13 +1,31 @@
-from datetime import datetime
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime, timedelta
 
-from flask import current_app
+from flask import current_app, url_for
 
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask.ext.login import UserMixin
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from . import db
 from . import login_manager
+from . import last_seen_buffer
+from .cache import SharedTTLCache, TTLCache, VersionedCache
+from .pagination import KeysetPage, after_key, decode_position, encode_position
+from .search import TaskSearch
+
+# Column values of recently loaded users, keyed by id, for the login manager.
+user_cache = SharedTTLCache('users')
+# (id, name) pairs of every facility, for the task forms' select box.
+facility_choices = VersionedCache('facility_choices')
+# (id, username) of every maintainer, and their open task counts which are
+# allowed to lag a little behind.
+maintainer_roster = VersionedCache('maintainers')
+maintainer_load = TTLCache('maintainer_load', maxsize=1, ttl=30)
 
 
 class User(UserMixin, db.Model):
@@ -28,6 +46,10 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(64))
     last_seen = db.Column(db.DateTime(), default=datetime.now)
 
+    # Collect new/completed task notifications into a periodic digest.
+    digest_opt_in = db.Column(db.Boolean, default=False)
+    digest_sent_at = db.Column(db.DateTime(), nullable=True)
+
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         # Make user admin if they are the designated admins in the env
@@ -48,7 +70,30 @@ class User(UserMixin, db.Model):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        user_id = int(user_id)
+        data = user_cache.get(user_id)
+        if data is not None:
+            return User.from_cache(data)
+        user = User.query.get(user_id)
+        if user is not None:
+            user_cache.set(user_id, dict(
+                (column.key, getattr(user, column.key)) for column in User.__table__.columns
+            ))
+        return user
+
+    @staticmethod
+    def from_cache(data):
+        # Rebuild a persistent User from cached column values without a SELECT.
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in data.items():
+            set_committed_value(user, key, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def uncache(self):
+        # Call before committing changes to a user so every process reloads
+        # it, and drops its other cached users, once the change commits.
+        user_cache.invalidate(self.id)
 
     def generate_confirmation_token(self, expiration=3600):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -68,8 +113,37 @@ class User(UserMixin, db.Model):
         return True
 
     def ping(self):
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
+        now = datetime.now()
+        interval = timedelta(seconds=current_app.config['MAINTRAQ_LAST_SEEN_INTERVAL'])
+        last = max(
+            [seen for seen in (self.last_seen, last_seen_buffer.recorded(self.id)) if seen],
+            default=None
+        )
+        if last is not None and now - last < interval:
+            return
+        # Buffer the write rather than dirtying the session, so the request
+        # doesn't turn into an UPDATE on users at teardown.
+        set_committed_value(self, 'last_seen', now)
+        last_seen_buffer.record(self.id, now)
+
+    def generate_auth_token(self, expiration=3600):
+        # Salted so the confirmation and reset tokens, signed with the same
+        # key, can't be used to authenticate.
+        s = Serializer(current_app.config['SECRET_KEY'], expires_in=expiration, salt='auth-token')
+        return s.dumps({'id': self.id}).decode('ascii')
+
+    @staticmethod
+    def verify_auth_token(token):
+        s = Serializer(current_app.config['SECRET_KEY'], salt='auth-token')
+        try:
+            data = s.loads(token)
+        except:
+            return None
+        user_id = data.get('id') if isinstance(data, dict) else None
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            # Not one of ours, or `True` passing for user 1.
+            return None
+        return User.load_user(user_id)
 
     def generate_reset_token(self, expiration=3600):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -111,11 +185,27 @@ class User(UserMixin, db.Model):
 
     @property
     def tasks(self):
-        return Task.query.filter_by(requested_by=self)
+        return Task.list_query().filter_by(requested_by_id=self.id)
 
     @property
     def assigned(self):
-        return Task.query.filter_by(assigned_to=self)
+        return Task.list_query().filter_by(assigned_to_id=self.id)
+
+    @staticmethod
+    def maintainers():
+        roster = maintainer_roster.get(lambda: tuple(
+            db.session.query(User.id, User.username)
+            .filter_by(is_maintenance=True).order_by(User.username)
+        ))
+        load = maintainer_load.get('open')
+        if load is None:
+            load = TaskCounter.counts(TaskCounter.ASSIGNEE_OPEN)
+            maintainer_load.set('open', load)
+        return [(id, username, load.get(id, 0)) for id, username in roster]
+
+    @staticmethod
+    def invalidate_maintainers():
+        maintainer_roster.invalidate()
 
     @staticmethod
     def fake(count=50):
@@ -150,6 +240,23 @@ class Facility(db.Model):
     name = db.Column(db.String(64), index=True, unique=True)
     tasks = db.relationship('Task', backref='facility', lazy='dynamic')
 
+    @staticmethod
+    def choices():
+        return facility_choices.get(lambda: tuple(
+            db.session.query(Facility.id, Facility.name).order_by(Facility.name)
+        ))
+
+    @staticmethod
+    def invalidate_choices():
+        facility_choices.invalidate()
+
+    @staticmethod
+    def search(prefix, limit=20):
+        prefix = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return db.session.query(Facility.id, Facility.name).filter(
+            Facility.name.like(prefix + '%', escape='\\')
+        ).order_by(Facility.name).limit(limit).all()
+
     @staticmethod
     def fake(count=50):
         from sqlalchemy.exc import IntegrityError
@@ -170,6 +277,93 @@ class Facility(db.Model):
         return '<Facility %s>' % self.name
 
 
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def get(name):
+        return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+
+    @staticmethod
+    def bump(name):
+        table = CacheVersion.__table__
+        result = db.session.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        )
+        if not result.rowcount:
+            db.session.execute(table.insert().values(name=name, version=1))
+
+    @staticmethod
+    def next(connection, name):
+        # Bumps `name` and returns its new value. The row stays locked until
+        # the transaction ends, so transactions get values in commit order.
+        table = CacheVersion.__table__
+        result = connection.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(name=name, version=1))
+        return connection.execute(
+            db.select([table.c.version]).where(table.c.name == name)).scalar()
+
+    def __repr__(self):
+        return '<CacheVersion %s=%s>' % (self.name, self.version)
+
+
+class TaskRevision:
+    """Numbers the transactions that change tasks in the order they commit.
+
+    Just before a commit, the tasks, tombstones and task events the
+    transaction wrote get the next revision. Taking it locks its
+    CacheVersion row until the commit, so revisions become visible in order
+    and without gaps: a reader that has seen revision N will never find
+    another change at or below it, however long a transaction took. The
+    change feed and the event stream order on `(revision, id)`.
+    """
+    NAME = 'task_revision'
+
+    @staticmethod
+    def written(session, model, ids):
+        # For writes the flush hooks don't see, like bulk UPDATEs.
+        session.info.setdefault(TaskRevision.NAME, {}).setdefault(model, set()).update(ids)
+
+    @staticmethod
+    def collect(session, flush_context):
+        # Runs after every flush, while `new` and `dirty` still hold what it
+        # wrote.
+        for obj in session.new:
+            if isinstance(obj, (Task, TaskTombstone, TaskEvent)):
+                TaskRevision.written(session, type(obj), [obj.id])
+        for obj in session.dirty:
+            if isinstance(obj, Task) and session.is_modified(obj, include_collections=False):
+                TaskRevision.written(session, Task, [obj.id])
+
+    @staticmethod
+    def stamp(session):
+        session.flush()
+        written = session.info.pop(TaskRevision.NAME, None)
+        if not written:
+            return
+        connection = session.connection(mapper=db.inspect(Task))
+        revision = CacheVersion.next(connection, TaskRevision.NAME)
+        for model, ids in written.items():
+            table = model.__table__
+            connection.execute(
+                table.update().where(table.c.id.in_(ids)).values(revision=revision))
+
+    @staticmethod
+    def forget(session, transaction):
+        if transaction.parent is None:
+            session.info.pop(TaskRevision.NAME, None)
+
+
+db.event.listen(db.session, 'after_flush', TaskRevision.collect)
+db.event.listen(db.session, 'before_commit', TaskRevision.stamp)
+db.event.listen(db.session, 'after_transaction_end', TaskRevision.forget)
+
+
 class TaskStatus:
     NOT_STARTED = 0
     STARTED = 1
@@ -179,6 +373,19 @@ class TaskStatus:
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    # Matched to the dashboard queries: a requester's unconfirmed tasks and a
+    # maintainer's assignments, both newest first, the open task counts and
+    # the change feed.
+    __table_args__ = (
+        db.Index('ix_tasks_requested_by_confirmed_date',
+                 'requested_by_id', 'confirmed', 'date_requested', 'id'),
+        db.Index('ix_tasks_assigned_to_date', 'assigned_to_id', 'date_requested', 'id'),
+        db.Index('ix_tasks_revision_id', 'revision', 'id'),
+        db.Index('ix_tasks_unresolved_facility', 'facility_id',
+                 sqlite_where=db.text('resolved IS NOT 1'),
+                 postgresql_where=db.text('resolved IS NOT true')),
+        db.Index('ix_tasks_updated_id', 'updated', 'id'),
+    )
     # pk
     id = db.Column(db.Integer, primary_key=True)
 
@@ -196,10 +403,15 @@ class Task(db.Model):
     confirmed = db.Column(db.Boolean, default=False)
     resolved = db.Column(db.Boolean, default=False)
     acknowledged = db.Column(db.Boolean, default=False)
-    updated = db.Column(db.DateTime, default=datetime.now)
+    # UTC, unlike the other dates, as the change feed reports it and local
+    # time can go backwards.
+    updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # The change feed's order, set as the transaction commits; see
+    # `TaskRevision`. Rows written around the flush hooks stay at 0.
+    revision = db.Column(db.Integer, default=0)
     progress = db.Column(db.Integer, default=TaskStatus.NOT_STARTED)
     date_requested = db.Column(db.DateTime(), index=True, default=datetime.now)
-    date_completed = db.Column(db.DateTime(), nullable=True)
+    date_completed = db.Column(db.DateTime(), index=True, nullable=True)
 
     def __repr__(self):
         return "<Task {!r:.15}{} Requested On: {:%a %b %d %H:%M:%S %Y} >".format(
@@ -208,10 +420,163 @@ class Task(db.Model):
             self.date_requested
         )
 
+    def to_json(self):
+        return {
+            'id': self.id,
+            'url': url_for('api.get_task', task_id=self.id, _external=True),
+            'description': self.description,
+            'detailed_info': self.detailed_info,
+            'facility_id': self.facility_id,
+            'facility': self.facility.name,
+            'requested_by_id': self.requested_by_id,
+            'requested_by': self.requested_by.username,
+            'assigned_to_id': self.assigned_to_id,
+            'assigned_to': self.assigned_to.username if self.assigned_to else None,
+            'confirmed': self.confirmed,
+            'acknowledged': self.acknowledged,
+            'resolved': self.resolved,
+            'progress': self.progress,
+            'status': self.status,
+            'date_requested': self.date_requested.isoformat(),
+            'date_completed': self.date_completed.isoformat() if self.date_completed else None,
+            'updated': self.updated.isoformat() if self.updated else None,
+        }
+
+    def can_view(self, user):
+        return Task.viewable_by(user, self.requested_by_id)
+
+    @staticmethod
+    def viewable_by(user, requested_by_id):
+        return user.is_admin or user.is_maintenance or requested_by_id == user.id
+
+    def can_update(self, user):
+        return self.can_view(user)
+
+    # What each role may change on a task, on top of the description.
+    ADMIN_FIELDS = (
+        'acknowledged', 'confirmed', 'assigned_to_id', 'facility_id', 'resolved', 'progress'
+    )
+    MAINTAINER_FIELDS = ('acknowledged', 'progress')
+
+    def snapshot(self):
+        # The state notifications are decided from, see `notify_task_changes`.
+        return {
+            'assigned_to_id': self.assigned_to_id,
+            'resolved': self.resolved,
+            'progress': self.progress,
+            'confirmed': self.confirmed,
+        }
+
+    def apply_update(self, user, data):
+        # Applies the fields in `data` that `user`'s role allows them to change.
+        if user.is_admin:
+            fields = Task.ADMIN_FIELDS
+        elif user.is_maintenance:
+            fields = Task.MAINTAINER_FIELDS
+            acknowledged = data.get('acknowledged', self.acknowledged)
+            if not acknowledged and data.get('progress', self.progress) != self.progress:
+                # This guy updated progess but did not acknowledge receipt.
+                # Let's kindly do that for them.
+                data = dict(data, acknowledged=True)
+        else:
+            fields = ()
+        for field in fields + ('description', 'detailed_info'):
+            if field in data:
+                setattr(self, field, data[field])
+
+    # Admin bulk actions, see `bulk_update`.
+    CONFIRM = 'confirm'
+    ASSIGN = 'assign'
+    PROGRESS = 'progress'
+    RESOLVE = 'resolve'
+
+    @staticmethod
+    def bulk_update(ids, action, value=None):
+        """Apply one admin action to many unresolved tasks with a single UPDATE.
+
+        Mirrors what `update_task` does to each task: `updated` is bumped and
+        `date_completed` is set when a task first becomes DONE. Returns the
+        ids of the tasks that were changed. The caller commits.
+        """
+        now = datetime.now()
+        affected = Task.query.filter(Task.id.in_(ids), Task.resolved.isnot(True))
+        if action == Task.CONFIRM:
+            affected = affected.filter(Task.confirmed.isnot(True))
+            changes = {'confirmed': True}
+        elif action == Task.ASSIGN:
+            affected = affected.filter(db.or_(
+                Task.assigned_to_id.is_(None), Task.assigned_to_id != value))
+            changes = {'assigned_to_id': value}
+        elif action == Task.PROGRESS:
+            changes = {'progress': value}
+        elif action == Task.RESOLVE:
+            changes = {'resolved': True}
+        else:
+            raise ValueError('Unknown bulk action {!r}'.format(action))
+
+        before = affected.with_entities(Task.id, *[
+            getattr(Task, name) for name in TaskCounter.COUNTED
+        ]).all()
+        if not before:
+            return []
+        changed_ids = [row[0] for row in before]
+
+        values = dict((getattr(Task, name), change) for name, change in changes.items())
+        values[Task.updated] = datetime.utcnow()
+        if changes.get('progress') == TaskStatus.DONE:
+            # Only tasks that weren't already done get a completion date.
+            values[Task.date_completed] = db.case(
+                [(db.func.coalesce(Task.progress, TaskStatus.NOT_STARTED) != TaskStatus.DONE,
+                  now)],
+                else_=Task.date_completed
+            )
+        Task.query.filter(Task.id.in_(changed_ids)).update(values, synchronize_session=False)
+        TaskRevision.written(db.session, Task, changed_ids)
+
+        # Bulk UPDATEs skip the flush hooks, so adjust the counters here.
+        deltas = Counter()
+        for row in before:
+            old = list(row[1:])
+            new = [changes.get(name, current) for name, current in zip(TaskCounter.COUNTED, old)]
+            for key in TaskCounter.keys_for(*old):
+                deltas[key] -= 1
+            for key in TaskCounter.keys_for(*new):
+                deltas[key] += 1
+        TaskCounter.apply(db.session.connection(mapper=db.inspect(Task)), deltas)
+        # Objects already loaded in this session are now stale.
+        db.session.expire_all()
+        return changed_ids
+
+    @staticmethod
+    def touch(session, flush_context, instances):
+        # Any change to a task bumps `updated`, which the task ETags and the
+        # change feed rely on.
+        now = datetime.utcnow()
+        for obj in session.dirty:
+            if isinstance(obj, Task) and session.is_modified(obj, include_collections=False):
+                obj.updated = now
+
+    @staticmethod
+    def version(task_id):
+        # When a task last changed and who requested it, in one primary key
+        # lookup: enough to check access and answer a conditional GET.
+        return db.session.query(
+            db.func.coalesce(Task.updated, Task.date_requested), Task.requested_by_id
+        ).filter(Task.id == task_id).first()
+
+    @staticmethod
+    def etag(task_id, updated, user):
+        # Pages differ by role, carry the viewer's own name, and change with
+        # each release.
+        role = 'admin' if user.is_admin else 'maintenance' if user.is_maintenance else 'user'
+        key = '{}:{}:{}:{}:{}'.format(
+            task_id, updated.isoformat(), role, user.id, current_app.config['MAINTRAQ_RELEASE'])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
     @staticmethod
     def update_updated(target, value, oldvalue, *args, **kwargs):
         # update this date every time a task is updated.
-        target.updated = datetime.now()
+        target.updated = datetime.utcnow()
 
         # If it was just completed, set that time.
         if value != oldvalue and value == TaskStatus.DONE:
@@ -231,6 +596,109 @@ class Task(db.Model):
             return "In Progress"
         return "DONE"
 
+    @staticmethod
+    def list_query():
+        # Every task list and detail page shows the requester, assignee and
+        # facility, so load them with the task instead of lazily per row.
+        return Task.query.options(
+            db.joinedload(Task.requested_by),
+            db.joinedload(Task.assigned_to),
+            db.joinedload(Task.facility)
+        )
+
+    @staticmethod
+    def dashboard_query(user):
+        # The tasks a user gets to see on their dashboard, depending on role.
+        if user.is_admin:
+            return Task.list_query()
+        elif user.is_maintenance:
+            return user.assigned
+        return user.tasks.filter_by(confirmed=False)
+
+    @staticmethod
+    def keyset_page(query, after=None, before=None, per_page=None):
+        if per_page is None:
+            per_page = current_app.config['MAINTRAQ_TASKS_PER_PAGE']
+        return KeysetPage(
+            query, Task.date_requested, Task.id, per_page, after=after, before=before
+        )
+
+    @staticmethod
+    def changes(user, cursor=None, limit=100):
+        """Tasks changed, and tombstones of tasks deleted, after `cursor`.
+
+        Both are ordered on `(revision, id)` and share one cursor. Revisions
+        are given out in commit order, so a change that commits late still
+        lands after every cursor handed out before it.
+        Returns `(tasks, tombstones, next cursor, more)`.
+        """
+        key = decode_position(cursor)
+        tasks = Task.list_query()
+        tombstones = TaskTombstone.query
+        if not (user.is_admin or user.is_maintenance):
+            tasks = tasks.filter(Task.requested_by_id == user.id)
+            tombstones = tombstones.filter(TaskTombstone.requested_by_id == user.id)
+        if key is not None:
+            tasks = tasks.filter(after_key(Task.revision, Task.id, key))
+            tombstones = tombstones.filter(
+                after_key(TaskTombstone.revision, TaskTombstone.task_id, key))
+
+        rows = [((task.revision, task.id), task) for task in
+                tasks.order_by(Task.revision, Task.id).limit(limit + 1)]
+        rows += [((tombstone.revision, tombstone.task_id), tombstone) for tombstone in
+                 tombstones.order_by(TaskTombstone.revision, TaskTombstone.task_id)
+                 .limit(limit + 1)]
+        rows.sort(key=lambda row: row[0])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            cursor = encode_position(*rows[-1][0])
+        return (
+            [row for _, row in rows if isinstance(row, Task)],
+            [row for _, row in rows if isinstance(row, TaskTombstone)],
+            cursor, more
+        )
+
+    @staticmethod
+    def pending_count():
+        return TaskCounter.get(TaskCounter.OPEN)
+
+    @staticmethod
+    def search(user, terms, page=1, per_page=None):
+        # Ranked matches the user may see, and whether there's another page.
+        if per_page is None:
+            per_page = current_app.config['MAINTRAQ_SEARCH_RESULTS_PER_PAGE']
+        requested_by_id = None if user.is_admin or user.is_maintenance else user.id
+        ids = TaskSearch.ranked_ids(
+            db.session.connection(mapper=db.inspect(Task)), terms,
+            per_page + 1, (page - 1) * per_page, requested_by_id
+        )
+        more = len(ids) > per_page
+        ids = ids[:per_page]
+        if not ids:
+            return [], False
+        tasks = dict((task.id, task) for task in Task.list_query().filter(Task.id.in_(ids)))
+        return [tasks[id] for id in ids if id in tasks], more
+
+    @staticmethod
+    def digest(since, until):
+        # Everything requested or completed in the window, grouped by facility.
+        tasks = Task.list_query().filter(db.or_(
+            db.and_(Task.date_requested > since, Task.date_requested <= until),
+            db.and_(Task.date_completed > since, Task.date_completed <= until)
+        )).order_by(Task.date_requested).all()
+
+        groups = {}
+        for task in tasks:
+            group = groups.setdefault(task.facility_id, {
+                'facility': task.facility, 'requested': [], 'completed': []
+            })
+            if since < task.date_requested <= until:
+                group['requested'].append(task)
+            if task.date_completed and since < task.date_completed <= until:
+                group['completed'].append(task)
+        return sorted(groups.values(), key=lambda group: group['facility'].name)
+
     @staticmethod
     def fake():
         import random
@@ -256,3 +724,338 @@ class Task(db.Model):
                 db.session.rollback()
 
 db.event.listen(Task.progress, 'set', Task.update_updated)
+
+
+class TaskCounter(db.Model):
+    __tablename__ = 'task_counters'
+    __table_args__ = (db.UniqueConstraint('kind', 'key'),)
+
+    # Counter kinds. `key` is the facility, status or assignee id respectively,
+    # and 0 for the overall open count.
+    OPEN = 'open'
+    FACILITY_OPEN = 'facility_open'
+    STATUS = 'status'
+    ASSIGNEE_OPEN = 'assignee_open'
+
+    # Task columns the counters depend on, in `keys_for` argument order.
+    COUNTED = ('facility_id', 'progress', 'assigned_to_id', 'resolved')
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    key = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<TaskCounter %s:%s=%s>' % (self.kind, self.key, self.value)
+
+    @staticmethod
+    def get(kind, key=0):
+        value = db.session.query(TaskCounter.value).filter_by(kind=kind, key=key).scalar()
+        return value or 0
+
+    @staticmethod
+    def counts(kind):
+        return dict(
+            db.session.query(TaskCounter.key, TaskCounter.value).filter_by(kind=kind).all()
+        )
+
+    @staticmethod
+    def keys_for(facility_id, progress, assigned_to_id, resolved):
+        # The counters a task with these values contributes one to.
+        if progress is None:
+            progress = TaskStatus.NOT_STARTED
+        keys = [(TaskCounter.STATUS, progress)]
+        if not resolved:
+            keys.append((TaskCounter.OPEN, 0))
+            keys.append((TaskCounter.FACILITY_OPEN, facility_id))
+            if assigned_to_id is not None:
+                keys.append((TaskCounter.ASSIGNEE_OPEN, assigned_to_id))
+        return keys
+
+    @staticmethod
+    def apply(connection, deltas):
+        # Sorted so concurrent transactions lock counter rows in the same order.
+        rows = [
+            dict(kind=kind, key=key, value=delta)
+            for (kind, key), delta in sorted(deltas.items()) if delta
+        ]
+        if rows:
+            connection.execute(TaskCounter.upsert(connection), rows)
+
+    @staticmethod
+    def upsert(connection):
+        # A single statement, so two transactions creating the same counter
+        # can't both miss its row and then collide on the unique key.
+        table = TaskCounter.__table__
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            statement = insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.key],
+                set_=dict(value=table.c.value + statement.excluded.value)
+            )
+        # SQLite 3.24+; SQLAlchemy has no construct for its upsert yet.
+        return db.text(
+            'INSERT INTO task_counters (kind, "key", value) VALUES (:kind, :key, :value) '
+            'ON CONFLICT (kind, "key") DO UPDATE SET value = task_counters.value + excluded.value'
+        )
+
+    @staticmethod
+    def track(session, flush_context, instances):
+        # Runs before every flush so counters change in the same transaction
+        # as the tasks they count.
+        deltas = Counter()
+        for task in session.new:
+            if isinstance(task, Task):
+                for key in TaskCounter.keys_for(*TaskCounter._current(task)):
+                    deltas[key] += 1
+        for task in session.deleted:
+            if isinstance(task, Task):
+                for key in TaskCounter.keys_for(*TaskCounter._committed(task)):
+                    deltas[key] -= 1
+        for task in session.dirty:
+            if isinstance(task, Task) and session.is_modified(task):
+                for key in TaskCounter.keys_for(*TaskCounter._committed(task)):
+                    deltas[key] -= 1
+                for key in TaskCounter.keys_for(*TaskCounter._current(task)):
+                    deltas[key] += 1
+        if any(deltas.values()):
+            TaskCounter.apply(session.connection(), deltas)
+
+    @staticmethod
+    def _current(task):
+        return [getattr(task, name) for name in TaskCounter.COUNTED]
+
+    @staticmethod
+    def _committed(task):
+        attrs = db.inspect(task).attrs
+        values = []
+        for name in TaskCounter.COUNTED:
+            history = attrs[name].history
+            if history.deleted:
+                values.append(history.deleted[0])
+            elif history.unchanged:
+                values.append(history.unchanged[0])
+            else:
+                values.append(getattr(task, name))
+        return values
+
+    @staticmethod
+    def rebuild():
+        open_tasks = Task.query.filter(Task.resolved.isnot(True))
+        progress = db.func.coalesce(Task.progress, TaskStatus.NOT_STARTED)
+        rows = [(TaskCounter.OPEN, 0, open_tasks.count())]
+        rows += [
+            (TaskCounter.STATUS, status, count) for status, count in
+            db.session.query(progress, db.func.count(Task.id)).group_by(progress)
+        ]
+        rows += [
+            (TaskCounter.FACILITY_OPEN, facility_id, count) for facility_id, count in
+            open_tasks.with_entities(Task.facility_id, db.func.count(Task.id))
+            .group_by(Task.facility_id)
+        ]
+        rows += [
+            (TaskCounter.ASSIGNEE_OPEN, user_id, count) for user_id, count in
+            open_tasks.filter(Task.assigned_to_id.isnot(None))
+            .with_entities(Task.assigned_to_id, db.func.count(Task.id))
+            .group_by(Task.assigned_to_id)
+        ]
+
+        TaskCounter.query.delete()
+        db.session.bulk_insert_mappings(TaskCounter, [
+            dict(kind=kind, key=key, value=value) for kind, key, value in rows
+        ])
+        db.session.commit()
+        return len(rows)
+
+db.event.listen(db.session, 'before_flush', Task.touch)
+db.event.listen(db.session, 'before_flush', TaskCounter.track)
+db.event.listen(db.session, 'after_flush', TaskSearch.track)
+
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(64), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text())
+    html = db.Column(db.Text())
+
+    status = db.Column(db.String(16), nullable=False, default=PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(), default=datetime.now)
+    claimed_by = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime())
+    last_error = db.Column(db.Text())
+    created_at = db.Column(db.DateTime(), default=datetime.now)
+    sent_at = db.Column(db.DateTime())
+
+    def __repr__(self):
+        return '<OutboundEmail %r to %s (%s)>' % (self.subject, self.recipient, self.status)
+
+    def mark_sent(self):
+        self.status = OutboundEmail.SENT
+        self.sent_at = datetime.now()
+        self.claimed_by = None
+        db.session.add(self)
+
+    def mark_failed(self, error):
+        self.attempts += 1
+        self.last_error = str(error)
+        self.claimed_by = None
+        if self.attempts >= current_app.config['MAINTRAQ_MAIL_MAX_ATTEMPTS']:
+            self.status = OutboundEmail.FAILED
+        else:
+            # Back off exponentially: 1x, 2x, 4x... the base delay.
+            delay = current_app.config['MAINTRAQ_MAIL_RETRY_BACKOFF'] * 2 ** (self.attempts - 1)
+            self.status = OutboundEmail.PENDING
+            self.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+        db.session.add(self)
+
+
+class TaskEvent(db.Model):
+    """A change to a task, for the live event stream. Written in the same
+    transaction as the change and pruned after a while (see `prune`)."""
+    __tablename__ = 'task_events'
+    __table_args__ = (db.Index('ix_task_events_revision_id', 'revision', 'id'),)
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    REJECTED = 'rejected'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: rejected tasks are deleted but their event stays.
+    task_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    requested_by_id = db.Column(db.Integer)
+    assigned_to_id = db.Column(db.Integer)
+    data = db.Column(db.Text(), nullable=False)
+    created_at = db.Column(db.DateTime(), index=True, default=datetime.utcnow)
+    # Set as the transaction commits, see `TaskRevision`. Readers order
+    # events on `(revision, id)`, since ids are handed out before commit.
+    revision = db.Column(db.Integer)
+
+    @staticmethod
+    def record(task, kind):
+        event = TaskEvent(
+            task_id=task.id,
+            kind=kind,
+            requested_by_id=task.requested_by_id,
+            assigned_to_id=task.assigned_to_id,
+            data=json.dumps({
+                'task_id': task.id,
+                'kind': kind,
+                'description': task.description,
+                'status': task.status,
+                'confirmed': task.confirmed,
+                'acknowledged': task.acknowledged,
+                'resolved': task.resolved,
+            })
+        )
+        db.session.add(event)
+        return event
+
+    @staticmethod
+    def prune(before):
+        count = TaskEvent.query.filter(TaskEvent.created_at < before).delete(
+            synchronize_session=False)
+        db.session.commit()
+        return count
+
+
+class TaskTombstone(db.Model):
+    """Marks a deleted task so the change feed can report the deletion."""
+    __tablename__ = 'task_tombstones'
+    __table_args__ = (
+        db.Index('ix_task_tombstones_revision_task_id', 'revision', 'task_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    requested_by_id = db.Column(db.Integer)
+    # UTC, like Task.updated.
+    deleted_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+    # Shares the change feed cursor with Task.revision.
+    revision = db.Column(db.Integer, default=0)
+    # So the rollups can recompute the day the task counted towards.
+    date_completed = db.Column(db.DateTime(), nullable=True)
+
+    def to_json(self):
+        return {
+            'id': self.task_id,
+            'deleted_at': self.deleted_at.isoformat(),
+        }
+
+    @staticmethod
+    def record(task):
+        tombstone = TaskTombstone(
+            task_id=task.id, requested_by_id=task.requested_by_id, deleted_at=datetime.utcnow(),
+            date_completed=task.date_completed)
+        db.session.add(tombstone)
+        return tombstone
+
+
+class TaskRollup(db.Model):
+    """Turnaround from request to completion for the tasks completed in one day
+    or week, per facility or maintainer. Refreshed by `manage.py refresh_rollups`."""
+    __tablename__ = 'task_rollups'
+    __table_args__ = (db.UniqueConstraint('period', 'period_start', 'dimension', 'key'),)
+
+    DAY = 'day'
+    WEEK = 'week'
+    FACILITY = 'facility'
+    MAINTAINER = 'maintainer'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(8), nullable=False)
+    # The day, or the Monday starting the week.
+    period_start = db.Column(db.Date(), nullable=False)
+    dimension = db.Column(db.String(16), nullable=False)
+    # The facility or maintainer's id.
+    key = db.Column(db.Integer, nullable=False)
+    completed = db.Column(db.Integer, nullable=False)
+    mean_hours = db.Column(db.Float, nullable=False)
+    median_hours = db.Column(db.Float, nullable=False)
+    p90_hours = db.Column(db.Float, nullable=False)
+
+
+class TaskBacklog(db.Model):
+    """How many tasks were open per facility, and how old they were, as of
+    each day's last rollup refresh."""
+    __tablename__ = 'task_backlog'
+    __table_args__ = (db.UniqueConstraint('day', 'facility_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date(), nullable=False)
+    facility_id = db.Column(db.Integer, nullable=False)
+    open = db.Column(db.Integer, nullable=False)
+    mean_age_hours = db.Column(db.Float, nullable=False)
+    p90_age_hours = db.Column(db.Float, nullable=False)
+    oldest_age_hours = db.Column(db.Float, nullable=False)
+
+    @staticmethod
+    def latest():
+        day = db.session.query(db.func.max(TaskBacklog.day)).scalar()
+        if day is None:
+            return []
+        return TaskBacklog.query.filter_by(day=day).order_by(TaskBacklog.open.desc()).all()
+
+
+class RollupRun(db.Model):
+    __tablename__ = 'rollup_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # UTC, as it's compared with Task.updated.
+    ran_at = db.Column(db.DateTime(), nullable=False, index=True)
+    days = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def last():
+        return RollupRun.query.order_by(RollupRun.ran_at.desc()).first()
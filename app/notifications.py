@@ -0,0 +1,183 @@
+from flask import current_app
+
+from . import db
+from .models import User, Task, TaskEvent, TaskStatus
+from .utils import queue_email
+
+
+# Emails and task events are only queued here; callers commit once they're
+# done notifying.
+
+def send_mail(
+        task, assigned=False, created=False, user=None,
+        resolved=False, done=False, rejected=False, confirmed=False, **kwargs):
+    if (created or done) and user is not None and user.is_admin and user.digest_opt_in:
+        # The admin gets these in their digest instead.
+        return
+    if assigned:
+        # Notify whoever was assigned via email
+        queue_email(
+            task.assigned_to.email,
+            "New Maintenance Task Assignment",
+            'main/email/new-assignment',
+            task=task
+        )
+    elif created:
+        # Notify the admin of the new task.
+        queue_email(
+            current_app.config['MAINTRAQ_ADMIN'],
+            "New Maintenance Request",
+            "main/email/new-task-request",
+            task=task, user=user
+        )
+    elif resolved:
+        queue_email(
+            task.requested_by.email,
+            "Maintenance Request Resolved",
+            "main/email/resolved",
+            task=task
+        )
+    elif done:
+        queue_email(
+            current_app.config['MAINTRAQ_ADMIN'],
+            "Newly Completed Maintenance Task",
+            "main/email/task-complete",
+            task=task, user=user, **kwargs
+        )
+    elif rejected:
+        queue_email(
+            task['requested_by'],
+            "Maintenance Request Rejected",
+            "main/email/task-rejected",
+            task=task
+        )
+    elif confirmed:
+        queue_email(
+            task.requested_by.email,
+            "Maintenance Request Confirmed",
+            "main/email/task-confirmed",
+            task=task
+        )
+
+
+def find_admin():
+    return User.query.filter_by(email=current_app.config['MAINTRAQ_ADMIN']).first()
+
+
+def notify_task_created(task):
+    notify_tasks_created([task])
+
+
+def notify_task_changes(task, before, updated_by):
+    notify_tasks_changed([(task, before)], updated_by)
+
+
+def notify_tasks_created(tasks):
+    # Tasks must have been flushed, for their ids. The admin gets a single
+    # email listing all of them.
+    for task in tasks:
+        TaskEvent.record(task, TaskEvent.CREATED)
+    if tasks:
+        queue_batch('created', find_admin(), tasks)
+
+
+def notify_tasks_changed(changes, updated_by):
+    # `changes` is a list of (task, `task.snapshot()` from before the update
+    # was applied). Each recipient gets one email per kind of change, listing
+    # all of their tasks.
+    # The assignee and facility loaded with a task may predate the update.
+    db.session.flush()
+    for task, before in changes:
+        db.session.expire(task, ['assigned_to', 'facility'])
+
+    batches = {}
+
+    def add(kind, user, task):
+        key = (kind, user.id if user is not None else None)
+        batches.setdefault(key, (kind, user, []))[2].append(task)
+
+    admin = None
+    for task, before in changes:
+        TaskEvent.record(task, TaskEvent.UPDATED)
+        if before['assigned_to_id'] != task.assigned_to_id and task.assigned_to_id:
+            # Notify the new assigned staff of the assignment.
+            add(Task.ASSIGN, task.assigned_to, task)
+        if not before['resolved'] and task.resolved:
+            # If this was just marked as resolved by admin, inform the user.
+            add(Task.RESOLVE, task.requested_by, task)
+        if before['progress'] != task.progress and task.progress == TaskStatus.DONE:
+            # If a maintainer just completed a task, notify the admin.
+            # Don't notify though, if the admin's responsible for the update.
+            if not updated_by.is_admin:
+                admin = admin or find_admin()
+                add('done', admin, task)
+        if not before['confirmed'] and task.confirmed:
+            add(Task.CONFIRM, task.requested_by, task)
+    for kind, user, tasks in batches.values():
+        queue_batch(kind, user, tasks, updated_by=updated_by)
+
+
+def queue_batch(kind, user, tasks, updated_by=None):
+    # A single task gets the usual email for `kind`, several get one
+    # bulk-update email.
+    if len(tasks) == 1:
+        task = tasks[0]
+        if kind == 'created':
+            send_mail(task, created=True, user=user)
+        elif kind == 'done':
+            send_mail(task, done=True, user=user, updated_by=updated_by)
+        elif kind == Task.ASSIGN:
+            send_mail(task, assigned=True)
+        elif kind == Task.RESOLVE:
+            send_mail(task, resolved=True)
+        elif kind == Task.CONFIRM:
+            send_mail(task, confirmed=True)
+        return
+    if kind in ('created', 'done'):
+        if user is not None and user.is_admin and user.digest_opt_in:
+            # The admin gets these in their digest instead.
+            return
+        to = current_app.config['MAINTRAQ_ADMIN']
+    else:
+        to = user.email
+    subject, message = BATCH_MESSAGES[kind]
+    queue_email(to, subject, 'main/email/bulk-update', user=user, tasks=tasks, message=message)
+
+
+BULK_MESSAGES = {
+    Task.CONFIRM: ("Maintenance Requests Confirmed",
+                   "The following maintenance requests have been confirmed."),
+    Task.ASSIGN: ("New Maintenance Task Assignments",
+                  "You have been assigned the following maintenance tasks."),
+    Task.RESOLVE: ("Maintenance Requests Resolved",
+                   "The following maintenance requests have been resolved."),
+}
+
+
+BATCH_MESSAGES = dict(BULK_MESSAGES, **{
+    'created': ("New Maintenance Requests",
+                "The following maintenance tasks have been requested."),
+    'done': ("Newly Completed Maintenance Tasks",
+             "The following maintenance tasks have been completed."),
+})
+
+
+def notify_bulk_update(action, task_ids):
+    # One email per recipient listing all of their tasks, rather than one
+    # email per task. Status changes made by the admin aren't emailed, as
+    # with update_task.
+    if not task_ids:
+        return
+    tasks = Task.list_query().filter(Task.id.in_(task_ids)).order_by(Task.date_requested).all()
+    for task in tasks:
+        TaskEvent.record(task, TaskEvent.UPDATED)
+    if action not in BULK_MESSAGES:
+        return
+    subject, message = BULK_MESSAGES[action]
+    recipients = {}
+    for task in tasks:
+        user = task.assigned_to if action == Task.ASSIGN else task.requested_by
+        recipients.setdefault(user.id, (user, []))[1].append(task)
+    for user, tasks in recipients.values():
+        queue_email(user.email, subject, 'main/email/bulk-update',
+                    user=user, tasks=tasks, message=message)
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread, current_thread
+from uuid import uuid4
+
+from flask.ext.mail import Message
+from flask.ext.sqlalchemy import models_committed
+
+from .metrics import EMAILS_SENT, EMAILS_FAILED, EMAIL_WORKERS
+
+
+class EmailOutbox:
+    """Sends queued `OutboundEmail` rows from a small pool of worker threads.
+
+    Each worker claims a batch of due emails and sends the whole batch over
+    a single SMTP connection. Failed messages are retried with exponential
+    backoff until `MAINTRAQ_MAIL_MAX_ATTEMPTS` is reached.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.workers = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        models_committed.connect(self.on_commit, sender=app)
+        app.before_first_request(self.start)
+
+    def on_commit(self, sender, changes):
+        from .models import OutboundEmail
+
+        if any(isinstance(obj, OutboundEmail) and op == 'insert' for obj, op in changes):
+            self.start()
+            self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.app.config['MAINTRAQ_MAIL_WORKERS']:
+                worker = Thread(target=self.run, name='maintraq-mail-%d' % len(self.workers))
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+        self.observe()
+
+    @property
+    def live_workers(self):
+        return len([worker for worker in self.workers if worker.is_alive()])
+
+    def observe(self, exiting=None):
+        # Kept current by the workers as they poll and exit, and refreshed
+        # on every scrape of /metrics.
+        EMAIL_WORKERS.set(len([
+            worker for worker in self.workers if worker.is_alive() and worker is not exiting
+        ]))
+
+    def run(self):
+        try:
+            while True:
+                self.wakeup.wait(self.app.config['MAINTRAQ_MAIL_POLL_INTERVAL'])
+                self.wakeup.clear()
+                self.observe()
+                try:
+                    while self.send_batch():
+                        pass
+                except Exception:
+                    self.app.logger.exception("Email outbox worker failed")
+        finally:
+            self.observe(exiting=current_thread())
+
+    def drain(self):
+        sent = 0
+        while True:
+            count = self.send_batch()
+            if not count:
+                return sent
+            sent += count
+
+    def claim(self, limit):
+        from . import db
+        from .models import OutboundEmail
+
+        now = datetime.now()
+        stale = now - timedelta(seconds=self.app.config['MAINTRAQ_MAIL_CLAIM_TIMEOUT'])
+        due = db.or_(
+            db.and_(OutboundEmail.status == OutboundEmail.PENDING,
+                    OutboundEmail.next_attempt_at <= now),
+            # Rows a crashed worker claimed but never finished.
+            db.and_(OutboundEmail.status == OutboundEmail.SENDING,
+                    OutboundEmail.claimed_at < stale)
+        )
+        ids = [id for (id,) in db.session.query(OutboundEmail.id).filter(due)
+               .order_by(OutboundEmail.id).limit(limit)]
+        if not ids:
+            return []
+
+        # Claim with a token so concurrent workers (or processes) never send
+        # the same row twice.
+        token = uuid4().hex
+        OutboundEmail.query.filter(OutboundEmail.id.in_(ids), due).update({
+            OutboundEmail.status: OutboundEmail.SENDING,
+            OutboundEmail.claimed_by: token,
+            OutboundEmail.claimed_at: now
+        }, synchronize_session=False)
+        db.session.commit()
+        return OutboundEmail.query.filter_by(
+            claimed_by=token, status=OutboundEmail.SENDING).order_by(OutboundEmail.id).all()
+
+    def send_batch(self):
+        from . import db, mail
+
+        with self.app.app_context():
+            try:
+                batch = self.claim(self.app.config['MAINTRAQ_MAIL_BATCH_SIZE'])
+                if not batch:
+                    return 0
+                try:
+                    with mail.connect() as connection:
+                        for email in batch:
+                            try:
+                                connection.send(self.message(email))
+                                email.mark_sent()
+                                EMAILS_SENT.inc()
+                            except Exception as e:
+                                email.mark_failed(e)
+                                EMAILS_FAILED.inc()
+                except Exception as e:
+                    # Couldn't reach the SMTP server at all.
+                    for email in batch:
+                        if email.status == email.SENDING:
+                            email.mark_failed(e)
+                            EMAILS_FAILED.inc()
+                db.session.commit()
+                return len(batch)
+            finally:
+                db.session.remove()
+
+    def message(self, email):
+        return Message(
+            email.subject,
+            sender=self.app.config['MAINTRAQ_MAIL_SENDER'],
+            recipients=[email.recipient],
+            body=email.body,
+            html=email.html
+        )
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(moment, id):
+    return '{}-{}'.format(moment.strftime(CURSOR_FORMAT), id)
+
+
+def after_key(column, id_column, key):
+    # Rows strictly after `key` in ascending `(column, id)` order.
+    moment, id = key
+    return or_(column > moment, and_(column == moment, id_column > id))
+
+
+def decode_cursor(cursor):
+    # Malformed cursors are treated as "no cursor" so a bad link falls back
+    # to the first page instead of erroring out.
+    if not cursor:
+        return None
+    try:
+        moment, id = cursor.split('-', 1)
+        return datetime.strptime(moment, CURSOR_FORMAT), int(id)
+    except ValueError:
+        return None
+
+
+def encode_position(revision, id):
+    return '{}-{}'.format(revision, id)
+
+
+def decode_position(position):
+    # A `(revision, id)` from `encode_position`, or None like decode_cursor.
+    if not position:
+        return None
+    try:
+        revision, id = position.split('-', 1)
+        return int(revision), int(id)
+    except ValueError:
+        return None
+
+
+class KeysetPage:
+    """A page of rows ordered newest first on ``(column, id)``.
+
+    Pages are addressed by the key of a boundary row rather than an offset so
+    every page is a single range scan on the ``(column, id)`` index, no matter
+    how deep into the list it is.
+    """
+
+    def __init__(self, query, column, id_column, per_page, after=None, before=None):
+        self.per_page = per_page
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+
+        if before is not None:
+            # Walking back towards newer rows: scan ascending, then flip.
+            moment, id = before
+            query = query.filter(or_(
+                column > moment, and_(column == moment, id_column > id)
+            )).order_by(column.asc(), id_column.asc())
+        else:
+            if after is not None:
+                moment, id = after
+                query = query.filter(or_(
+                    column < moment, and_(column == moment, id_column < id)
+                ))
+            query = query.order_by(column.desc(), id_column.desc())
+
+        # Fetch one extra row to know whether there's another page.
+        items = query.limit(per_page + 1).all()
+        more = len(items) > per_page
+        items = items[:per_page]
+
+        if before is not None:
+            items.reverse()
+            self.has_newer = more
+            self.has_older = True
+        else:
+            self.has_newer = after is not None
+            self.has_older = more
+
+        self.items = items
+        self._key = lambda row: encode_cursor(
+            getattr(row, column.key), getattr(row, id_column.key)
+        )
+
+    @property
+    def older_cursor(self):
+        if self.has_older and self.items:
+            return self._key(self.items[-1])
+
+    @property
+    def newer_cursor(self):
+        if self.has_newer and self.items:
+            return self._key(self.items[0])
@@ -0,0 +1,141 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+from datetime import datetime
+from timeit import default_timer
+
+from flask import g, request
+
+
+class Profile:
+    """A saved request profile. Its metadata lives in the file name:
+    `<timestamp>--<endpoint>--<milliseconds>ms--<pid>.prof`.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        stamp, self.endpoint, duration, pid = name[:-len('.prof')].split('--')
+        self.created = datetime.strptime(stamp, '%Y%m%dT%H%M%S%f')
+        self.duration = int(duration[:-len('ms')])
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, self.name)
+
+    def report(self, limit=40, sort='cumulative'):
+        out = io.StringIO()
+        stats = pstats.Stats(self.path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def under_gevent():
+    # gunicorn's gevent worker patches threading before serving requests.
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+class Profiler:
+    """Profiles a sampled fraction of requests with cProfile.
+
+    Requests are picked at random with probability
+    `MAINTRAQ_PROFILE_SAMPLE_RATE`, and admins can ask for one by sending
+    the `MAINTRAQ_PROFILE_HEADER` header. Dumps are written to
+    `MAINTRAQ_PROFILE_DIR`, which keeps only the newest `MAINTRAQ_PROFILE_KEEP`.
+
+    Nothing is profiled under gevent: cProfile hooks the OS thread, which
+    every greenlet shares, so a profile would mix in whatever other requests
+    ran meanwhile.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not app.config['MAINTRAQ_PROFILING']:
+            return
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.abandon)
+
+    def wanted(self):
+        if random.random() < self.app.config['MAINTRAQ_PROFILE_SAMPLE_RATE']:
+            return True
+        if request.headers.get(self.app.config['MAINTRAQ_PROFILE_HEADER']):
+            from flask.ext.login import current_user
+            return current_user.is_authenticated and current_user.is_admin
+        return False
+
+    def start(self):
+        if request.endpoint == 'static' or under_gevent() or not self.wanted():
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler_started = default_timer()
+        g.profiler.enable()
+
+    def finish(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed = default_timer() - g.pop('profiler_started')
+
+        directory = self.app.config['MAINTRAQ_PROFILE_DIR']
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        name = '{:%Y%m%dT%H%M%S%f}--{}--{}ms--{}.prof'.format(
+            datetime.now(), request.endpoint or 'unknown', int(elapsed * 1000), os.getpid())
+        profiler.dump_stats(os.path.join(directory, name))
+        self.rotate(directory)
+        # Sampled requests are profiled for anyone; only admins, who can
+        # read the profiles, are told about it.
+        from flask.ext.login import current_user
+        if current_user.is_authenticated and current_user.is_admin:
+            response.headers['X-Maintraq-Profile'] = name
+        return response
+
+    def abandon(self, exc=None):
+        # The request failed before `finish`; don't leave the profiler running.
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    def rotate(self, directory):
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+        for name in names[:-self.app.config['MAINTRAQ_PROFILE_KEEP']]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                # Another worker got there first.
+                pass
+
+    def profiles(self):
+        directory = self.app.config['MAINTRAQ_PROFILE_DIR']
+        if not os.path.isdir(directory):
+            return []
+        profiles = []
+        for name in os.listdir(directory):
+            if name.endswith('.prof'):
+                try:
+                    profiles.append(Profile(directory, name))
+                except ValueError:
+                    continue
+        return profiles
+
+    def slowest(self, limit=50):
+        return sorted(self.profiles(), key=lambda profile: profile.duration, reverse=True)[:limit]
+
+    def get(self, name):
+        for profile in self.profiles():
+            if profile.name == name:
+                return profile
+        return None
@@ -0,0 +1,88 @@
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask.ext.sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import UpdateBase
+
+REPLICA = 'replica'
+
+
+def read_only(view):
+    """Marks a view as safe to serve from the read replica on GET requests.
+
+    Put it directly under the route decorator::
+
+        @main.route('/users')
+        @read_only
+        @login_required
+        def users_list():
+    """
+    view.read_only = True
+    return view
+
+
+class RoutingSession(SignallingSession):
+    # Reads go to the replica when the current request allows it. Flushes,
+    # INSERT/UPDATE/DELETE statements and SELECT ... FOR UPDATE always go to
+    # the primary.
+    def get_bind(self, mapper=None, clause=None):
+        if self.use_replica(clause):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def use_replica(self, clause):
+        if self._flushing or not has_request_context() or not g.get('use_replica'):
+            return False
+        if isinstance(clause, UpdateBase):
+            return False
+        return getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReadReplica:
+    """Routes GET requests for `read_only` views to the replica database set in
+    `MAINTRAQ_REPLICA_DATABASE_URI`.
+
+    A user's requests stick to the primary for `MAINTRAQ_REPLICA_STICKY_SECONDS`
+    after they write anything, so they always see their own changes even if
+    the replica is behind.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        uri = app.config['MAINTRAQ_REPLICA_DATABASE_URI']
+        if not uri:
+            return
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        from . import db
+        db.event.listen(db.session, 'after_flush', self.wrote)
+        app.before_request(self.route)
+        app.after_request(self.stick)
+
+    def route(self):
+        view = current_app.view_functions.get(request.endpoint)
+        g.use_replica = (
+            request.method in ('GET', 'HEAD') and getattr(view, 'read_only', False) and
+            session.get('primary_until', 0) < time.time()
+        )
+
+    def wrote(self, db_session, flush_context):
+        if has_request_context():
+            g.wrote_to_primary = True
+
+    def stick(self, response):
+        if g.pop('wrote_to_primary', False) or request.method not in ('GET', 'HEAD'):
+            session['primary_until'] = (
+                time.time() + current_app.config['MAINTRAQ_REPLICA_STICKY_SECONDS'])
+        return response
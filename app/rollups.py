@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from . import db
+from .models import Task, TaskRollup, TaskBacklog, TaskTombstone, RollupRun
+
+# Re-read a little before the last run, so tasks committed late by a slow
+# transaction are still picked up. Recomputing a day twice is harmless.
+OVERLAP = timedelta(minutes=5)
+HOUR = np.timedelta64(1, 'h')
+
+
+def summarize(keys, values):
+    """Yields `(key, count, mean, median, p90, max)` of `values` for each distinct key."""
+    if not len(keys):
+        return
+    order = np.argsort(keys, kind='mergesort')
+    keys, values = keys[order], values[order]
+    unique, starts = np.unique(keys, return_index=True)
+    for key, group in zip(unique, np.split(values, starts[1:])):
+        yield (int(key), len(group), float(group.mean()), float(np.median(group)),
+               float(np.percentile(group, 90)), float(group.max()))
+
+
+def week_of(day):
+    return day - timedelta(days=day.weekday())
+
+
+def touched_days(since):
+    # Completion days of the tasks changed or deleted since `since` (UTC,
+    # like Task.updated), or of every completed task on the first run.
+    query = db.session.query(Task.date_completed).filter(Task.date_completed.isnot(None))
+    if since is None:
+        return set(completed.date() for (completed,) in query)
+    query = query.filter(Task.updated > since - OVERLAP)
+    deleted = db.session.query(TaskTombstone.date_completed).filter(
+        TaskTombstone.date_completed.isnot(None), TaskTombstone.deleted_at > since - OVERLAP)
+    return set(completed.date() for (completed,) in query.union_all(deleted))
+
+
+def completed_between(start, end):
+    # Column arrays for the tasks completed in [start, end).
+    rows = db.session.query(
+        Task.facility_id, Task.assigned_to_id, Task.date_requested, Task.date_completed
+    ).filter(Task.date_completed >= start, Task.date_completed < end).all()
+    facilities = np.array([row[0] for row in rows], dtype=np.int64)
+    maintainers = np.array([row[1] or 0 for row in rows], dtype=np.int64)
+    requested = np.array([row[2] for row in rows], dtype='datetime64[s]')
+    completed = np.array([row[3] for row in rows], dtype='datetime64[s]')
+    hours = (completed - requested) / HOUR
+    days = completed.astype('datetime64[D]')
+    return facilities, maintainers, hours, days
+
+
+def rollups(period, period_start, facilities, maintainers, hours):
+    rows = []
+    for dimension, keys in ((TaskRollup.FACILITY, facilities),
+                            (TaskRollup.MAINTAINER, maintainers)):
+        # Unassigned tasks have a maintainer key of 0.
+        known = keys > 0
+        for key, count, mean, median, p90, _ in summarize(keys[known], hours[known]):
+            rows.append(dict(
+                period=period, period_start=period_start, dimension=dimension, key=key,
+                completed=count, mean_hours=mean, median_hours=median, p90_hours=p90
+            ))
+    return rows
+
+
+def backlog(now):
+    # Open tasks per facility and how long they've been waiting.
+    rows = db.session.query(Task.facility_id, Task.date_requested).filter(
+        Task.resolved.isnot(True)).all()
+    facilities = np.array([row[0] for row in rows], dtype=np.int64)
+    requested = np.array([row[1] for row in rows], dtype='datetime64[s]')
+    ages = (np.datetime64(now, 's') - requested) / HOUR
+    result = []
+    for facility_id, count, mean, median, p90, oldest in summarize(facilities, ages):
+        result.append(dict(
+            day=now.date(), facility_id=facility_id, open=count, mean_age_hours=mean,
+            p90_age_hours=p90, oldest_age_hours=oldest
+        ))
+    return result
+
+
+def refresh(now=None):
+    """Recomputes the rollups for every day, and week, with a task completed or
+    changed since the last run, and records today's backlog. Returns the
+    number of days refreshed."""
+    now = now or datetime.now()
+    started = datetime.utcnow()
+    last = RollupRun.last()
+    days = touched_days(last.ran_at if last else None)
+
+    # One fetch per touched week covers its days too.
+    weeks = sorted(set(week_of(day) for day in days))
+    new_rows = []
+    for week in weeks:
+        start = datetime.combine(week, datetime.min.time())
+        facilities, maintainers, hours, completed_on = completed_between(
+            start, start + timedelta(days=7))
+        new_rows += rollups(TaskRollup.WEEK, week, facilities, maintainers, hours)
+        for day in sorted(d for d in days if week_of(d) == week):
+            on_day = completed_on == np.datetime64(day, 'D')
+            new_rows += rollups(TaskRollup.DAY, day, facilities[on_day], maintainers[on_day],
+                                hours[on_day])
+
+    if last is None:
+        TaskRollup.query.delete(synchronize_session=False)
+    elif days:
+        TaskRollup.query.filter(
+            TaskRollup.period == TaskRollup.DAY, TaskRollup.period_start.in_(sorted(days))
+        ).delete(synchronize_session=False)
+        TaskRollup.query.filter(
+            TaskRollup.period == TaskRollup.WEEK, TaskRollup.period_start.in_(weeks)
+        ).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(TaskRollup, new_rows)
+
+    TaskBacklog.query.filter_by(day=now.date()).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(TaskBacklog, backlog(now))
+    db.session.add(RollupRun(ran_at=started, days=len(days)))
+    db.session.commit()
+    return len(days)
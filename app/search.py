@@ -0,0 +1,156 @@
+import re
+import time
+
+from sqlalchemy import bindparam, inspect, text
+
+
+class TaskSearch:
+    """Full text index over task descriptions and details.
+
+    SQLite uses an FTS5 table (`tasks_fts`, rowid = task id) and Postgres a
+    `tasks.search_vector` tsvector column with a GIN index. Both are created
+    by the migrations and kept up to date from the session's after_flush
+    hook, in the same transaction as the task changes.
+    """
+
+    # Engines we've confirmed have the index. Ones found without it, such as
+    # databases built with `db.create_all()`, skip syncing and are checked
+    # again every RECHECK seconds, in case the migration has run since.
+    ready = {}
+    missing = {}
+    RECHECK = 60
+
+    @staticmethod
+    def dialect(connection):
+        return connection.dialect.name
+
+    @staticmethod
+    def exists(connection):
+        key = str(connection.engine.url)
+        if key in TaskSearch.ready:
+            return True
+        checked_at = TaskSearch.missing.get(key)
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < TaskSearch.RECHECK:
+            return False
+
+        dialect = TaskSearch.dialect(connection)
+        if dialect == 'sqlite':
+            found = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")).scalar()
+        elif dialect == 'postgresql':
+            found = connection.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'tasks' AND column_name = 'search_vector'")).scalar()
+        else:
+            found = False
+        if found:
+            TaskSearch.ready[key] = True
+            TaskSearch.missing.pop(key, None)
+        else:
+            TaskSearch.missing[key] = now
+        return bool(found)
+
+    @staticmethod
+    def create(connection):
+        dialect = TaskSearch.dialect(connection)
+        if dialect == 'sqlite':
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts "
+                "USING fts5(description, detailed_info)"))
+        elif dialect == 'postgresql':
+            connection.execute(text(
+                "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector "
+                "ON tasks USING gin(search_vector)"))
+        TaskSearch.missing.pop(str(connection.engine.url), None)
+
+    @staticmethod
+    def sync(connection, ids, deleted_ids=()):
+        if not TaskSearch.exists(connection):
+            return
+        dialect = TaskSearch.dialect(connection)
+        ids, deleted_ids = list(ids), list(deleted_ids)
+        if dialect == 'sqlite':
+            stale = ids + deleted_ids
+            if stale:
+                connection.execute(text(
+                    "DELETE FROM tasks_fts WHERE rowid IN :ids"
+                ).bindparams(bindparam('ids', expanding=True)), ids=stale)
+            if ids:
+                connection.execute(text(
+                    "INSERT INTO tasks_fts (rowid, description, detailed_info) "
+                    "SELECT id, description, coalesce(detailed_info, '') FROM tasks "
+                    "WHERE id IN :ids"
+                ).bindparams(bindparam('ids', expanding=True)), ids=ids)
+        elif dialect == 'postgresql' and ids:
+            # Deleted rows take their vector with them.
+            connection.execute(text(
+                "UPDATE tasks SET search_vector = to_tsvector('english', "
+                "coalesce(description, '') || ' ' || coalesce(detailed_info, '')) "
+                "WHERE id IN :ids"
+            ).bindparams(bindparam('ids', expanding=True)), ids=ids)
+
+    @staticmethod
+    def rebuild(connection):
+        TaskSearch.create(connection)
+        dialect = TaskSearch.dialect(connection)
+        if dialect == 'sqlite':
+            connection.execute(text("DELETE FROM tasks_fts"))
+            connection.execute(text(
+                "INSERT INTO tasks_fts (rowid, description, detailed_info) "
+                "SELECT id, description, coalesce(detailed_info, '') FROM tasks"))
+        elif dialect == 'postgresql':
+            connection.execute(text(
+                "UPDATE tasks SET search_vector = to_tsvector('english', "
+                "coalesce(description, '') || ' ' || coalesce(detailed_info, ''))"))
+
+    @staticmethod
+    def ranked_ids(connection, terms, limit, offset=0, requested_by_id=None):
+        # Task ids matching every word in `terms`, best match first.
+        words = re.findall(r'\w+', terms)
+        if not words or not TaskSearch.exists(connection):
+            return []
+        dialect = TaskSearch.dialect(connection)
+        params = {'limit': limit, 'offset': offset, 'requested_by_id': requested_by_id}
+        owner = " AND tasks.requested_by_id = :requested_by_id" if requested_by_id else ""
+
+        if dialect == 'sqlite':
+            # Quote each word so FTS5 syntax in user input is taken literally,
+            # and prefix match so partial words still find something.
+            params['query'] = ' '.join('"{}"*'.format(word) for word in words)
+            statement = (
+                "SELECT tasks.id FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid "
+                "WHERE tasks_fts MATCH :query" + owner +
+                " ORDER BY tasks_fts.rank LIMIT :limit OFFSET :offset"
+            )
+        else:
+            params['query'] = ' & '.join('{}:*'.format(word) for word in words)
+            statement = (
+                "SELECT tasks.id FROM tasks, to_tsquery('english', :query) query "
+                "WHERE tasks.search_vector @@ query" + owner +
+                " ORDER BY ts_rank(tasks.search_vector, query) DESC, tasks.id DESC"
+                " LIMIT :limit OFFSET :offset"
+            )
+        return [id for (id,) in connection.execute(text(statement), **params)]
+
+    @staticmethod
+    def track(session, flush_context):
+        from .models import Task
+
+        changed, deleted = set(), set()
+        for task in session.new:
+            if isinstance(task, Task):
+                changed.add(task.id)
+        for task in session.dirty:
+            if isinstance(task, Task):
+                attrs = inspect(task).attrs
+                if (attrs.description.history.has_changes() or
+                        attrs.detailed_info.history.has_changes()):
+                    changed.add(task.id)
+        for task in session.deleted:
+            if isinstance(task, Task):
+                deleted.add(task.id)
+        if changed or deleted:
+            TaskSearch.sync(session.connection(), changed, deleted)
@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timedelta
+from time import time
+
+from werkzeug.security import generate_password_hash
+
+from . import db
+from .models import User, Facility, Task, TaskStatus, TaskCounter, facility_choices, \
+    maintainer_roster
+from .search import TaskSearch
+
+VERBS = ('Fix', 'Replace', 'Repair', 'Inspect', 'Service', 'Unblock', 'Clean', 'Install')
+THINGS = (
+    'leaking tap', 'broken window', 'flickering lights', 'air conditioner', 'door lock',
+    'projector', 'water heater', 'blocked drain', 'ceiling fan', 'power socket',
+    'fire alarm', 'elevator button', 'network port', 'toilet cistern', 'office chair'
+)
+PLACES = ('kitchen', 'boardroom', 'reception', 'store', 'washroom', 'office', 'lab', 'corridor')
+
+
+class Seeder:
+    """Bulk inserts fake users, facilities and tasks for load testing.
+
+    Rows are inserted with executemany in chunks of `chunk_size` and every
+    random choice comes from one `random.Random(seed)`, so the same arguments
+    always produce the same data.
+    """
+
+    def __init__(self, seed=0, chunk_size=10000, out=print):
+        self.random = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.out = out
+        self.now = datetime.now().replace(microsecond=0)
+        # Task.updated is UTC; the other dates are local.
+        self.utc_offset = datetime.utcnow().replace(microsecond=0) - self.now
+
+    def insert(self, table, rows, label):
+        started = time()
+        count = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                count += self.flush(table, chunk)
+                chunk = []
+        if chunk:
+            count += self.flush(table, chunk)
+        elapsed = max(time() - started, 1e-6)
+        self.out("Seeded {:,} {} in {:.1f}s ({:,.0f} rows/sec)".format(
+            count, label, elapsed, count / elapsed))
+        return count
+
+    def flush(self, table, chunk):
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        return len(chunk)
+
+    def next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def users(self, count, maintainers=0.02, admins=0.001):
+        # Everyone shares one password hash; hashing per user would dominate.
+        password_hash = generate_password_hash('password')
+        start = self.next_id(User)
+        # At least one admin, so every workload persona has someone to log in as.
+        admin_count = max(1, int(count * admins)) if count else 0
+
+        def rows():
+            for n in range(start, start + count):
+                is_admin = n < start + admin_count
+                yield {
+                    'email': 'seed{}@example.com'.format(n),
+                    'username': 'seed{}'.format(n),
+                    'password_hash': password_hash,
+                    'confirmed': True,
+                    'is_admin': is_admin,
+                    'is_maintenance': not is_admin and self.random.random() < maintainers,
+                    'name': 'Seed User {}'.format(n),
+                    'last_seen': self.now - timedelta(minutes=self.random.randint(0, 60 * 24 * 90)),
+                }
+        return self.insert(User.__table__, rows(), 'users')
+
+    def facilities(self, count):
+        start = self.next_id(Facility)
+        rows = ({'name': 'Facility {}'.format(n)} for n in range(start, start + count))
+        return self.insert(Facility.__table__, rows, 'facilities')
+
+    def tasks(self, count, days=365):
+        user_ids = [id for (id,) in db.session.query(User.id)]
+        maintainer_ids = [id for (id,) in db.session.query(User.id).filter_by(is_maintenance=True)]
+        facility_ids = [id for (id,) in db.session.query(Facility.id)]
+        if not user_ids or not facility_ids:
+            raise ValueError("Seed some users and facilities before seeding tasks.")
+        # A few busy facilities get most of the requests.
+        facility_weights = [1.0 / (rank + 1) for rank in range(len(facility_ids))]
+
+        def rows():
+            rng = self.random
+            chosen_facilities = iter(())
+            for n in range(count):
+                try:
+                    facility_id = next(chosen_facilities)
+                except StopIteration:
+                    chosen_facilities = iter(rng.choices(
+                        facility_ids, weights=facility_weights, k=self.chunk_size))
+                    facility_id = next(chosen_facilities)
+
+                age = timedelta(seconds=rng.random() * days * 86400)
+                requested = self.now - age
+                confirmed = rng.random() < 0.85
+                assigned_to_id = None
+                if confirmed and maintainer_ids and rng.random() < 0.9:
+                    assigned_to_id = rng.choice(maintainer_ids)
+
+                # Older tasks are more likely to be done.
+                progress = TaskStatus.NOT_STARTED
+                completed = None
+                if assigned_to_id:
+                    done_chance = min(0.97, 0.2 + age.days / 30.0)
+                    if rng.random() < done_chance:
+                        progress = TaskStatus.DONE
+                        # Turnaround is long tailed, median around two days.
+                        hours = rng.lognormvariate(3.9, 1.0)
+                        completed = min(requested + timedelta(hours=hours), self.now)
+                    else:
+                        progress = rng.choice(
+                            (TaskStatus.NOT_STARTED, TaskStatus.STARTED, TaskStatus.PENDING))
+                resolved = progress == TaskStatus.DONE and rng.random() < 0.8
+
+                yield {
+                    'facility_id': facility_id,
+                    'requested_by_id': rng.choice(user_ids),
+                    'assigned_to_id': assigned_to_id,
+                    'description': '{} the {} in the {}'.format(
+                        rng.choice(VERBS), rng.choice(THINGS), rng.choice(PLACES)),
+                    'detailed_info': 'Reported near room {}.'.format(rng.randint(1, 400)),
+                    'confirmed': confirmed,
+                    'resolved': resolved,
+                    'acknowledged': bool(assigned_to_id) and (
+                        progress != TaskStatus.NOT_STARTED or rng.random() < 0.5),
+                    'progress': progress,
+                    'date_requested': requested,
+                    'date_completed': completed,
+                    'updated': (completed or requested) + self.utc_offset,
+                }
+        return self.insert(Task.__table__, rows(), 'tasks')
+
+    def finish(self):
+        # Bulk inserts bypass the flush hooks; rebuild what they maintain.
+        started = time()
+        TaskCounter.rebuild()
+        with db.engine.begin() as connection:
+            TaskSearch.rebuild(connection)
+        facility_choices.invalidate()
+        maintainer_roster.invalidate()
+        db.session.commit()
+        self.out("Rebuilt counters and search index in {:.1f}s".format(time() - started))
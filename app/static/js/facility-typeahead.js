@@ -0,0 +1,31 @@
+// Turns <select data-typeahead="url"> into a search box that fills the
+// select with matching facilities from the server as the user types.
+$(function () {
+    $('select[data-typeahead]').each(function () {
+        var select = $(this);
+        var url = select.data('typeahead');
+        var input = $('<input type="text" class="form-control" placeholder="Search facilities...">');
+        var timer = null;
+
+        select.before(input);
+        input.on('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var query = $.trim(input.val());
+                if (!query) {
+                    return;
+                }
+                $.getJSON(url, {q: query}, function (data) {
+                    var selected = select.val();
+                    select.empty();
+                    $.each(data.facilities, function (i, facility) {
+                        select.append($('<option>').val(facility.id).text(facility.name));
+                    });
+                    if (selected) {
+                        select.val(selected);
+                    }
+                });
+            }, 250);
+        });
+    });
+});
@@ -0,0 +1,23 @@
+// Listens for live task events and offers to reload the page when a task
+// the user can see changes.
+$(function () {
+    var notice = $('#task-events');
+    if (!notice.length || !window.EventSource) {
+        return;
+    }
+    var messages = {created: 'was requested', updated: 'was updated', rejected: 'was rejected'};
+    var source = new EventSource(notice.data('url'));
+
+    $.each(messages, function (kind, message) {
+        source.addEventListener(kind, function (e) {
+            var task = JSON.parse(e.data);
+            notice.empty().append(
+                $('<span>').text('"' + task.description + '" ' + message + '. '),
+                $('<a href="#">Reload</a>').click(function () {
+                    window.location.reload();
+                    return false;
+                })
+            ).show();
+        });
+    });
+});
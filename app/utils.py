@@ -1,23 +1,64 @@
-from threading import Thread
 
-from flask import render_template, current_app
+import hashlib
+import os
 
-from flask.ext.mail import Message
+from flask import render_template, current_app, request, session
 
-from . import mail
+from . import db
+from .metrics import EMAILS_QUEUED
+from .models import OutboundEmail
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+def queue_email(to, subject, template, **kwargs):
+    # Emails are written to the outbox and sent by the outbox workers once
+    # the caller commits.
+    app = current_app._get_current_object()
+    email = OutboundEmail(
+        recipient=to,
+        subject=app.config['MAINTRAQ_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
+        body=render_template(template + '.txt', **kwargs),
+        html=render_template(template + '.html', **kwargs)
+    )
+    db.session.add(email)
+    EMAILS_QUEUED.inc()
+    return email
 
 
-def send_email(to, subject, template, **kwargs):
-    app = current_app._get_current_object()
-    msg = Message(app.config['MAINTRAQ_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
-                  sender=app.config['MAINTRAQ_MAIL_SENDER'], recipients=[to])
-    msg.body = render_template(template + '.txt', **kwargs)
-    msg.html = render_template(template + '.html', **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+def template_version(app):
+    # A digest of every template, so a deploy that changes how pages look
+    # also changes their ETags without setting MAINTRAQ_RELEASE.
+    digest = hashlib.sha1()
+    root = os.path.join(app.root_path, app.template_folder)
+    for folder, folders, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            digest.update(os.path.relpath(path, root).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def http_date(moment):
+    # `Task.updated` is already UTC; HTTP dates are to the second.
+    return moment.replace(microsecond=0)
+
+
+def not_modified(etag, last_modified):
+    """Whether the client's copy is current, so a 304 can be sent without
+    building the response."""
+    if '_flashes' in session:
+        # The flashed messages would never be shown.
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and http_date(last_modified) <= since
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = http_date(last_modified)
+    # Browsers keep the page but check back with us before reusing it.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,208 @@
+"""Micro benchmarks for the hot paths in models, forms and templates.
+
+Run with::
+
+    $ python -m benchmarks.run --sizes 10,100,1000 --baseline benchmarks/baseline.json
+
+Each size gets a freshly seeded SQLite database (`bench-data.db`) with that
+many users, facilities and tasks. Results are written as JSON, and the run
+exits with status 1 when any benchmark is slower than the baseline by more
+than `--threshold`.
+"""
+import argparse
+import json
+import sys
+from timeit import default_timer
+
+from flask import get_template_attribute
+
+from app import create_app, db
+from app.fragments import task_rows
+from app.models import User, Task, facility_choices, maintainer_roster, user_cache
+
+benchmarks = []
+
+
+def benchmark(name):
+    # Registers a setup function that returns the callable to time.
+    def register(setup):
+        benchmarks.append((name, setup))
+        return setup
+    return register
+
+
+@benchmark('user.verify_password')
+def verify_password(size):
+    user = User.query.first()
+    return lambda: user.verify_password('password')
+
+
+@benchmark('user.confirmation_token')
+def confirmation_token(size):
+    user = User.query.first()
+    return lambda: user.confirm(user.generate_confirmation_token())
+
+
+@benchmark('user.auth_token')
+def auth_token(size):
+    user = User.query.first()
+
+    def run():
+        user_cache.clear()
+        User.verify_auth_token(user.generate_auth_token())
+    return run
+
+
+@benchmark('task.status')
+def task_status(size):
+    tasks = Task.query.all()
+    return lambda: [task.status for task in tasks]
+
+
+@benchmark('forms.task_request')
+def task_request_form(size):
+    from app.main.forms import TaskRequestForm
+    return uncached(TaskRequestForm)
+
+
+@benchmark('forms.maintainer_task_update')
+def maintainer_form(size):
+    from app.main.forms import MaintainerTaskUpdateForm
+    return uncached(MaintainerTaskUpdateForm)
+
+
+@benchmark('forms.admin_task_update')
+def admin_form(size):
+    from app.main.forms import AdminTaskUpdateForm
+    return uncached(AdminTaskUpdateForm)
+
+
+def task_table(size):
+    admin = User.query.first()
+    admin.is_admin = True
+    tasks = Task.list_query().order_by(Task.date_requested.desc()).all()
+    macro = get_template_attribute('partials/_tasks.html', 'render_tasks')
+    return lambda: macro(admin, tasks, tasks_info={'pending': 0})
+
+
+@benchmark('templates.render_tasks')
+def render_tasks(size):
+    # Every row rendered, comparable with runs from before the row cache.
+    render = task_table(size)
+
+    def run():
+        task_rows.clear()
+        render()
+    return run
+
+
+@benchmark('templates.render_tasks_cached')
+def render_tasks_cached(size):
+    # Every row already in the row cache.
+    render = task_table(size)
+    render()
+    return render
+
+
+def uncached(form_class):
+    # Time a cold form build, the cost every request paid before caching.
+    def run():
+        facility_choices.clear()
+        maintainer_roster.clear()
+        form_class()
+    return run
+
+
+def measure(run, repeat, min_time=0.2):
+    # Seconds per call: best of `repeat` rounds of enough calls to take
+    # roughly `min_time` seconds.
+    run()
+    number = 1
+    while True:
+        started = default_timer()
+        for _ in range(number):
+            run()
+        elapsed = default_timer() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = default_timer()
+        for _ in range(number):
+            run()
+        best = min(best, (default_timer() - started) / number)
+    return best
+
+
+def seed(size):
+    from app.seed import Seeder
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    seeder = Seeder(seed=size, chunk_size=5000, out=lambda message: None)
+    seeder.users(size, maintainers=0.2)
+    seeder.facilities(size)
+    seeder.tasks(size)
+    seeder.finish()
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, sizes in results.items():
+        for size, seconds in sizes.items():
+            before = baseline.get(name, {}).get(size)
+            if before and seconds > before * (1 + threshold):
+                regressions.append((name, size, before, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help="Run benchmarks whose name starts with this.")
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown over the baseline, 0.25 = 25%%.")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write these results as the new baseline.")
+    args = parser.parse_args(argv)
+
+    app = create_app('benchmark')
+    results = {}
+    with app.app_context(), app.test_request_context():
+        for size in [int(size) for size in args.sizes.split(',')]:
+            seed(size)
+            for name, setup in benchmarks:
+                if args.only and not name.startswith(args.only):
+                    continue
+                seconds = measure(setup(size), args.repeat)
+                results.setdefault(name, {})[str(size)] = seconds
+                print("{:<32} {:>7} {:>12.1f} us".format(name, size, seconds * 1e6))
+                db.session.rollback()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except IOError:
+        print("No baseline at {}, skipping comparison.".format(args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for name, size, before, after in regressions:
+        print("REGRESSION {} at {}: {:.1f} us -> {:.1f} us".format(
+            name, size, before * 1e6, after * 1e6))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
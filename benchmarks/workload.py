@@ -0,0 +1,318 @@
+"""End to end workload generator for sizing workers and database pools.
+
+Simulated requesters, admins and maintainers log in and use the app the way
+people do, either in-process through the Flask test client or against a
+running server (e.g. gunicorn) with `--url`::
+
+    $ python -m benchmarks.workload --config benchmark --duration 60 --concurrency 8
+    $ python -m benchmarks.workload --url http://localhost:8000 --mix requester=6,admin=1,maintainer=3
+
+Users, tasks and facilities are picked from the configured database, so seed
+it first (`manage.py seed`). Seeded users all have the password "password".
+Reports throughput and p50/p95/p99 latency per endpoint, queries per request
+(in-process only) and how many emails were queued.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from timeit import default_timer
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor
+
+from app import create_app, db
+from app.instrumentation import count_queries
+from app.models import User, Task, Facility, TaskStatus, OutboundEmail
+
+CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"|'
+                  r'value="([^"]+)"[^>]*name="csrf_token"')
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HTTPSession:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.url + path, data=body) as response:
+                return response.status, response.read().decode()
+        except HTTPError as e:
+            return e.code, e.read().decode()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, queries, status):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+            if status >= 400:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            queries = self.queries.get(endpoint)
+            rows[endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors[endpoint],
+                'rps': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries_avg': float(sum(queries)) / len(queries) if queries else None,
+            }
+        return rows
+
+
+def percentile(values, pct):
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class Persona:
+    """A logged in user performing one scripted action per `step`."""
+
+    def __init__(self, app, session, user, stats, rng):
+        self.app = app
+        self.session = session
+        self.user = user
+        self.stats = stats
+        self.random = rng
+
+    def call(self, endpoint, method, path, data=None, csrf_from=None):
+        if data is not None and csrf_from is not None:
+            token = csrf_token(csrf_from)
+            if token:
+                data = dict(data, csrf_token=token)
+        with count_queries() as queries:
+            started = default_timer()
+            status, body = self.session.request(method, path, data)
+            elapsed = default_timer() - started
+        in_process = isinstance(self.session, TestClientSession)
+        self.stats.record(endpoint, elapsed, queries['count'] if in_process else None, status)
+        return body
+
+    def login(self, password):
+        page = self.call('auth.login', 'GET', '/login')
+        self.call('auth.login', 'POST', '/login', {
+            'username': self.user.username, 'password': password
+        }, csrf_from=page)
+
+    def lookup(self, query):
+        # Picks data with the app's own session, outside the timed requests.
+        with self.app.app_context():
+            try:
+                return query()
+            finally:
+                db.session.remove()
+
+
+class Requester(Persona):
+    def step(self):
+        self.call('main.index', 'GET', '/')
+        form = self.call('main.task_request', 'GET', '/task-requests')
+        facility_id = self.lookup(lambda: self.random.choice(
+            [id for (id,) in db.session.query(Facility.id).limit(100)]))
+        self.call('main.task_request', 'POST', '/task-requests', {
+            'description': 'Load test request {}'.format(self.random.randint(0, 10 ** 6)),
+            'detailed_info': 'Generated by the workload tool.',
+            'facility': facility_id,
+        }, csrf_from=form)
+        task_id = self.lookup(lambda: db.session.query(Task.id).filter_by(
+            requested_by_id=self.user.id).order_by(Task.id.desc()).limit(1).scalar())
+        if task_id:
+            self.call('main.view_task', 'GET', '/view-task/{}'.format(task_id))
+
+
+class Admin(Persona):
+    def step(self):
+        page = self.call('main.index', 'GET', '/')
+        older = re.search(r'href="(/\?after=[^"]+)"', page)
+        if older:
+            self.call('main.index', 'GET', older.group(1).replace('&amp;', '&'))
+
+        def pick():
+            task = Task.query.filter(Task.confirmed.isnot(True), Task.resolved.isnot(True)) \
+                .order_by(Task.date_requested.desc()).limit(50).all()
+            maintainers = [id for (id,) in db.session.query(User.id).filter_by(is_maintenance=True)]
+            if not task or not maintainers:
+                return None
+            task = self.random.choice(task)
+            return (task.id, task.description, task.detailed_info or '', task.facility_id,
+                    task.progress or 0, self.random.choice(maintainers))
+        picked = self.lookup(pick)
+        if picked is None:
+            return
+        task_id, description, detailed_info, facility_id, progress, maintainer_id = picked
+        path = '/update-task/{}'.format(task_id)
+        form = self.call('main.update_task', 'GET', path)
+        self.call('main.update_task', 'POST', path, {
+            'description': description,
+            'detailed_info': detailed_info,
+            'facility': facility_id,
+            'confirmed': 'y',
+            'assigned_to_id': maintainer_id,
+            'progress': progress,
+        }, csrf_from=form)
+
+
+class Maintainer(Persona):
+    def step(self):
+        self.call('main.index', 'GET', '/')
+
+        def pick():
+            tasks = Task.query.filter(
+                Task.assigned_to_id == self.user.id, Task.resolved.isnot(True),
+                Task.progress != TaskStatus.DONE).limit(50).all()
+            if not tasks:
+                return None
+            task = self.random.choice(tasks)
+            return (task.id, task.description, task.detailed_info or '', task.facility_id,
+                    task.progress or 0)
+        picked = self.lookup(pick)
+        if picked is None:
+            return
+        task_id, description, detailed_info, facility_id, progress = picked
+        path = '/update-task/{}'.format(task_id)
+        form = self.call('main.update_task', 'GET', path)
+        self.call('main.update_task', 'POST', path, {
+            'description': description,
+            'detailed_info': detailed_info,
+            'facility': facility_id,
+            'acknowledged': 'y',
+            'progress': min(progress + 1, TaskStatus.DONE),
+        }, csrf_from=form)
+
+
+PERSONAS = {'requester': Requester, 'admin': Admin, 'maintainer': Maintainer}
+
+
+def csrf_token(page):
+    match = CSRF.search(page)
+    return match and (match.group(1) or match.group(2))
+
+
+def pick_users(app, role, count, rng):
+    with app.app_context():
+        query = User.query.filter_by(confirmed=True)
+        if role == 'admin':
+            query = query.filter_by(is_admin=True)
+        elif role == 'maintainer':
+            query = query.filter_by(is_maintenance=True)
+        else:
+            query = query.filter_by(is_admin=False, is_maintenance=False)
+        users = query.limit(max(count, 1) * 10).all()
+        db.session.expunge_all()
+        db.session.remove()
+    if not users:
+        return []
+    return [rng.choice(users) for _ in range(count)]
+
+
+def outbox_size(app):
+    with app.app_context():
+        try:
+            return OutboundEmail.query.count()
+        finally:
+            db.session.remove()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default='benchmark')
+    parser.add_argument('--url', help="Drive a running server instead of the test client.")
+    parser.add_argument('--mix', default='requester=6,admin=1,maintainer=3')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Also write the report as JSON here.")
+    args = parser.parse_args(argv)
+
+    app = create_app(args.config)
+    rng = random.Random(args.seed)
+    weights = dict((name, int(weight)) for name, weight in
+                   (part.split('=') for part in args.mix.split(',')))
+    roles = rng.choices(list(weights), weights=list(weights.values()), k=args.concurrency)
+
+    stats = Stats()
+    personas = []
+    for role in sorted(set(roles)):
+        users = pick_users(app, role, roles.count(role), rng)
+        if not users:
+            print("Warning: no {} users in the database, leaving them out of the mix."
+                  .format(role), file=sys.stderr)
+        for user in users:
+            session = HTTPSession(args.url) if args.url else TestClientSession(app)
+            persona = PERSONAS[role](app, session, user, stats, random.Random(rng.random()))
+            persona.login(args.password)
+            personas.append(persona)
+    if not personas:
+        raise SystemExit("No users to drive the workload with, seed some first.")
+    stats.latencies.clear()
+    stats.queries.clear()
+    stats.errors.clear()
+
+    emails_before = outbox_size(app)
+    deadline = default_timer() + args.duration
+
+    def drive(persona):
+        while default_timer() < deadline:
+            persona.step()
+
+    threads = [threading.Thread(target=drive, args=(persona,)) for persona in personas]
+    started = default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = default_timer() - started
+
+    report = {
+        'elapsed': elapsed,
+        'requests': sum(len(values) for values in stats.latencies.values()),
+        'emails_queued': outbox_size(app) - emails_before,
+        'endpoints': stats.report(elapsed),
+    }
+    report['rps'] = report['requests'] / elapsed
+    print("{:<24} {:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+        'endpoint', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for endpoint, row in report['endpoints'].items():
+        print("{:<24} {:>8} {:>6} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8}".format(
+            endpoint, row['requests'], row['errors'], row['rps'], row['p50_ms'],
+            row['p95_ms'], row['p99_ms'],
+            '-' if row['queries_avg'] is None else '{:.1f}'.format(row['queries_avg'])))
+    print("Total: {requests} requests in {elapsed:.1f}s ({rps:.1f}/s), "
+          "{emails_queued} emails queued".format(**report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
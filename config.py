@@ -17,10 +17,80 @@ class Config:
     MAINTRAQ_MAIL_SUBJECT_PREFIX = '[MainTraq]'
     MAINTRAQ_MAIL_SENDER = 'MainTraq Admin'
     MAINTRAQ_ADMIN = os.environ.get('MAINTRAQ_ADMIN')
+    # Outbound email queue. Set MAINTRAQ_MAIL_WORKERS to 0 to only send from
+    # `manage.py mail_worker`.
+    MAINTRAQ_MAIL_WORKERS = int(os.environ.get('MAINTRAQ_MAIL_WORKERS', 2))
+    MAINTRAQ_MAIL_BATCH_SIZE = 50
+    MAINTRAQ_MAIL_POLL_INTERVAL = 30
+    MAINTRAQ_MAIL_MAX_ATTEMPTS = 5
+    MAINTRAQ_MAIL_RETRY_BACKOFF = 30
+    MAINTRAQ_MAIL_CLAIM_TIMEOUT = 600
+    MAINTRAQ_TASKS_PER_PAGE = 50
+    MAINTRAQ_DIGEST_INTERVAL_HOURS = 24
+    MAINTRAQ_SEARCH_RESULTS_PER_PAGE = 20
+    MAINTRAQ_SEARCH_MAX_PAGES = 50
+    # Most tasks a single bulk API call may create or update.
+    MAINTRAQ_API_BULK_LIMIT = 500
+    # Most tasks and deletions in one page of the task change feed.
+    MAINTRAQ_CHANGE_FEED_PAGE_SIZE = 200
+    # Above this many facilities the task forms switch to a type-ahead lookup.
+    MAINTRAQ_FACILITY_SELECT_LIMIT = 200
+    # Seconds between last_seen writes for a user, and between bulk flushes.
+    MAINTRAQ_LAST_SEEN_INTERVAL = 300
+    MAINTRAQ_LAST_SEEN_FLUSH_INTERVAL = 60
+    # Users loaded by the login manager are cached per process for this long,
+    # and dropped within the check interval of a change in another process.
+    MAINTRAQ_USER_CACHE_SIZE = 1024
+    MAINTRAQ_USER_CACHE_TTL = 60
+    MAINTRAQ_USER_CACHE_CHECK_INTERVAL = 5
+    # Live task events: how often each process polls for new ones, how many
+    # a slow client may fall behind by, and how long they're kept for replay.
+    MAINTRAQ_EVENTS_POLL_INTERVAL = 1
+    MAINTRAQ_EVENTS_HEARTBEAT = 15
+    MAINTRAQ_EVENTS_QUEUE_SIZE = 100
+    MAINTRAQ_EVENTS_REPLAY_LIMIT = 500
+    MAINTRAQ_EVENTS_RETENTION_HOURS = 24
+    # How far back the turnaround report goes.
+    MAINTRAQ_REPORT_DAYS = 30
+    MAINTRAQ_REPORT_WEEKS = 12
+    # Rendered task table rows kept per process.
+    MAINTRAQ_ROW_CACHE_SIZE = 5000
+
+    # Per request query counts: logged, optionally sent as Server-Timing
+    # headers, and compared against these per-endpoint budgets.
+    MAINTRAQ_QUERY_LOGGING = True
+    MAINTRAQ_SERVER_TIMING = os.environ.get('MAINTRAQ_SERVER_TIMING') == '1'
+    MAINTRAQ_DEFAULT_QUERY_BUDGET = None
+    MAINTRAQ_QUERY_BUDGETS = {
+        'main.index': 8,
+        'main.view_task': 4,
+        'main.update_task': 12,
+        'main.users_list': 4,
+    }
+
+    # Mixed into task ETags so a deploy invalidates cached pages. Defaults to
+    # a digest of the templates.
+    MAINTRAQ_RELEASE = os.environ.get('MAINTRAQ_RELEASE')
+
+    # Networks allowed to scrape /metrics. Behind a proxy every request comes
+    # from the proxy's address, so don't route /metrics through a public one.
+    MAINTRAQ_METRICS_ALLOW = os.environ.get('MAINTRAQ_METRICS_ALLOW', '127.0.0.1,::1').split(',')
+
+    # Sampling profiler. Admins can also profile a single request by sending
+    # the header below.
+    MAINTRAQ_PROFILING = os.environ.get('MAINTRAQ_PROFILING') == '1'
+    MAINTRAQ_PROFILE_SAMPLE_RATE = float(os.environ.get('MAINTRAQ_PROFILE_SAMPLE_RATE', 0))
+    MAINTRAQ_PROFILE_HEADER = 'X-Maintraq-Profile'
+    MAINTRAQ_PROFILE_DIR = os.environ.get('MAINTRAQ_PROFILE_DIR') or os.path.join(basedir, 'profiles')
+    MAINTRAQ_PROFILE_KEEP = 200
 
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # Optional read replica for GET requests to read-only views. A user's
+    # requests stay on the primary for this many seconds after they write.
+    MAINTRAQ_REPLICA_DATABASE_URI = os.environ.get('REPLICA_DATABASE_URL')
+    MAINTRAQ_REPLICA_STICKY_SECONDS = 5
 
     @staticmethod
     def init_app(app):
@@ -34,18 +104,37 @@ class ProductionConfig(Config):
 class DevelopmentConfig(Config):
     DEVELOPMENT = True
     DEBUG = True
+    MAINTRAQ_SERVER_TIMING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'dev-data.db')
 
 
 class TestingConfig(Config):
     TESTING = True
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'testing'
+    MAINTRAQ_ADMIN = 'admin@example.com'
+    WTF_CSRF_ENABLED = False
+    MAINTRAQ_MAIL_WORKERS = 0
+    MAINTRAQ_QUERY_LOGGING = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'test-data.db')
     SQLALCHEMY_COMMIT_ON_TEARDOWN = False
 
+
+class BenchmarkConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'benchmark'
+    # The first user `manage.py seed` creates, which is always an admin.
+    MAINTRAQ_ADMIN = os.environ.get('MAINTRAQ_ADMIN') or 'seed1@example.com'
+    SERVER_NAME = 'localhost'
+    WTF_CSRF_ENABLED = False
+    MAINTRAQ_MAIL_WORKERS = 0
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'bench-data.db')
+    SQLALCHEMY_COMMIT_ON_TEARDOWN = False
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
 
     'default': DevelopmentConfig
 }
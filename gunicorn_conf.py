@@ -0,0 +1,29 @@
+import os
+import shutil
+
+# Prometheus multiprocess mode: every worker writes its metrics to this
+# directory, so any worker can report the totals for the whole box.
+metrics_dir = os.environ.setdefault(
+    'prometheus_multiproc_dir', os.path.join('/tmp', 'maintraq-metrics'))
+
+# Greenlet workers, so the long-lived /events streams don't each hold a worker.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+
+
+def on_starting(server):
+    # Samples left behind by a previous run would be counted again.
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Let other greenlets run while psycopg2 waits on Postgres.
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
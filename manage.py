@@ -3,8 +3,8 @@ import os
 from flask.ext.script import Manager, Shell
 from flask.ext.migrate import Migrate, MigrateCommand
 
-from app.models import User, Task, Facility
-from app import create_app, db
+from app.models import User, Task, Facility, TaskCounter
+from app import create_app, db, outbox
 
 app = create_app(os.getenv('MAINTRAQ_CONFIG') or 'production')
 migrate = Migrate(app, db)
@@ -12,7 +12,7 @@ manager = Manager(app)
 
 
 def make_shell_context():
-    return dict(app=app, db=db, User=User, Task=Task, Facility=Facility)
+    return dict(app=app, db=db, User=User, Task=Task, Facility=Facility, TaskCounter=TaskCounter)
 
 manager.add_command('shell', Shell(make_context=make_shell_context))
 manager.add_command('db', MigrateCommand)
@@ -23,5 +23,87 @@ def deploy():
     """Deployment tasks."""
     pass
 
+
+@manager.command
+def rebuild_counters():
+    """Recompute the task counters from the tasks table."""
+    rows = TaskCounter.rebuild()
+    print("Rebuilt {} task counters.".format(rows))
+
+
+@manager.option('-u', '--users', dest='users', type=int, default=0)
+@manager.option('-f', '--facilities', dest='facilities', type=int, default=0)
+@manager.option('-t', '--tasks', dest='tasks', type=int, default=0)
+@manager.option('-c', '--chunk-size', dest='chunk_size', type=int, default=10000)
+@manager.option('-s', '--seed', dest='seed', type=int, default=0)
+def seed(users, facilities, tasks, chunk_size, seed):
+    """Bulk insert fake users, facilities and tasks for load testing."""
+    from app.seed import Seeder
+    seeder = Seeder(seed=seed, chunk_size=chunk_size)
+    if users:
+        seeder.users(users)
+    if facilities:
+        seeder.facilities(facilities)
+    if tasks:
+        seeder.tasks(tasks)
+    seeder.finish()
+
+
+@manager.command
+def rebuild_search_index():
+    """Rebuild the full text search index over tasks."""
+    from app.search import TaskSearch
+    with db.engine.begin() as connection:
+        TaskSearch.rebuild(connection)
+    print("Rebuilt the task search index.")
+
+
+@manager.command
+def explain_queries():
+    """Check that the task list queries use an index. Exits non-zero if not."""
+    from app.instrumentation import task_list_plans
+    failed = False
+    for name, plan, scans in task_list_plans():
+        failed = failed or bool(scans)
+        print("{}: {}".format(name, 'FULL SCAN' if scans else 'ok'))
+        for step in plan:
+            print("    " + step)
+    db.session.rollback()
+    if failed:
+        raise SystemExit(1)
+
+
+@manager.command
+def send_digests():
+    """Send task digests to users who opted in. Run this periodically."""
+    from app.digest import send_digests as send
+    print("Queued {} digest emails.".format(send()))
+
+
+@manager.command
+def refresh_rollups():
+    """Recompute the turnaround rollups for days touched since the last run."""
+    from app.rollups import refresh
+    print("Refreshed rollups for {} days.".format(refresh()))
+
+
+@manager.command
+def prune_task_events():
+    """Delete live task events older than MAINTRAQ_EVENTS_RETENTION_HOURS."""
+    from datetime import datetime, timedelta
+    from app.models import TaskEvent
+    before = datetime.utcnow() - timedelta(hours=app.config['MAINTRAQ_EVENTS_RETENTION_HOURS'])
+    print("Pruned {} task events.".format(TaskEvent.prune(before)))
+
+
+@manager.option('-f', '--forever', dest='forever', action='store_true', default=False,
+                help="Keep polling the outbox instead of exiting once it's empty.")
+def mail_worker(forever):
+    """Send queued emails from the outbox."""
+    if forever:
+        outbox.run()
+    sent = outbox.drain()
+    print("Sent {} queued emails.".format(sent))
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,22 @@
+"""tombstone completion date
+
+Revision ID: 0c4e7a2d9b15
+Revises: 7d41b8e0c5a2
+Create Date: 2026-10-18 23:02:19.375520
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0c4e7a2d9b15'
+down_revision = '7d41b8e0c5a2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('task_tombstones', sa.Column('date_completed', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('task_tombstones', 'date_completed')
@@ -0,0 +1,35 @@
+"""task change feed
+
+Revision ID: 1d6b3e8f4a20
+Revises: 7f3d92c5a6e1
+Create Date: 2026-10-18 17:32:06.558124
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1d6b3e8f4a20'
+down_revision = '7f3d92c5a6e1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Older tasks may never have been stamped; the feed orders on `updated`.
+    op.execute("UPDATE tasks SET updated = date_requested WHERE updated IS NULL")
+    op.create_index('ix_tasks_updated_id', 'tasks', ['updated', 'id'], unique=False)
+    op.create_table('task_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('requested_by_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_tombstones_deleted_at_task_id', 'task_tombstones',
+                    ['deleted_at', 'task_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_tombstones_deleted_at_task_id', table_name='task_tombstones')
+    op.drop_table('task_tombstones')
+    op.drop_index('ix_tasks_updated_id', table_name='tasks')
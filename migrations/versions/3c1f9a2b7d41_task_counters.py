@@ -0,0 +1,46 @@
+"""task counters
+
+Revision ID: 3c1f9a2b7d41
+Revises: 6ae5f8c7a495
+Create Date: 2026-10-18 09:12:04.118273
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a2b7d41'
+down_revision = '6ae5f8c7a495'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('task_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'key')
+    )
+    # Count the existing tasks, the same way as TaskCounter.rebuild.
+    open_tasks = "(resolved IS NULL OR NOT resolved)"
+    op.execute(
+        "INSERT INTO task_counters (kind, \"key\", value) "
+        "SELECT 'open', 0, count(id) FROM tasks WHERE " + open_tasks)
+    op.execute(
+        "INSERT INTO task_counters (kind, \"key\", value) "
+        "SELECT 'status', coalesce(progress, 0), count(id) FROM tasks "
+        "GROUP BY coalesce(progress, 0)")
+    op.execute(
+        "INSERT INTO task_counters (kind, \"key\", value) "
+        "SELECT 'facility_open', facility_id, count(id) FROM tasks WHERE " + open_tasks +
+        " GROUP BY facility_id")
+    op.execute(
+        "INSERT INTO task_counters (kind, \"key\", value) "
+        "SELECT 'assignee_open', assigned_to_id, count(id) FROM tasks "
+        "WHERE assigned_to_id IS NOT NULL AND " + open_tasks + " GROUP BY assigned_to_id")
+
+
+def downgrade():
+    op.drop_table('task_counters')
@@ -0,0 +1,24 @@
+"""user digest preferences
+
+Revision ID: 5b7c0e3d9f12
+Revises: 8d2e4b6f1a93
+Create Date: 2026-10-18 11:26:50.913402
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b7c0e3d9f12'
+down_revision = '8d2e4b6f1a93'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('users', sa.Column('digest_opt_in', sa.Boolean(), nullable=True))
+    op.add_column('users', sa.Column('digest_sent_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'digest_sent_at')
+    op.drop_column('users', 'digest_opt_in')
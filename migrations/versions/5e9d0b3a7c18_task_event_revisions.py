@@ -0,0 +1,28 @@
+"""task event revisions
+
+Revision ID: 5e9d0b3a7c18
+Revises: 0c4e7a2d9b15
+Create Date: 2026-10-19 10:12:44.902315
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e9d0b3a7c18'
+down_revision = '0c4e7a2d9b15'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('task_events', sa.Column('revision', sa.Integer(), nullable=True))
+    # Existing events all count as committed before the first revision.
+    op.execute("UPDATE task_events SET revision = 0")
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('task_revision', 0)")
+    op.create_index('ix_task_events_revision_id', 'task_events', ['revision', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_events_revision_id', table_name='task_events')
+    op.execute("DELETE FROM cache_versions WHERE name = 'task_revision'")
+    op.drop_column('task_events', 'revision')
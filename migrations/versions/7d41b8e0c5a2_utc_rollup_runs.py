@@ -0,0 +1,35 @@
+"""utc rollup runs
+
+Revision ID: 7d41b8e0c5a2
+Revises: b6e2f9c4d317
+Create Date: 2026-10-18 22:41:09.318274
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d41b8e0c5a2'
+down_revision = 'b6e2f9c4d317'
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def shift(seconds):
+    # rollup_runs.ran_at moves to UTC so it compares with Task.updated.
+    if op.get_bind().dialect.name == 'sqlite':
+        value = "datetime(ran_at, '{0:+d} seconds') || substr(ran_at, 20)".format(seconds)
+    else:
+        value = "ran_at + interval '{:d} seconds'".format(seconds)
+    op.execute("UPDATE rollup_runs SET ran_at = {}".format(value))
+
+
+def upgrade():
+    offset = datetime.utcnow() - datetime.now()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
+
+
+def downgrade():
+    offset = datetime.now() - datetime.utcnow()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
@@ -0,0 +1,33 @@
+"""task events
+
+Revision ID: 7f3d92c5a6e1
+Revises: e2b84f6a1c39
+Create Date: 2026-10-18 16:40:51.093317
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7f3d92c5a6e1'
+down_revision = 'e2b84f6a1c39'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('task_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('requested_by_id', sa.Integer(), nullable=True),
+    sa.Column('assigned_to_id', sa.Integer(), nullable=True),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_task_events_created_at'), 'task_events', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_task_events_created_at'), table_name='task_events')
+    op.drop_table('task_events')
@@ -0,0 +1,35 @@
+"""task change revisions
+
+Revision ID: 8b2f6d1e4c07
+Revises: 5e9d0b3a7c18
+Create Date: 2026-10-19 15:37:08.214963
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8b2f6d1e4c07'
+down_revision = '5e9d0b3a7c18'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('tasks', sa.Column('revision', sa.Integer(), nullable=True))
+    op.add_column('task_tombstones', sa.Column('revision', sa.Integer(), nullable=True))
+    # Existing rows all count as committed before the first revision.
+    op.execute("UPDATE tasks SET revision = 0")
+    op.execute("UPDATE task_tombstones SET revision = 0")
+    op.create_index('ix_tasks_revision_id', 'tasks', ['revision', 'id'], unique=False)
+    op.drop_index('ix_task_tombstones_deleted_at_task_id', table_name='task_tombstones')
+    op.create_index('ix_task_tombstones_revision_task_id', 'task_tombstones',
+                    ['revision', 'task_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_tombstones_revision_task_id', table_name='task_tombstones')
+    op.create_index('ix_task_tombstones_deleted_at_task_id', 'task_tombstones',
+                    ['deleted_at', 'task_id'], unique=False)
+    op.drop_index('ix_tasks_revision_id', table_name='tasks')
+    op.drop_column('task_tombstones', 'revision')
+    op.drop_column('tasks', 'revision')
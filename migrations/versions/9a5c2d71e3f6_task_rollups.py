@@ -0,0 +1,57 @@
+"""task rollups
+
+Revision ID: 9a5c2d71e3f6
+Revises: 1d6b3e8f4a20
+Create Date: 2026-10-18 18:55:44.207816
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9a5c2d71e3f6'
+down_revision = '1d6b3e8f4a20'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index(op.f('ix_tasks_date_completed'), 'tasks', ['date_completed'], unique=False)
+    op.create_table('task_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=8), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('dimension', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('mean_hours', sa.Float(), nullable=False),
+    sa.Column('median_hours', sa.Float(), nullable=False),
+    sa.Column('p90_hours', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period', 'period_start', 'dimension', 'key')
+    )
+    op.create_table('task_backlog',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('facility_id', sa.Integer(), nullable=False),
+    sa.Column('open', sa.Integer(), nullable=False),
+    sa.Column('mean_age_hours', sa.Float(), nullable=False),
+    sa.Column('p90_age_hours', sa.Float(), nullable=False),
+    sa.Column('oldest_age_hours', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'facility_id')
+    )
+    op.create_table('rollup_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ran_at', sa.DateTime(), nullable=False),
+    sa.Column('days', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_rollup_runs_ran_at'), 'rollup_runs', ['ran_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_rollup_runs_ran_at'), table_name='rollup_runs')
+    op.drop_table('rollup_runs')
+    op.drop_table('task_backlog')
+    op.drop_table('task_rollups')
+    op.drop_index(op.f('ix_tasks_date_completed'), table_name='tasks')
@@ -0,0 +1,26 @@
+"""cache versions
+
+Revision ID: a4f61c8e2b57
+Revises: 5b7c0e3d9f12
+Create Date: 2026-10-18 12:03:18.274105
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a4f61c8e2b57'
+down_revision = '5b7c0e3d9f12'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
@@ -0,0 +1,45 @@
+"""utc change timestamps
+
+Revision ID: b6e2f9c4d317
+Revises: f3a8c1e6b290
+Create Date: 2026-10-18 22:17:52.641093
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2f9c4d317'
+down_revision = 'f3a8c1e6b290'
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# Columns that were written in the app server's local time and are now UTC.
+COLUMNS = (
+    ('tasks', 'updated'),
+    ('task_tombstones', 'deleted_at'),
+)
+
+
+def shift(seconds):
+    # Uses the server's current UTC offset; rows written across a DST change
+    # end up an hour out, which only matters for the oldest feed entries.
+    dialect = op.get_bind().dialect.name
+    for table, column in COLUMNS:
+        if dialect == 'sqlite':
+            # datetime() drops the fraction; keep it from the original text.
+            value = "datetime({0}, '{1:+d} seconds') || substr({0}, 20)".format(column, seconds)
+        else:
+            value = "{} + interval '{:d} seconds'".format(column, seconds)
+        op.execute("UPDATE {0} SET {1} = {2} WHERE {1} IS NOT NULL".format(table, column, value))
+
+
+def upgrade():
+    offset = datetime.utcnow() - datetime.now()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
+
+
+def downgrade():
+    offset = datetime.now() - datetime.utcnow()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
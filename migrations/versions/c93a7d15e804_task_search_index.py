@@ -0,0 +1,38 @@
+"""task full text search index
+
+Revision ID: c93a7d15e804
+Revises: a4f61c8e2b57
+Create Date: 2026-10-18 13:47:22.680531
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c93a7d15e804'
+down_revision = 'a4f61c8e2b57'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE tasks_fts USING fts5(description, detailed_info)")
+        op.execute(
+            "INSERT INTO tasks_fts (rowid, description, detailed_info) "
+            "SELECT id, description, coalesce(detailed_info, '') FROM tasks")
+    elif dialect == 'postgresql':
+        op.execute("ALTER TABLE tasks ADD COLUMN search_vector tsvector")
+        op.execute(
+            "UPDATE tasks SET search_vector = to_tsvector('english', "
+            "coalesce(description, '') || ' ' || coalesce(detailed_info, ''))")
+        op.execute("CREATE INDEX ix_tasks_search_vector ON tasks USING gin(search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE tasks_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX ix_tasks_search_vector")
+        op.execute("ALTER TABLE tasks DROP COLUMN search_vector")
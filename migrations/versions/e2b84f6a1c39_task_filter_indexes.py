@@ -0,0 +1,30 @@
+"""task filter indexes
+
+Revision ID: e2b84f6a1c39
+Revises: c93a7d15e804
+Create Date: 2026-10-18 15:21:09.418263
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e2b84f6a1c39'
+down_revision = 'c93a7d15e804'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('ix_tasks_requested_by_confirmed_date', 'tasks',
+                    ['requested_by_id', 'confirmed', 'date_requested', 'id'], unique=False)
+    op.create_index('ix_tasks_assigned_to_date', 'tasks',
+                    ['assigned_to_id', 'date_requested', 'id'], unique=False)
+    op.create_index('ix_tasks_unresolved_facility', 'tasks', ['facility_id'], unique=False,
+                    sqlite_where=sa.text('resolved IS NOT 1'),
+                    postgresql_where=sa.text('resolved IS NOT true'))
+
+
+def downgrade():
+    op.drop_index('ix_tasks_unresolved_facility', table_name='tasks')
+    op.drop_index('ix_tasks_assigned_to_date', table_name='tasks')
+    op.drop_index('ix_tasks_requested_by_confirmed_date', table_name='tasks')
@@ -0,0 +1,37 @@
+"""utc task events
+
+Revision ID: f3a8c1e6b290
+Revises: 9a5c2d71e3f6
+Create Date: 2026-10-18 21:04:37.902114
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c1e6b290'
+down_revision = '9a5c2d71e3f6'
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def shift(seconds):
+    # task_events.created_at moves from the server's local time to UTC, by
+    # its current offset.
+    if op.get_bind().dialect.name == 'sqlite':
+        # datetime() drops the fraction; keep it from the original text.
+        value = "datetime(created_at, '{:+d} seconds') || substr(created_at, 20)".format(seconds)
+    else:
+        value = "created_at + interval '{:d} seconds'".format(seconds)
+    op.execute("UPDATE task_events SET created_at = " + value)
+
+
+def upgrade():
+    offset = datetime.utcnow() - datetime.now()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
+
+
+def downgrade():
+    offset = datetime.now() - datetime.utcnow()
+    shift(int(round(offset.total_seconds() / 60.0)) * 60)
@@ -0,0 +1,74 @@
+import pytest
+
+from app import create_app, db
+from app.cache import caches
+from app.models import User, Facility, Task
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'test.db')
+    with app.app_context():
+        db.create_all()
+        # Process wide caches would otherwise carry rows over from other tests.
+        for cache in caches.values():
+            cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username, is_admin=False, is_maintenance=False):
+        user = User(
+            username=username, email='{}@example.com'.format(username), password='password',
+            confirmed=True, is_admin=is_admin, is_maintenance=is_maintenance
+        )
+        db.session.add(user)
+        db.session.commit()
+        return detached(user)
+    return make_user
+
+
+@pytest.fixture
+def make_tasks(app):
+    def make_tasks(count, requested_by, assigned_to=None, facility=None, **kwargs):
+        if facility is None:
+            facility = Facility.query.first()
+        if facility is None:
+            facility = Facility(name='Main Hall')
+            db.session.add(facility)
+            db.session.commit()
+        tasks = [
+            Task(
+                description='Fix the leaking tap number {}'.format(n),
+                requested_by_id=requested_by.id,
+                assigned_to_id=assigned_to.id if assigned_to else None,
+                facility_id=facility.id, **kwargs
+            ) for n in range(count)
+        ]
+        db.session.add_all(tasks)
+        db.session.commit()
+        return [detached(task) for task in tasks]
+    return make_tasks
+
+
+def detached(instance):
+    # Loaded and out of the session, so tests can keep using it after the
+    # session is removed between requests.
+    db.session.refresh(instance)
+    db.session.expunge(instance)
+    return instance
+
+
+def login(client, user):
+    response = client.post('/login', data={'username': user.username, 'password': 'password'})
+    assert response.status_code == 302
+    return response
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.activity import LastSeenBuffer
+from app.models import User
+
+
+def last_seen(user):
+    return db.session.query(User.last_seen).filter_by(id=user.id).scalar()
+
+
+def test_failed_flush_keeps_pending_updates(app, make_user):
+    user, other = make_user('requester'), make_user('fixer')
+    buffer = LastSeenBuffer(app)
+    earlier = datetime(2026, 10, 5, 9, 0)
+    buffer.pending = {user.id: earlier, other.id: earlier}
+
+    db.session.execute('ALTER TABLE users RENAME TO users_away')
+    db.session.commit()
+    with pytest.raises(OperationalError):
+        buffer.flush()
+    db.session.execute('ALTER TABLE users_away RENAME TO users')
+    db.session.commit()
+    assert buffer.pending == {user.id: earlier, other.id: earlier}
+
+    assert buffer.flush() == 2
+    assert last_seen(user) == earlier
+    assert buffer.pending == {}
+
+
+def test_restore_keeps_newer_updates(app):
+    buffer = LastSeenBuffer(app)
+    earlier = datetime(2026, 10, 5, 9, 0)
+    later = earlier + timedelta(minutes=5)
+    # Recorded while a flush holding `earlier` was failing.
+    buffer.pending = {1: later}
+    buffer.restore({1: earlier, 2: earlier})
+    assert buffer.pending == {1: later, 2: earlier}
+    buffer.pending = {}
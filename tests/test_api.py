@@ -0,0 +1,133 @@
+import json
+
+import pytest
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+
+from app import db
+from app.instrumentation import assert_max_queries
+from app.models import User, Task, TaskEvent, TaskStatus, OutboundEmail
+
+
+def bearer(token):
+    return {'Authorization': 'Bearer ' + token, 'Content-Type': 'application/json'}
+
+
+def test_auth_token_authenticates(app, client, make_user):
+    user = make_user('jane')
+    token = User.query.get(user.id).generate_auth_token()
+    assert client.get('/api/v1.0/tasks/', headers=bearer(token)).status_code == 200
+
+
+def test_other_tokens_are_not_auth_tokens(app, client, make_user):
+    user = make_user('jane')
+    confirmation = User.query.get(user.id).generate_confirmation_token().decode('ascii')
+    assert User.verify_auth_token(confirmation) is None
+    assert client.get('/api/v1.0/tasks/', headers=bearer(confirmation)).status_code == 401
+
+    # A token signed with the right key but without an id.
+    unsalted = Serializer(app.config['SECRET_KEY']).dumps({'reset': user.id}).decode('ascii')
+    assert User.verify_auth_token(unsalted) is None
+    salted = Serializer(app.config['SECRET_KEY'], salt='auth-token')
+    assert User.verify_auth_token(salted.dumps({'reset': user.id}).decode('ascii')) is None
+    assert User.verify_auth_token(salted.dumps({'id': True}).decode('ascii')) is None
+
+
+def test_bulk_update_rejects_boolean_ids(app, client, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    make_tasks(1, admin)
+    token = User.query.get(admin.id).generate_auth_token()
+
+    response = client.put('/api/v1.0/tasks/bulk', headers=bearer(token),
+                          data=json.dumps({'tasks': [{'id': True, 'confirmed': True}]}))
+    assert response.status_code == 400
+
+
+def token_for(user):
+    token = User.query.get(user.id).generate_auth_token()
+    db.session.remove()
+    return token
+
+
+def new_tasks(count, facility_id):
+    return json.dumps({'tasks': [
+        {'description': 'Fix the broken window {}'.format(n), 'facility_id': facility_id}
+        for n in range(count)
+    ]})
+
+
+def test_bulk_create_notifies_once_in_few_queries(app, client, make_user, make_tasks):
+    make_user('admin', is_admin=True)
+    requester = make_user('requester')
+    facility_id = make_tasks(1, requester)[0].facility_id
+    token = token_for(requester)
+
+    for count in (2, 20):
+        # An INSERT per task and per event; nothing else is per task.
+        with assert_max_queries(2 * count + 12):
+            response = client.post('/api/v1.0/tasks/bulk', headers=bearer(token),
+                                   data=new_tasks(count, facility_id))
+        assert response.status_code == 201
+        assert len(json.loads(response.data.decode('utf-8'))['tasks']) == count
+
+    emails = OutboundEmail.query.all()
+    assert [email.recipient for email in emails] == ['admin@example.com'] * 2
+    assert 'Fix the broken window 19' in emails[1].body
+    assert TaskEvent.query.filter_by(kind=TaskEvent.CREATED).count() == 22
+
+
+def test_bulk_update_notifies_once_per_recipient(app, client, make_user, make_tasks):
+    make_user('admin', is_admin=True)
+    maintainer = make_user('fixer', is_maintenance=True)
+    requester = make_user('requester')
+    tasks = make_tasks(3, requester, assigned_to=maintainer)
+    token = token_for(maintainer)
+
+    response = client.put('/api/v1.0/tasks/bulk', headers=bearer(token), data=json.dumps({
+        'tasks': [{'id': task.id, 'progress': TaskStatus.DONE} for task in tasks]
+    }))
+    assert response.status_code == 200
+    body = json.loads(response.data.decode('utf-8'))
+    assert [task['status'] for task in body['tasks']] == ['DONE'] * 3
+    assert all(task['acknowledged'] for task in body['tasks'])
+
+    email, = OutboundEmail.query.all()
+    assert email.recipient == 'admin@example.com'
+    assert email.subject.endswith('Newly Completed Maintenance Tasks')
+    assert TaskEvent.query.filter_by(kind=TaskEvent.UPDATED).count() == 3
+
+
+def test_edit_reports_the_new_assignee(app, client, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    maintainer = make_user('fixer', is_maintenance=True)
+    task, = make_tasks(1, admin)
+    token = token_for(admin)
+
+    response = client.put('/api/v1.0/tasks/{}'.format(task.id), headers=bearer(token),
+                          data=json.dumps({'assigned_to_id': maintainer.id}))
+    assert json.loads(response.data.decode('utf-8'))['assigned_to'] == 'fixer'
+    email, = OutboundEmail.query.all()
+    assert email.recipient == 'fixer@example.com'
+
+
+def test_failed_notification_rolls_back_the_tasks(app, client, make_user, make_tasks, monkeypatch):
+    make_user('admin', is_admin=True)
+    requester = make_user('requester')
+    facility_id = make_tasks(1, requester)[0].facility_id
+    token = token_for(requester)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('Template missing')
+    monkeypatch.setattr('app.notifications.queue_email', fail)
+    with pytest.raises(RuntimeError):
+        client.post('/api/v1.0/tasks/bulk', headers=bearer(token), data=new_tasks(2, facility_id))
+    db.session.remove()
+    assert Task.query.count() == 1
+    assert TaskEvent.query.count() == 0
+
+
+def test_malformed_json_gets_a_json_error(app, client, make_user):
+    token = token_for(make_user('requester'))
+    for method in (client.post, client.put):
+        response = method('/api/v1.0/tasks/bulk', headers=bearer(token), data='{"tasks": [')
+        assert response.status_code == 400
+        assert json.loads(response.data.decode('utf-8'))['error'] == 'bad request'
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import Task, TaskCounter, TaskEvent, TaskStatus, OutboundEmail
+from .conftest import login
+
+
+def counters():
+    return dict(((c.kind, c.key), c.value) for c in TaskCounter.query if c.value)
+
+
+def bulk_update(ids, action, value=None):
+    changed = Task.bulk_update(ids, action, value)
+    db.session.commit()
+    # The bulk UPDATE skips the flush hooks; a rebuild counts from scratch.
+    tracked = counters()
+    TaskCounter.rebuild()
+    assert counters() == tracked
+    return sorted(changed)
+
+
+@pytest.fixture
+def people(app, make_user):
+    return make_user('admin', is_admin=True), make_user('fixer', is_maintenance=True), \
+        make_user('requester')
+
+
+def test_confirm_skips_confirmed_and_resolved_tasks(app, people, make_tasks):
+    admin, maintainer, requester = people
+    fresh = make_tasks(2, requester)
+    confirmed, = make_tasks(1, requester, confirmed=True)
+    resolved, = make_tasks(1, requester, resolved=True)
+    ids = [task.id for task in fresh + [confirmed, resolved]]
+
+    assert bulk_update(ids, Task.CONFIRM) == [task.id for task in fresh]
+    assert Task.query.get(resolved.id).confirmed is not True
+    assert bulk_update(ids, Task.CONFIRM) == []
+
+
+def test_assign_moves_open_counts(app, people, make_tasks):
+    admin, maintainer, requester = people
+    tasks = make_tasks(2, requester)
+    mine, = make_tasks(1, requester, assigned_to=maintainer)
+    ids = [task.id for task in tasks + [mine]]
+
+    assert bulk_update(ids, Task.ASSIGN, maintainer.id) == [task.id for task in tasks]
+    assert TaskCounter.get(TaskCounter.ASSIGNEE_OPEN, maintainer.id) == 3
+    assert all(task.updated is not None for task in Task.query.filter(Task.id.in_(ids[:2])))
+
+
+def test_progress_sets_completion_date_once(app, people, make_tasks):
+    admin, maintainer, requester = people
+    earlier = datetime(2026, 10, 5, 9, 0)
+    started, = make_tasks(1, requester, progress=TaskStatus.STARTED)
+    done, = make_tasks(1, requester, progress=TaskStatus.DONE, date_completed=earlier)
+
+    # Setting a status applies even to tasks already in it.
+    assert bulk_update([started.id, done.id], Task.PROGRESS, TaskStatus.DONE) == \
+        [started.id, done.id]
+    assert Task.query.get(started.id).date_completed > earlier
+    assert Task.query.get(done.id).date_completed == earlier
+    assert TaskCounter.counts(TaskCounter.STATUS) == {TaskStatus.DONE: 2}
+
+    assert bulk_update([started.id], Task.PROGRESS, TaskStatus.STARTED) == [started.id]
+    assert TaskCounter.counts(TaskCounter.STATUS) == {TaskStatus.DONE: 1, TaskStatus.STARTED: 1}
+
+
+def test_resolve_closes_tasks_once(app, people, make_tasks):
+    admin, maintainer, requester = people
+    tasks = make_tasks(3, requester, assigned_to=maintainer)
+    ids = [task.id for task in tasks]
+
+    assert bulk_update(ids[:2], Task.RESOLVE) == ids[:2]
+    assert TaskCounter.get(TaskCounter.OPEN) == 1
+    assert TaskCounter.get(TaskCounter.FACILITY_OPEN, tasks[0].facility_id) == 1
+    assert TaskCounter.get(TaskCounter.ASSIGNEE_OPEN, maintainer.id) == 1
+    # Resolved tasks are left alone by every action.
+    assert bulk_update(ids, Task.RESOLVE) == ids[2:]
+    assert bulk_update(ids, Task.PROGRESS, TaskStatus.DONE) == []
+
+
+def test_unknown_action_is_rejected(app):
+    with pytest.raises(ValueError):
+        Task.bulk_update([1], 'delete')
+
+
+def test_bulk_view_reports_and_notifies(app, client, people, make_tasks):
+    admin, maintainer, requester = people
+    tasks = make_tasks(2, requester)
+    assigned, = make_tasks(1, requester, assigned_to=maintainer)
+    login(client, admin)
+
+    client.post('/tasks/bulk', data={
+        'action': Task.ASSIGN, 'assigned_to_id': maintainer.id, 'progress': TaskStatus.NOT_STARTED,
+        'task_ids': [task.id for task in tasks + [assigned]]
+    })
+    assert b'Updated 2 of 3 selected tasks.' in client.get('/').data
+    email, = OutboundEmail.query.all()
+    assert email.recipient == 'fixer@example.com'
+    assert TaskEvent.query.filter_by(kind=TaskEvent.UPDATED).count() == 2
+
+    client.post('/tasks/bulk', data={'action': Task.CONFIRM})
+    assert b'Select at least one task first.' in client.get('/').data
+
+
+def test_bulk_view_is_for_admins(app, client, people, make_tasks):
+    admin, maintainer, requester = people
+    task, = make_tasks(1, requester)
+    login(client, maintainer)
+    response = client.post('/tasks/bulk', data={'action': Task.RESOLVE, 'task_ids': [task.id]})
+    assert response.status_code == 403
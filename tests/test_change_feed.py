@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Task, TaskTombstone, User
+
+
+def drain(user, cursor=None, limit=1):
+    # Follows the feed one page at a time until it runs out.
+    seen = []
+    while True:
+        tasks, tombstones, cursor, more = Task.changes(user, cursor, limit=limit)
+        seen += [('task', task.id) for task in tasks]
+        seen += [('deleted', tombstone.task_id) for tombstone in tombstones]
+        if not more:
+            return seen, cursor
+
+
+def test_cursor_continues_across_changes_and_deletions(app, make_user, make_tasks):
+    admin = User.query.get(make_user('admin', is_admin=True).id)
+    first, second, third = make_tasks(3, make_user('requester'))
+
+    seen, cursor = drain(admin)
+    assert seen == [('task', first.id), ('task', second.id), ('task', third.id)]
+    assert drain(admin, cursor) == ([], cursor)
+
+    # An edit moves a task to the end of the feed, and a rejected task
+    # comes back as a tombstone, in the order they happened.
+    Task.query.get(first.id).description = 'Fix the leaking tap in the kitchen'
+    db.session.commit()
+    task = Task.query.get(second.id)
+    TaskTombstone.record(task)
+    db.session.delete(task)
+    db.session.commit()
+
+    seen, cursor = drain(admin, cursor)
+    assert seen == [('task', first.id), ('deleted', second.id)]
+    assert drain(admin, cursor) == ([], cursor)
+
+    # Paging in bigger steps from the start sees the same final state.
+    seen, _ = drain(admin, limit=2)
+    assert seen == [('task', third.id), ('task', first.id), ('deleted', second.id)]
+
+
+def test_change_timestamps_are_utc(app, make_user, make_tasks):
+    task, = make_tasks(1, make_user('requester'))
+    task = Task.query.get(task.id)
+    assert abs(task.updated - datetime.utcnow()) < timedelta(minutes=1)
+
+    task.progress = 1
+    TaskTombstone.record(task)
+    db.session.commit()
+    tombstone = TaskTombstone.query.one()
+    assert abs(task.updated - datetime.utcnow()) < timedelta(minutes=1)
+    assert abs(tombstone.deleted_at - datetime.utcnow()) < timedelta(minutes=1)
+
+
+def test_cursor_sees_changes_that_commit_late(app, make_user, make_tasks):
+    admin = User.query.get(make_user('admin', is_admin=True).id)
+    first, second = make_tasks(2, make_user('requester'))
+    _, cursor = drain(admin)
+
+    # A transaction that started long ago but commits after the cursor was
+    # handed out is still behind it, whatever its timestamps say.
+    Task.query.get(first.id).description = 'Fix the leaking tap in the kitchen'
+    db.session.flush()
+    db.session.execute(Task.__table__.update().where(Task.id == first.id).values(
+        updated=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    Task.bulk_update([second.id], Task.PROGRESS, 1)
+    db.session.commit()
+
+    seen, cursor = drain(admin, cursor)
+    assert seen == [('task', first.id), ('task', second.id)]
+    assert Task.query.get(first.id).revision < Task.query.get(second.id).revision
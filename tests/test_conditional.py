@@ -0,0 +1,89 @@
+from app import db
+from app.models import Task, User
+from .conftest import login
+from .test_api import bearer, token_for
+
+
+def conditional(client, path, response, **headers):
+    # Asks again with the validators `response` came with.
+    if headers.pop('etag', True):
+        headers['If-None-Match'] = response.headers['ETag']
+    if headers.pop('last_modified', True):
+        headers['If-Modified-Since'] = response.headers['Last-Modified']
+    return client.get(path, headers=headers)
+
+
+def test_view_task_answers_conditional_requests(app, client, make_user, make_tasks):
+    requester = make_user('requester')
+    task, = make_tasks(1, requester)
+    path = '/view-task/{}'.format(task.id)
+    login(client, requester)
+
+    first = client.get(path)
+    assert first.status_code == 200
+    assert conditional(client, path, first).status_code == 304
+    assert conditional(client, path, first, last_modified=False).status_code == 304
+    assert conditional(client, path, first, etag=False).status_code == 304
+    assert client.get(path, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+    # A pending flash would be lost by a 304.
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Task update successful.')]
+    assert conditional(client, path, first).status_code == 200
+    assert conditional(client, path, first).status_code == 304
+
+
+def test_view_task_etag_changes_with_edits(app, client, make_user, make_tasks):
+    requester = make_user('requester')
+    task, = make_tasks(1, requester)
+    path = '/view-task/{}'.format(task.id)
+    login(client, requester)
+
+    first = client.get(path)
+    client.post('/update-task/{}'.format(task.id), data={
+        'description': 'Fix the leaking tap in the hall', 'facility': task.facility_id})
+    assert Task.query.get(task.id).description == 'Fix the leaking tap in the hall'
+    db.session.remove()
+    edited = conditional(client, path, first, last_modified=False)
+    assert edited.status_code == 200
+    assert edited.headers['ETag'] != first.headers['ETag']
+
+    Task.bulk_update([task.id], Task.CONFIRM)
+    db.session.commit()
+    bulk = conditional(client, path, edited, last_modified=False)
+    assert bulk.status_code == 200
+    assert bulk.headers['ETag'] != edited.headers['ETag']
+
+
+def test_etag_changes_with_release_role_and_viewer(app, make_user, make_tasks):
+    admin, other = make_user('admin', is_admin=True), make_user('other', is_admin=True)
+    task, = make_tasks(1, admin)
+    admin, other = User.query.get(admin.id), User.query.get(other.id)
+    updated = Task.version(task.id)[0]
+
+    etag = Task.etag(task.id, updated, admin)
+    assert Task.etag(task.id, updated, other) != etag
+    app.config['MAINTRAQ_RELEASE'] = 'next'
+    assert Task.etag(task.id, updated, admin) != etag
+
+
+def test_api_get_task_answers_conditional_requests(app, client, make_user, make_tasks):
+    requester = make_user('requester')
+    task, = make_tasks(1, requester)
+    path = '/api/v1.0/tasks/{}'.format(task.id)
+    headers = bearer(token_for(requester))
+
+    first = client.get(path, headers=headers)
+    assert first.status_code == 200
+    again = client.get(path, headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert again.status_code == 304
+    assert again.data == b''
+    since = client.get(path, headers=dict(
+        headers, **{'If-Modified-Since': first.headers['Last-Modified']}))
+    assert since.status_code == 304
+
+    Task.bulk_update([task.id], Task.RESOLVE)
+    db.session.commit()
+    changed = client.get(path, headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,90 @@
+from collections import Counter
+
+from app import db
+from app.models import Task, TaskCounter, TaskStatus
+
+
+def counters():
+    return dict(((c.kind, c.key), c.value) for c in TaskCounter.query if c.value)
+
+
+def test_track_counts_new_tasks(app, make_user, make_tasks):
+    requester, maintainer = make_user('requester'), make_user('fixer', is_maintenance=True)
+    tasks = make_tasks(3, requester, assigned_to=maintainer)
+    make_tasks(1, requester)
+    facility_id = tasks[0].facility_id
+
+    assert TaskCounter.get(TaskCounter.OPEN) == 4
+    assert TaskCounter.get(TaskCounter.FACILITY_OPEN, facility_id) == 4
+    assert TaskCounter.get(TaskCounter.ASSIGNEE_OPEN, maintainer.id) == 3
+    assert TaskCounter.counts(TaskCounter.STATUS) == {TaskStatus.NOT_STARTED: 4}
+
+
+def test_track_follows_updates_and_deletes(app, make_user, make_tasks):
+    requester, maintainer = make_user('requester'), make_user('fixer', is_maintenance=True)
+    first, second, third = make_tasks(3, requester)
+
+    task = Task.query.get(first.id)
+    task.assigned_to_id = maintainer.id
+    task.progress = TaskStatus.STARTED
+    Task.query.get(second.id).resolved = True
+    db.session.delete(Task.query.get(third.id))
+    db.session.commit()
+
+    assert TaskCounter.get(TaskCounter.OPEN) == 1
+    assert TaskCounter.get(TaskCounter.ASSIGNEE_OPEN, maintainer.id) == 1
+    assert TaskCounter.counts(TaskCounter.STATUS) == {
+        TaskStatus.NOT_STARTED: 1, TaskStatus.STARTED: 1}
+
+    # Edits that don't touch a counted column leave the counters alone.
+    before = counters()
+    Task.query.get(first.id).description = 'Fix the dripping tap'
+    db.session.commit()
+    assert counters() == before
+
+
+def test_track_ignores_rolled_back_changes(app, make_user, make_tasks):
+    requester = make_user('requester')
+    make_tasks(2, requester)
+    before = counters()
+
+    Task.query.first().resolved = True
+    db.session.flush()
+    db.session.rollback()
+    assert counters() == before
+
+
+def test_apply_creates_and_increments_counters(app):
+    connection = db.session.connection()
+    TaskCounter.apply(connection, Counter({(TaskCounter.OPEN, 0): 2, (TaskCounter.STATUS, 1): 0}))
+    TaskCounter.apply(connection, Counter({(TaskCounter.OPEN, 0): -1}))
+    db.session.commit()
+
+    assert TaskCounter.query.count() == 1
+    assert TaskCounter.get(TaskCounter.OPEN) == 1
+
+
+def test_rebuild_matches_tracked_counts(app, make_user, make_tasks):
+    requester, maintainer = make_user('requester'), make_user('fixer', is_maintenance=True)
+    make_tasks(2, requester, assigned_to=maintainer, progress=TaskStatus.STARTED)
+    make_tasks(1, requester, resolved=True, progress=TaskStatus.DONE)
+    make_tasks(3, requester)
+    tracked = counters()
+
+    # Bulk inserts skip the flush hooks, leaving the counters behind.
+    facility_id = Task.query.first().facility_id
+    db.session.bulk_insert_mappings(Task, [
+        dict(description='Replace the bulb', requested_by_id=requester.id, facility_id=facility_id)
+    ])
+    db.session.commit()
+    assert counters() == tracked
+
+    assert TaskCounter.rebuild() == 6
+    assert counters() == {
+        (TaskCounter.OPEN, 0): 6,
+        (TaskCounter.FACILITY_OPEN, facility_id): 6,
+        (TaskCounter.ASSIGNEE_OPEN, maintainer.id): 2,
+        (TaskCounter.STATUS, TaskStatus.NOT_STARTED): 4,
+        (TaskCounter.STATUS, TaskStatus.STARTED): 2,
+        (TaskCounter.STATUS, TaskStatus.DONE): 1,
+    }
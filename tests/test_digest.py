@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from app import db
+from app.digest import send_digests
+from app.models import OutboundEmail, User
+
+from .conftest import login
+
+
+def test_digests_go_to_opted_in_admins_only(app, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    requester = make_user('requester')
+    User.query.update({'digest_opt_in': True})
+    db.session.commit()
+    make_tasks(2, requester)
+
+    with app.test_request_context():
+        assert send_digests(datetime.now()) == 1
+    assert [email.recipient for email in OutboundEmail.query] == [admin.email]
+
+
+def test_digest_option_is_only_offered_for_admins(app, client, make_user):
+    admin = make_user('admin', is_admin=True)
+    make_user('requester')
+    login(client, admin)
+
+    assert b'digest_opt_in' in client.get('/edit-profile/admin').data
+    assert b'digest_opt_in' not in client.get('/edit-profile/requester').data
+
+    response = client.post('/edit-profile/requester', data={
+        'email': 'requester@example.com', 'username': 'requester', 'digest_opt_in': 'y'})
+    assert response.status_code == 302
+    assert not User.query.filter_by(username='requester').one().digest_opt_in
@@ -0,0 +1,138 @@
+import pytest
+
+from app import db
+from app.events import Subscriber, TaskEventStream
+from app.models import CacheVersion, TaskEvent, TaskRevision, User
+
+
+@pytest.fixture
+def stream(app):
+    # Polled by hand rather than from the poller thread.
+    stream = TaskEventStream(app)
+    stream.position = (0, 0)
+    return stream
+
+
+def add_subscriber(stream, user):
+    subscriber = Subscriber(User.query.get(user.id), maxsize=10)
+    stream.subscribers.add(subscriber)
+    return subscriber
+
+
+def event(id, requested_by):
+    db.session.add(TaskEvent(
+        id=id, task_id=id, kind=TaskEvent.UPDATED, requested_by_id=requested_by.id, data='{}'))
+    db.session.commit()
+
+
+def received(subscriber):
+    ids = []
+    while not subscriber.queue.empty():
+        ids.append(subscriber.queue.get_nowait()['id'])
+    return ids
+
+
+def revisions():
+    return dict(db.session.query(TaskEvent.id, TaskEvent.revision))
+
+
+def test_event_committed_after_a_newer_one_is_still_delivered(app, stream, make_user):
+    jane = make_user('jane')
+    subscriber = add_subscriber(stream, jane)
+
+    event(1, jane)
+    event(3, jane)
+    stream.poll()
+    assert received(subscriber) == [1, 3]
+
+    # Id 2 was handed out first but its transaction committed last.
+    event(2, jane)
+    stream.poll()
+    assert received(subscriber) == [2]
+    stream.poll()
+    assert received(subscriber) == []
+    assert stream.position == (3, 2)
+
+
+def test_each_commit_gets_the_next_revision(app, make_user):
+    jane = make_user('jane')
+    event(1, jane)
+    for id in (2, 3):
+        db.session.add(TaskEvent(
+            id=id, task_id=id, kind=TaskEvent.UPDATED, requested_by_id=jane.id, data='{}'))
+    db.session.flush()
+    db.session.commit()
+    assert revisions() == {1: 1, 2: 2, 3: 2}
+
+    # A rolled back transaction leaves no revision or events behind.
+    db.session.add(TaskEvent(
+        id=4, task_id=4, kind=TaskEvent.UPDATED, requested_by_id=jane.id, data='{}'))
+    db.session.flush()
+    db.session.rollback()
+    make_user('john')
+    assert CacheVersion.get(TaskRevision.NAME) == 2
+    event(5, jane)
+    assert revisions() == {1: 1, 2: 2, 3: 2, 5: 3}
+
+
+def test_replay_resumes_from_the_last_event_id(app, stream, make_user):
+    jane, john = make_user('jane'), make_user('john')
+    subscriber = add_subscriber(stream, jane)
+    event(1, jane)
+    event(3, jane)
+    event(2, john)
+    event(4, jane)
+
+    replayed = stream.replay(subscriber, '2-3')
+    assert [e['id'] for e in replayed] == [4]
+    assert stream.frame(replayed[0]).startswith('id: 4-4\n')
+    # From before revisions, or unknown.
+    assert [e['id'] for e in stream.replay(subscriber, '1')] == [3, 4]
+    assert stream.replay(subscriber, '99') == []
+    assert stream.replay(subscriber, 'junk') == []
+    assert stream.replay(subscriber, None) == []
+
+    stream.start()
+    assert stream.position == (4, 4)
+
+
+def test_stream_is_closed_when_the_users_role_changes(app, stream, make_user):
+    fixer = make_user('fixer', is_maintenance=True)
+    jane = make_user('jane')
+    demoted = add_subscriber(stream, fixer)
+    unchanged = add_subscriber(stream, jane)
+    stream.poll()
+    frames = stream.stream(demoted, [])
+    assert next(frames).startswith('retry:')
+
+    user = User.query.get(fixer.id)
+    user.is_maintenance = False
+    user.uncache()
+    db.session.commit()
+    stream.poll()
+
+    assert demoted.closed and not unchanged.closed
+    assert stream.subscribers == {unchanged}
+    assert list(frames) == []
+
+
+def test_task_changes_and_their_events_commit_together(app, client, make_user, make_tasks,
+                                                       monkeypatch):
+    from app.models import Task
+    from .conftest import login
+
+    make_user('admin', is_admin=True)
+    fixer = make_user('fixer', is_maintenance=True)
+    task, = make_tasks(1, make_user('jane'), assigned_to=fixer, confirmed=True)
+    login(client, fixer)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('Template missing')
+    monkeypatch.setattr('app.notifications.queue_email', fail)
+    with pytest.raises(RuntimeError):
+        client.post('/update-task/{}'.format(task.id), data={
+            'description': task.description, 'facility': task.facility_id,
+            'acknowledged': 'y', 'progress': 3})
+    db.session.remove()
+    assert Task.query.get(task.id).progress != 3
+    assert TaskEvent.query.count() == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from app import db
+from app.instrumentation import task_list_plans
+from app.seed import Seeder
+
+
+@pytest.fixture
+def seeded(app):
+    seeder = Seeder(chunk_size=1000, out=lambda *args: None)
+    seeder.users(200)
+    seeder.facilities(20)
+    seeder.tasks(3000)
+    seeder.finish()
+    db.session.execute('ANALYZE')
+    db.session.commit()
+
+
+# Scanning the date index for the admin dashboard is fine: it stops after
+# one page.
+EXPECTED_INDEXES = {
+    'requester dashboard': 'ix_tasks_requested_by_confirmed_date',
+    'maintainer dashboard': 'ix_tasks_assigned_to_date',
+    'admin dashboard': 'ix_tasks_date_requested',
+    'open tasks': 'ix_tasks_unresolved_facility',
+    'open tasks by facility': 'ix_tasks_unresolved_facility',
+}
+
+
+def test_task_list_queries_use_an_index(app, seeded):
+    plans = task_list_plans()
+    db.session.rollback()
+    assert sorted(name for name, plan, scans in plans) == sorted(EXPECTED_INDEXES)
+    for name, plan, scans in plans:
+        assert not scans, name
+        assert any(EXPECTED_INDEXES[name] in step for step in plan), (name, plan)
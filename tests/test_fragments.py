@@ -0,0 +1,49 @@
+import pytest
+
+from app import db
+from app.fragments import task_row, task_rows
+from app.models import Task, User
+
+
+@pytest.fixture
+def render(app):
+    def render(task_id, bulk=False):
+        db.session.remove()
+        with app.test_request_context():
+            return task_row(Task.list_query().get(task_id), bulk=bulk)
+    return render
+
+
+def test_unchanged_rows_are_reused(app, render, make_user, make_tasks):
+    task, = make_tasks(1, make_user('requester'))
+    html = render(task.id)
+    assert 'Fix the leaking tap' in html
+    assert render(task.id) is html
+    assert task_rows.stats()['size'] == 1
+
+    # Only the bulk table has checkboxes.
+    assert 'checkbox' in render(task.id, bulk=True)
+    assert 'checkbox' not in html
+
+
+def test_edited_task_gets_a_fresh_row(app, render, make_user, make_tasks):
+    task, = make_tasks(1, make_user('requester'))
+    html = render(task.id)
+
+    Task.query.get(task.id).description = 'Replace the broken window'
+    db.session.commit()
+    fresh = render(task.id)
+    assert fresh is not html
+    assert 'Replace the broken window' in fresh
+
+
+def test_renamed_assignee_gets_a_fresh_row(app, render, make_user, make_tasks):
+    maintainer = make_user('fixer', is_maintenance=True)
+    task, = make_tasks(1, make_user('requester'), assigned_to=maintainer)
+    assert 'fixer' in render(task.id)
+
+    # Renaming a user doesn't touch their tasks' `updated`.
+    User.query.get(maintainer.id).username = 'handyman'
+    db.session.commit()
+    html = render(task.id)
+    assert 'handyman' in html and 'fixer' not in html
@@ -0,0 +1,34 @@
+from threading import Thread
+
+from app import db, outbox
+from app.models import OutboundEmail
+
+
+def sample(body, name):
+    for line in body.decode('utf-8').splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[1])
+
+
+def test_scrape_reports_backlog_and_live_workers(app, client, monkeypatch):
+    db.session.add(OutboundEmail(recipient='jane@example.com', subject='Hi', body='Hi'))
+    db.session.commit()
+    finished = Thread(target=lambda: None)
+    finished.start()
+    finished.join()
+    monkeypatch.setattr(outbox, 'workers', [finished])
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert sample(response.data, 'maintraq_email_backlog{status="pending"}') == 1
+    # The dead worker drops out at scrape time.
+    assert sample(response.data, 'maintraq_email_workers') == 0
+
+
+def test_scrape_is_limited_to_allowed_networks(app, client):
+    remote = {'REMOTE_ADDR': '203.0.113.9'}
+    assert client.get('/metrics', environ_base=remote).status_code == 403
+
+    app.config['MAINTRAQ_METRICS_ALLOW'] = ['203.0.113.0/24']
+    assert client.get('/metrics', environ_base=remote).status_code == 200
+    assert client.get('/metrics').status_code == 403
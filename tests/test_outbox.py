@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, mail, outbox
+from app.models import OutboundEmail
+
+
+class StubConnection:
+    # Stands in for flask_mail's SMTP connection, failing for some recipients.
+    def __init__(self, server):
+        self.server = server
+        self.sent = []
+
+    def __enter__(self):
+        if self.server.down:
+            raise OSError('Connection refused')
+        self.server.connections.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send(self, message):
+        if set(message.recipients) & self.server.bounce:
+            raise OSError('Mailbox unavailable')
+        self.sent.append(message.recipients[0])
+
+
+class StubServer:
+    def __init__(self):
+        self.connections = []
+        self.bounce = set()
+        self.down = False
+
+    def connect(self):
+        return StubConnection(self)
+
+    @property
+    def sent(self):
+        return [recipient for connection in self.connections for recipient in connection.sent]
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(mail, 'connect', server.connect)
+    return server
+
+
+def queue(*recipients, **kwargs):
+    emails = [OutboundEmail(recipient=recipient, subject='Task updated', body='Done', **kwargs)
+              for recipient in recipients]
+    db.session.add_all(emails)
+    db.session.commit()
+    return [email.id for email in emails]
+
+
+def make_due(email_id):
+    OutboundEmail.query.filter_by(id=email_id).update(
+        {'next_attempt_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_sends_each_batch_over_one_connection(app, smtp):
+    app.config['MAINTRAQ_MAIL_BATCH_SIZE'] = 2
+    queue(*['user{}@example.com'.format(n) for n in range(5)])
+
+    assert outbox.drain() == 5
+    assert [len(connection.sent) for connection in smtp.connections] == [2, 2, 1]
+    assert smtp.sent == ['user{}@example.com'.format(n) for n in range(5)]
+    assert OutboundEmail.query.filter_by(status=OutboundEmail.SENT).count() == 5
+
+
+def test_failed_email_is_retried_with_backoff_until_it_gives_up(app, smtp):
+    app.config['MAINTRAQ_MAIL_MAX_ATTEMPTS'] = 3
+    app.config['MAINTRAQ_MAIL_RETRY_BACKOFF'] = 30
+    smtp.bounce.add('gone@example.com')
+    bounced, delivered = queue('gone@example.com', 'here@example.com')
+
+    for attempt, delay in ((1, 30), (2, 60)):
+        before = datetime.now()
+        outbox.drain()
+        email = OutboundEmail.query.get(bounced)
+        assert (email.status, email.attempts) == (OutboundEmail.PENDING, attempt)
+        assert email.last_error == 'Mailbox unavailable'
+        assert email.next_attempt_at >= before + timedelta(seconds=delay)
+        # Not due yet, so another pass leaves it alone.
+        assert outbox.drain() == 0
+        make_due(bounced)
+
+    outbox.drain()
+    email = OutboundEmail.query.get(bounced)
+    assert (email.status, email.attempts) == (OutboundEmail.FAILED, 3)
+    assert OutboundEmail.query.get(delivered).status == OutboundEmail.SENT
+    assert smtp.sent == ['here@example.com']
+
+
+def test_unreachable_server_fails_the_whole_batch(app, smtp):
+    smtp.down = True
+    ids = queue('a@example.com', 'b@example.com')
+
+    assert outbox.drain() == 2
+    emails = [OutboundEmail.query.get(email_id) for email_id in ids]
+    assert [(email.status, email.attempts) for email in emails] == [
+        (OutboundEmail.PENDING, 1), (OutboundEmail.PENDING, 1)]
+    assert all(email.claimed_by is None for email in emails)
+
+
+def test_claims_left_by_a_crashed_worker_expire(app, smtp):
+    app.config['MAINTRAQ_MAIL_CLAIM_TIMEOUT'] = 600
+    now = datetime.now()
+    stale, = queue('stale@example.com', status=OutboundEmail.SENDING, claimed_by='dead',
+                   claimed_at=now - timedelta(seconds=601))
+    fresh, = queue('fresh@example.com', status=OutboundEmail.SENDING, claimed_by='busy',
+                   claimed_at=now - timedelta(seconds=60))
+
+    assert outbox.drain() == 1
+    assert smtp.sent == ['stale@example.com']
+    assert OutboundEmail.query.get(stale).status == OutboundEmail.SENT
+    email = OutboundEmail.query.get(fresh)
+    assert (email.status, email.claimed_by) == (OutboundEmail.SENDING, 'busy')
+
+
+def test_registration_queues_the_confirmation_email(app, client):
+    response = client.post('/register', data={
+        'email': 'new@example.com', 'username': 'newcomer',
+        'password': 'password', 'password2': 'password'
+    })
+    assert response.status_code == 302
+    email = OutboundEmail.query.one()
+    assert email.recipient == 'new@example.com'
+    assert email.status == OutboundEmail.PENDING
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from app.profiling import Profiler
+
+from .conftest import login
+
+
+@pytest.fixture
+def profiler(app, tmp_path):
+    app.config.update(MAINTRAQ_PROFILING=True, MAINTRAQ_PROFILE_SAMPLE_RATE=1.0,
+                      MAINTRAQ_PROFILE_DIR=str(tmp_path / 'profiles'))
+    return Profiler(app)
+
+
+def test_profile_name_is_only_sent_to_admins(app, client, make_user, profiler):
+    login(client, make_user('jane'))
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'X-Maintraq-Profile' not in response.headers
+    # Still profiled, just not advertised.
+    assert any('--main.index--' in name for name in os.listdir(app.config['MAINTRAQ_PROFILE_DIR']))
+
+    admin_client = app.test_client()
+    login(admin_client, make_user('admin', is_admin=True))
+    name = admin_client.get('/').headers['X-Maintraq-Profile']
+    assert profiler.get(name).endpoint == 'main.index'
+
+
+def test_nothing_is_profiled_under_gevent(app, client, make_user, profiler, monkeypatch):
+    monkeypatch.setattr('app.profiling.under_gevent', lambda: True)
+    admin = make_user('admin', is_admin=True)
+    login(client, admin)
+    response = client.get('/', headers={'X-Maintraq-Profile': '1'})
+    assert response.status_code == 200
+    assert 'X-Maintraq-Profile' not in response.headers
+    assert not os.path.isdir(app.config['MAINTRAQ_PROFILE_DIR'])
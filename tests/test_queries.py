@@ -0,0 +1,129 @@
+import logging
+
+import pytest
+
+from app import db
+from app.instrumentation import assert_max_queries
+from app.models import Task, TaskStatus
+
+from .conftest import login
+
+
+def test_index_query_count_does_not_grow_with_rows(app, client, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    maintainer = make_user('maintainer', is_maintenance=True)
+    requester = make_user('requester')
+    login(client, admin)
+
+    make_tasks(2, requester, assigned_to=maintainer)
+    # Warm the process caches, then count what a typical request runs.
+    client.get('/')
+    db.session.remove()
+    with assert_max_queries(4) as few:
+        assert client.get('/').status_code == 200
+
+    make_tasks(40, requester, assigned_to=maintainer)
+    db.session.remove()
+    with assert_max_queries(4) as many:
+        assert client.get('/').status_code == 200
+    assert many['count'] == few['count']
+
+
+def test_view_task_query_count(app, client, make_user, make_tasks):
+    maintainer = make_user('maintainer', is_maintenance=True)
+    requester = make_user('requester')
+    task, = make_tasks(1, requester, assigned_to=maintainer)
+    login(client, requester)
+    client.get('/')
+    db.session.remove()
+
+    with assert_max_queries(2):
+        assert client.get('/view-task/{}'.format(task.id)).status_code == 200
+
+
+@pytest.fixture
+def budget(app):
+    # Each endpoint's configured budget, which a cold request must stay within.
+    return lambda endpoint: assert_max_queries(app.config['MAINTRAQ_QUERY_BUDGETS'][endpoint])
+
+
+def test_index_within_budget(app, client, make_user, make_tasks, budget):
+    admin = make_user('admin', is_admin=True)
+    make_tasks(30, make_user('requester'), assigned_to=make_user('fixer', is_maintenance=True))
+    login(client, admin)
+    db.session.remove()
+
+    with budget('main.index'):
+        assert client.get('/').status_code == 200
+
+
+def test_view_task_within_budget(app, client, make_user, make_tasks, budget):
+    requester = make_user('requester')
+    task, = make_tasks(1, requester)
+    login(client, requester)
+    db.session.remove()
+
+    with budget('main.view_task'):
+        assert client.get('/view-task/{}'.format(task.id)).status_code == 200
+
+
+def test_update_task_within_budget(app, client, make_user, make_tasks, budget):
+    admin = make_user('admin', is_admin=True)
+    maintainer = make_user('fixer', is_maintenance=True)
+    task, = make_tasks(1, make_user('requester'), assigned_to=maintainer, confirmed=True)
+    path = '/update-task/{}'.format(task.id)
+
+    login(client, admin)
+    db.session.remove()
+    with budget('main.update_task'):
+        assert client.get(path).status_code == 200
+
+    # The maintainer opens the form, then submits it.
+    maintainer_client = app.test_client()
+    login(maintainer_client, maintainer)
+    maintainer_client.get(path)
+    db.session.remove()
+    with budget('main.update_task'):
+        response = maintainer_client.post(path, data={
+            'description': task.description, 'facility': task.facility_id,
+            'acknowledged': 'y', 'progress': TaskStatus.DONE})
+    assert response.status_code == 302
+    assert Task.query.get(task.id).progress == TaskStatus.DONE
+
+
+def test_users_list_within_budget(app, client, make_user, budget):
+    admin = make_user('admin', is_admin=True)
+    for n in range(20):
+        make_user('user{}'.format(n))
+    login(client, admin)
+    db.session.remove()
+
+    with budget('main.users_list'):
+        assert client.get('/users').status_code == 200
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super(Records, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_over_budget_requests_are_logged_as_warnings(app, client, make_user):
+    login(client, make_user('jane'))
+    app.config['MAINTRAQ_QUERY_LOGGING'] = False
+    app.config['MAINTRAQ_QUERY_BUDGETS'] = {'main.index': 0}
+
+    handler = Records()
+    app.logger.addHandler(handler)
+    try:
+        client.get('/')
+    finally:
+        app.logger.removeHandler(handler)
+    warnings = [record.getMessage() for record in handler.records
+                if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert warnings[0].startswith('GET / 200 ')
+    assert warnings[0].endswith('over the main.index budget of 0')
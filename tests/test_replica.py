@@ -0,0 +1,106 @@
+import shutil
+import time
+
+import pytest
+from flask import g
+
+from app import create_app, db
+from app.cache import caches
+from app.models import Task, TaskStatus
+from app.replica import REPLICA
+from config import TestingConfig
+
+from .conftest import login
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A primary and a replica SQLite file. The replica starts as a copy of
+    # the primary (see `replicate`) and never receives its later writes.
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        'sqlite:///' + str(tmp_path / 'primary.db'))
+    monkeypatch.setattr(TestingConfig, 'MAINTRAQ_REPLICA_DATABASE_URI',
+                        'sqlite:///' + str(tmp_path / 'replica.db'))
+    app = create_app('testing')
+    app.config['MAINTRAQ_REPLICA_STICKY_SECONDS'] = 5
+    with app.app_context():
+        db.create_all()
+        for cache in caches.values():
+            cache.clear()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def replicate(app, tmp_path):
+    def replicate(task_id):
+        # Copies the primary over the replica, then marks the task's
+        # description so tests can tell which database a read came from.
+        db.session.remove()
+        db.get_engine(app, bind=REPLICA).dispose()
+        shutil.copy(str(tmp_path / 'primary.db'), str(tmp_path / 'replica.db'))
+        with db.get_engine(app, bind=REPLICA).begin() as connection:
+            connection.execute(
+                Task.__table__.update().where(Task.__table__.c.id == task_id)
+                .values(description='Read from the replica'))
+    return replicate
+
+
+@pytest.fixture
+def setup(app, client, make_user, make_tasks, replicate):
+    maintainer = make_user('fixer', is_maintenance=True)
+    task, = make_tasks(1, make_user('requester'), assigned_to=maintainer, confirmed=True)
+    replicate(task.id)
+    login(client, maintainer)
+    # Logging in is a POST, which sticks to the primary for a while.
+    with client.session_transaction() as session:
+        session.pop('primary_until')
+    return task
+
+
+def test_read_only_view_reads_from_the_replica(app, client, setup):
+    response = client.get('/view-task/{}'.format(setup.id))
+    assert b'Read from the replica' in response.data
+
+
+def test_views_not_marked_read_only_use_the_primary(app, client, setup):
+    response = client.get('/update-task/{}'.format(setup.id))
+    assert b'Read from the replica' not in response.data
+    assert setup.description.encode() in response.data
+
+
+def test_flushes_and_locking_reads_go_to_the_primary(app, setup):
+    with app.test_request_context('/view-task/{}'.format(setup.id)):
+        g.use_replica = True
+        description = db.session.query(Task.description).filter_by(id=setup.id)
+        assert description.scalar() == 'Read from the replica'
+        assert description.with_for_update().scalar() == setup.description
+
+        Task.query.filter_by(id=setup.id).update({'detailed_info': 'Updated'})
+        task = Task.query.with_for_update().get(setup.id)
+        task.progress = TaskStatus.STARTED
+        db.session.commit()
+
+    with db.get_engine(app).connect() as connection:
+        row = connection.execute(Task.__table__.select().where(
+            Task.__table__.c.id == setup.id)).first()
+    assert (row.detailed_info, row.progress) == ('Updated', TaskStatus.STARTED)
+
+
+def test_user_sticks_to_the_primary_after_writing(app, client, setup):
+    path = '/view-task/{}'.format(setup.id)
+    before = time.time()
+    response = client.post('/update-task/{}'.format(setup.id), data={
+        'description': setup.description, 'facility': setup.facility_id,
+        'acknowledged': 'y', 'progress': TaskStatus.STARTED})
+    assert response.status_code == 302
+
+    with client.session_transaction() as session:
+        primary_until = session['primary_until']
+    assert before + 5 <= primary_until <= time.time() + 5
+    assert b'Read from the replica' not in client.get(path).data
+
+    # Once the sticky window has passed, reads go back to the replica.
+    with client.session_transaction() as session:
+        session['primary_until'] = time.time() - 1
+    assert b'Read from the replica' in client.get(path).data
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import db
+from app.models import Task, TaskRollup, TaskStatus, TaskTombstone, RollupRun
+from app.rollups import refresh, summarize
+
+MONDAY = datetime(2026, 10, 5, 9, 0)
+
+
+def test_summarize_groups_values_by_key():
+    keys = np.array([2, 1, 2, 1, 2])
+    hours = np.array([10.0, 1.0, 20.0, 3.0, 30.0])
+    assert list(summarize(keys, hours)) == [
+        (1, 2, 2.0, 2.0, 2.8, 3.0),
+        (2, 3, 20.0, 20.0, 28.0, 30.0),
+    ]
+    assert list(summarize(np.array([], dtype=np.int64), np.array([]))) == []
+
+
+def completed(make_tasks, requester, maintainer, day, hours):
+    # One task per entry in `hours`, each completed that many hours after
+    # it was requested, at 9am on `day`.
+    done = MONDAY + timedelta(days=day)
+    tasks = []
+    for turnaround in hours:
+        tasks += make_tasks(
+            1, requester, assigned_to=maintainer, progress=TaskStatus.DONE,
+            date_requested=done - timedelta(hours=turnaround), date_completed=done)
+    return tasks
+
+
+def age(model, column):
+    # Backdates changes to before the last run and its overlap.
+    model.query.update({column: datetime.utcnow() - timedelta(hours=1)})
+    db.session.commit()
+
+
+def rollup(period, start, dimension, key):
+    return TaskRollup.query.filter_by(
+        period=period, period_start=start, dimension=dimension, key=key).one()
+
+
+def test_refresh_rolls_up_days_and_weeks(app, make_user, make_tasks):
+    requester, maintainer = make_user('requester'), make_user('fixer', is_maintenance=True)
+    completed(make_tasks, requester, maintainer, 0, [2, 4])
+    completed(make_tasks, requester, maintainer, 2, [12])
+    facility_id = Task.query.first().facility_id
+
+    assert refresh(MONDAY + timedelta(days=7)) == 2
+    monday = rollup(TaskRollup.DAY, MONDAY.date(), TaskRollup.FACILITY, facility_id)
+    assert (monday.completed, monday.mean_hours, monday.median_hours) == (2, 3.0, 3.0)
+    week = rollup(TaskRollup.WEEK, MONDAY.date(), TaskRollup.MAINTAINER, maintainer.id)
+    assert (week.completed, week.mean_hours) == (3, 6.0)
+    assert RollupRun.last().days == 2
+
+
+def test_refresh_recomputes_days_touched_since_the_last_run(app, make_user, make_tasks):
+    requester, maintainer = make_user('requester'), make_user('fixer', is_maintenance=True)
+    kept, rejected = completed(make_tasks, requester, maintainer, 0, [2, 4])
+    completed(make_tasks, requester, maintainer, 3, [6])
+    facility_id = kept.facility_id
+    age(Task, 'updated')
+    refresh(MONDAY + timedelta(days=7))
+
+    # A task completed on Monday is deleted: only Monday and its week are redone.
+    task = Task.query.get(rejected.id)
+    TaskTombstone.record(task)
+    db.session.delete(task)
+    db.session.commit()
+
+    assert refresh(MONDAY + timedelta(days=7)) == 1
+    monday = rollup(TaskRollup.DAY, MONDAY.date(), TaskRollup.FACILITY, facility_id)
+    assert (monday.completed, monday.mean_hours) == (1, 2.0)
+    week = rollup(TaskRollup.WEEK, MONDAY.date(), TaskRollup.FACILITY, facility_id)
+    assert week.completed == 2
+    thursday = rollup(TaskRollup.DAY, (MONDAY + timedelta(days=3)).date(),
+                      TaskRollup.FACILITY, facility_id)
+    assert thursday.completed == 1
+
+    # Nothing changed since: nothing to redo.
+    age(TaskTombstone, 'deleted_at')
+    assert refresh(MONDAY + timedelta(days=7)) == 0
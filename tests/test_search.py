@@ -0,0 +1,105 @@
+import pytest
+
+from app import db
+from app.models import Task
+from app.search import TaskSearch
+from .conftest import login
+
+
+@pytest.fixture
+def indexed(app):
+    # `db.create_all()` leaves out the index; the migration would add it.
+    with db.engine.begin() as connection:
+        TaskSearch.create(connection)
+
+
+def matches(user, terms):
+    tasks, _ = Task.search(user, terms)
+    return [task.description for task in tasks]
+
+
+def indexed_count():
+    return db.engine.execute("SELECT count(*) FROM tasks_fts").scalar()
+
+
+def test_search_ranks_matches_and_hides_others_tasks(app, indexed, make_user, make_tasks):
+    requester, other = make_user('requester'), make_user('other')
+    admin = make_user('admin', is_admin=True)
+    mine = make_tasks(1, requester, detailed_info='The tap in the kitchen drips.')[0]
+    theirs = make_tasks(1, other)[0]
+    Task.query.get(theirs.id).description = 'Kitchen light is out'
+    db.session.commit()
+
+    assert matches(requester, 'kitch') == [mine.description]
+    assert sorted(matches(admin, 'kitchen')) == sorted([mine.description, 'Kitchen light is out'])
+    # FTS5 syntax in the terms is taken literally.
+    assert matches(admin, 'tap OR "light') == []
+    assert matches(admin, '***') == []
+
+
+def test_search_pages_results(app, indexed, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    make_tasks(3, admin)
+    tasks, more = Task.search(admin, 'leaking', page=1, per_page=2)
+    assert len(tasks) == 2 and more
+    tasks, more = Task.search(admin, 'leaking', page=2, per_page=2)
+    assert len(tasks) == 1 and not more
+
+
+def test_index_follows_flushed_changes(app, indexed, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    first, second = make_tasks(2, admin)
+
+    Task.query.get(first.id).description = 'Paint the stairwell'
+    db.session.delete(Task.query.get(second.id))
+    db.session.commit()
+    assert matches(admin, 'stairwell') == ['Paint the stairwell']
+    assert matches(admin, 'leaking') == []
+
+    # Rolled back changes leave the index as it was.
+    Task.query.get(first.id).description = 'Clean the gutters'
+    db.session.flush()
+    db.session.rollback()
+    assert matches(admin, 'gutters') == []
+    assert matches(admin, 'stairwell') == ['Paint the stairwell']
+
+
+def test_rebuild_indexes_bulk_inserted_tasks(app, indexed, make_user, make_tasks):
+    admin = make_user('admin', is_admin=True)
+    facility_id = make_tasks(1, admin)[0].facility_id
+    # Bulk inserts skip the flush hooks.
+    db.session.bulk_insert_mappings(Task, [
+        dict(description='Replace the boiler', requested_by_id=admin.id, facility_id=facility_id)
+    ])
+    db.session.commit()
+    assert matches(admin, 'boiler') == []
+
+    with db.engine.begin() as connection:
+        TaskSearch.rebuild(connection)
+    assert matches(admin, 'boiler') == ['Replace the boiler']
+    assert len(matches(admin, 'leaking')) == 1
+
+
+def test_missing_index_is_checked_again(app, make_user, make_tasks, monkeypatch):
+    admin = make_user('admin', is_admin=True)
+    make_tasks(1, admin)
+    assert matches(admin, 'leaking') == []
+
+    # Created behind the app's back, as a migration run from another process
+    # would, and only noticed once the last check is old enough.
+    db.engine.execute("CREATE VIRTUAL TABLE tasks_fts USING fts5(description, detailed_info)")
+    make_tasks(1, admin)
+    assert indexed_count() == 0
+    monkeypatch.setattr(TaskSearch, 'RECHECK', 0)
+    make_tasks(1, admin)
+    assert indexed_count() == 1
+    assert len(matches(admin, 'leaking')) == 1
+
+
+def test_search_page(app, client, indexed, make_user, make_tasks):
+    requester = make_user('requester')
+    make_tasks(1, requester)
+    login(client, requester)
+    response = client.get('/search?q=leaking')
+    assert response.status_code == 200
+    assert b'Fix the leaking tap number 0' in response.data
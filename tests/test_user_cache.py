@@ -0,0 +1,29 @@
+from app import db
+from app.models import CacheVersion, User, user_cache
+
+
+def test_role_change_in_another_process_reaches_cached_user(app, make_user):
+    user = make_user('jane', is_admin=True)
+    user_cache.configure(check_interval=0)
+    assert User.load_user(user.id).is_admin
+    db.session.remove()
+
+    # What another process's uncache() and commit leave behind: the row
+    # changed and the stamp bumped, but this process's entry untouched.
+    User.query.filter_by(id=user.id).update({'is_admin': False})
+    CacheVersion.bump('users')
+    db.session.commit()
+    db.session.remove()
+
+    assert not User.load_user(user.id).is_admin
+
+
+def test_cached_user_is_reused_until_the_stamp_changes(app, make_user):
+    user = make_user('jane')
+    user_cache.configure(check_interval=0)
+    User.load_user(user.id)
+    db.session.remove()
+    hits = user_cache.hits
+
+    User.load_user(user.id)
+    assert user_cache.hits == hits + 1